@@ -6,6 +6,19 @@ import ssl
 from umqtt.simple import MQTTClient
 from micropython import const
 
+try:
+    from time import ticks_ms, ticks_diff, sleep_ms
+except ImportError:
+    # CPython, for running this module off-device with mocked hardware modules
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
 
 PICO_ID = 2  # Change to 2 for second Pico
 TAG_MAC = "4C:75:25:CB:7E:0A"
@@ -23,58 +36,113 @@ MQTT_CLIENT_ID = f"pico_{PICO_ID}"
 _IRQ_SCAN_RESULT = const(5)
 _IRQ_SCAN_DONE = const(6)
 
+# Scan results are copied by the IRQ into a preallocated ring buffer and
+# parsed/published from the main loop, several scans per MQTT message
+RING_SIZE = 64
+ADV_MAX_LEN = 31  # legacy advertising payload limit
+PUBLISH_BATCH_SIZE = 8
+PUBLISH_BATCH_MS = 500
 
-print(f"Pico {PICO_ID} starting...")
-print(f"Connecting to WiFi: {WIFI_SSID}")
-
-wlan = network.WLAN(network.STA_IF)
-wlan.active(True)
-wlan.connect(WIFI_SSID, WIFI_PASSWORD)
-
-
-max_wait = 10
-while max_wait > 0:
-    if wlan.status() < 0 or wlan.status() >= 3:
-        break
-    max_wait -= 1
-    print('Waiting for WiFi connection...')
-    time.sleep(1)
-if wlan.status() != 3:
-    print('WiFi connection failed!')
-    print(f'Status: {wlan.status()}')
-    raise RuntimeError('Network connection failed')
-else:
-    print('WiFi connected!')
-    status = wlan.ifconfig()
-    print(f'Pico IP: {status[0]}')
-    
-print(f"Connecting to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}...")
+TAG_ADDR = bytes([int(b, 16) for b in TAG_MAC.split(':')])
 
-try:
-    mqtt_client = MQTTClient(
-        MQTT_CLIENT_ID,
-        MQTT_BROKER,
-        port=MQTT_PORT,
-        keepalive=60,
-        user = "pico_2",
-        password = "1234",
-        ssl=True,
-        ssl_params ={
-            "server_side":False,
-            "server_hostname":MQTT_BROKER,
-            "cadata": open("/ca.crt","rb").read(),
-        }
-    )
-    mqtt_client.connect()
-    print("Connected to MQTT broker")
-except Exception as e:
-    print(f"MQTT connection failed: {e}")
-    raise
 
+def connect_wifi():
+    print(f"Connecting to WiFi: {WIFI_SSID}")
+
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    wlan.connect(WIFI_SSID, WIFI_PASSWORD)
+
+    max_wait = 10
+    while max_wait > 0:
+        if wlan.status() < 0 or wlan.status() >= 3:
+            break
+        max_wait -= 1
+        print('Waiting for WiFi connection...')
+        time.sleep(1)
+    if wlan.status() != 3:
+        print('WiFi connection failed!')
+        print(f'Status: {wlan.status()}')
+        raise RuntimeError('Network connection failed')
+    else:
+        print('WiFi connected!')
+        status = wlan.ifconfig()
+        print(f'Pico IP: {status[0]}')
+    return wlan
+
+
+def connect_mqtt():
+    print(f"Connecting to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}...")
+
+    try:
+        client = MQTTClient(
+            MQTT_CLIENT_ID,
+            MQTT_BROKER,
+            port=MQTT_PORT,
+            keepalive=60,
+            user = "pico_2",
+            password = "1234",
+            ssl=True,
+            ssl_params ={
+                "server_side":False,
+                "server_hostname":MQTT_BROKER,
+                "cadata": open("/ca.crt","rb").read(),
+            }
+        )
+        client.connect()
+        print("Connected to MQTT broker")
+        return client
+    except Exception as e:
+        print(f"MQTT connection failed: {e}")
+        raise
+
+
+class ScanRing:
+    """Single-producer/single-consumer ring of raw scan results.
+
+    All slots are allocated up front so put() (called from the BLE IRQ)
+    only copies bytes into existing buffers. Only the IRQ moves head and
+    only the main loop moves tail, so no locking is needed. When the ring
+    is full new results are counted in `dropped` and discarded.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.addrs = [bytearray(6) for _ in range(size)]
+        self.advs = [bytearray(ADV_MAX_LEN) for _ in range(size)]
+        self.adv_lens = [0] * size
+        self.rssis = [0] * size
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def put(self, addr, rssi, adv_data):
+        head = self.head
+        nxt = (head + 1) % self.size
+        n = len(adv_data)
+        if nxt == self.tail or n > ADV_MAX_LEN:
+            self.dropped += 1
+            return
+        self.addrs[head][0:6] = addr
+        self.advs[head][0:n] = adv_data
+        self.adv_lens[head] = n
+        self.rssis[head] = rssi
+        self.head = nxt
+
+    def peek(self):
+        """Index of the oldest unread slot, or None if empty."""
+        if self.tail == self.head:
+            return None
+        return self.tail
+
+    def advance(self):
+        self.tail = (self.tail + 1) % self.size
 
-# Setup BLE
-ble = bluetooth.BLE()
-ble.active(True)
+
+# Setup state (created by main())
+mqtt_client = None
+ble = None
+ring = ScanRing(RING_SIZE)
 # last_device_name = None
 # last_parsed_data = None
 scan_count = 0
@@ -109,31 +177,29 @@ def parse_device_name(name, mac):
 
 
 
-def publish_scan(mac, rssi, parsed_data):
+def publish_batch(scans):
+    """Publish several parsed scans in one MQTT message."""
 
     global scan_count
 
     topic = f"hospital/medicine/scan/pico_{PICO_ID}"
-    
+
     payload = {
         'receiver_id': f"pico_{PICO_ID}",
-        'timestamp': f"{time.time()}", 
-        'mac': mac,
-        'rssi': rssi,
-        'temperature': parsed_data['temperature'],
-        'battery': parsed_data['battery'],
-        'sequence_number': parsed_data['sequence_number'],
-        'medicine': parsed_data['medicine'],
+        'timestamp': f"{time.time()}",
+        'scans': scans,
     }
-    
+
     try:
         mqtt_client.publish(
             topic.encode(),
             json.dumps(payload).encode(),
             qos=1
         )
-        scan_count += 1
-        print(f"Scan {scan_count}: {parsed_data['medicine']} ({mac}) | RSSI: {rssi} dBm | Temp: {parsed_data['temperature']}°C | Bat: {parsed_data['battery']}%")
+        scan_count += len(scans)
+        last = scans[-1]
+        print(f"Published {len(scans)} scans (total {scan_count}, ring dropped {ring.dropped}) | "
+              f"last: {last['medicine']} ({last['mac']}) RSSI: {last['rssi']} dBm | Temp: {last['temperature']}°C | Bat: {last['battery']}%")
         return True
     except Exception as e:
         print(f"Publish failed: {e}")
@@ -173,26 +239,6 @@ def parse_mfg_data(adv_data):
 
 
 
-def publish_rssi(mac, rssi):
-    topic = f"hospital/medicine/rssi_only/{mac}"
-
-    payload = {
-        'timestamp': f"{time.time()}",
-        'receiver_id': f"pico_{PICO_ID}",
-        'mac': mac,
-        'rssi': rssi
-    }
-
-    try:
-        mqtt_client.publish(
-            topic.encode(),
-            json.dumps(payload).encode(),
-            qos=1
-        )
-    except Exception as e:
-        print(f"RSSI publish failed: {e}")
-
-
 def publish_heartbeat():
     topic = f"hospital/system/pico_status/pico_{PICO_ID}"
     
@@ -200,6 +246,7 @@ def publish_heartbeat():
         'timestamp': f"{time.time()}",
         'device_id': f"pico_{PICO_ID}",
         'scan_count': scan_count,
+        'ring_dropped': ring.dropped,
         'status': 'online'
     }
     
@@ -237,45 +284,80 @@ def parse_adv_name(adv_data):
     return None
 
 def irq(event, data):
-    """BLE interrupt handler"""
-    
+    """BLE interrupt handler: copy the raw result into the ring and return"""
+
     if event == _IRQ_SCAN_RESULT:
         addr_type, addr, adv_type, rssi, adv_data = data
-        mac = ':'.join(['{:02X}'.format(b) for b in bytes(addr)])
-        
-        # Check if this is our target M5StickC
-        if mac.upper() == TAG_MAC:
-            # Parse device name from advertisement
-            parsed = parse_mfg_data(adv_data)
-            if parsed:
-                publish_scan(mac,rssi, parsed)
-                publish_rssi(mac, rssi)
-            
-    
+        ring.put(addr, rssi, adv_data)
+
     elif event == _IRQ_SCAN_DONE:
         ble.gap_scan(0, 60000, 30000, True)
 
-print(f"Scanning for {TAG_MAC} and publishing scans to MQTT...")
-print("Press Ctrl+C to stop")
 
-ble.irq(irq)
-ble.gap_scan(0, 60000, 30000, True)
+def drain_ring(batch):
+    """Parse everything queued by the IRQ, appending tag scans to batch."""
+    while True:
+        i = ring.peek()
+        if i is None:
+            return
+        # Check if this is our target M5StickC
+        if ring.addrs[i] == TAG_ADDR:
+            parsed = parse_mfg_data(memoryview(ring.advs[i])[:ring.adv_lens[i]])
+            if parsed:
+                parsed['mac'] = TAG_MAC
+                parsed['rssi'] = ring.rssis[i]
+                parsed['timestamp'] = f"{time.time()}"
+                batch.append(parsed)
+        ring.advance()
 
-last_heartbeat = time.time()
 
-try:
-    while True:
-        # Publish heartbeat every 60 seconds
-        if time.time() - last_heartbeat >= 60:
-            publish_heartbeat()
-            last_heartbeat = time.time()
-        
-        time.sleep(1)
-except KeyboardInterrupt:
-    print("\nStopping...")
-    ble.gap_scan(None)
-    mqtt_client.disconnect()
-    print(f"Total scans published: {scan_count}")
-    print("Disconnected")
+def main():
+    global mqtt_client, ble
+
+    print(f"Pico {PICO_ID} starting...")
+    connect_wifi()
+    mqtt_client = connect_mqtt()
+
+    # Setup BLE
+    ble = bluetooth.BLE()
+    ble.active(True)
 
+    print(f"Scanning for {TAG_MAC} and publishing scans to MQTT...")
+    print("Press Ctrl+C to stop")
 
+    ble.irq(irq)
+    ble.gap_scan(0, 60000, 30000, True)
+
+    last_heartbeat = time.time()
+    batch = []
+    batch_started = ticks_ms()
+
+    try:
+        while True:
+            if not batch:
+                batch_started = ticks_ms()
+            drain_ring(batch)
+
+            if batch and (len(batch) >= PUBLISH_BATCH_SIZE or
+                          ticks_diff(ticks_ms(), batch_started) >= PUBLISH_BATCH_MS):
+                publish_batch(batch)
+                batch = []
+
+            # Publish heartbeat every 60 seconds
+            if time.time() - last_heartbeat >= 60:
+                publish_heartbeat()
+                last_heartbeat = time.time()
+
+            sleep_ms(20)
+    except KeyboardInterrupt:
+        print("\nStopping...")
+        ble.gap_scan(None)
+        if batch:
+            publish_batch(batch)
+        mqtt_client.disconnect()
+        print(f"Total scans published: {scan_count}")
+        print("Disconnected")
+
+
+if __name__ == "__main__":
+    main()
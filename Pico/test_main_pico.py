@@ -0,0 +1,206 @@
+"""Off-device tests for main_pico.py on CPython.
+
+The MicroPython-only modules (bluetooth, network, micropython,
+umqtt.simple) are replaced with stubs in sys.modules before main_pico is
+imported, so the IRQ -> ring -> drain -> publish path runs unchanged.
+
+Run with:
+    python -m pytest Pico
+"""
+
+import json
+import struct
+import sys
+import time
+import types
+
+import pytest
+
+
+def _install_stubs():
+    bluetooth = types.ModuleType("bluetooth")
+    bluetooth.BLE = FakeBLE
+    network = types.ModuleType("network")
+    network.STA_IF = 0
+    network.WLAN = object
+    micropython = types.ModuleType("micropython")
+    micropython.const = lambda value: value
+    umqtt = types.ModuleType("umqtt")
+    simple = types.ModuleType("umqtt.simple")
+    simple.MQTTClient = FakeMQTTClient
+    umqtt.simple = simple
+    sys.modules.update({
+        "bluetooth": bluetooth,
+        "network": network,
+        "micropython": micropython,
+        "umqtt": umqtt,
+        "umqtt.simple": simple,
+    })
+
+
+class FakeBLE:
+    def __init__(self):
+        self.scans = []
+
+    def gap_scan(self, *args):
+        self.scans.append(args)
+
+
+class FakeMQTTClient:
+    def __init__(self, *args, **kwargs):
+        self.published = []
+
+    def publish(self, topic, msg, qos=0):
+        self.published.append((topic.decode(), json.loads(msg)))
+
+
+_install_stubs()
+import main_pico  # noqa: E402
+
+OTHER_ADDR = bytes.fromhex("112233445566")
+
+
+def make_adv(seq, temperature=4.25, battery=87, moving=False, medicine="Insulin"):
+    """Flags AD plus the M5StickC manufacturer AD, as the tag advertises it."""
+    payload = (
+        b"\xff\xff" + main_pico.TAG_ADDR + medicine.encode().ljust(12)
+        + struct.pack(">hBBH", round(temperature * 100), battery, int(moving), seq)
+    )
+    return b"\x02\x01\x06" + bytes([len(payload) + 1, 0xFF]) + payload
+
+
+def scan_result(addr, rssi, adv):
+    return (0, addr, 0, rssi, adv)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(main_pico, "ring", main_pico.ScanRing(main_pico.RING_SIZE))
+    monkeypatch.setattr(main_pico, "mqtt_client", FakeMQTTClient())
+    monkeypatch.setattr(main_pico, "ble", FakeBLE())
+    monkeypatch.setattr(main_pico, "scan_count", 0)
+
+
+def test_advert_fits_legacy_payload():
+    assert len(make_adv(1)) <= main_pico.ADV_MAX_LEN
+
+
+def test_irq_to_publish_batch():
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -61, make_adv(7)))
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(OTHER_ADDR, -40, make_adv(99)))
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(
+        main_pico.TAG_ADDR, -70, make_adv(8, temperature=-1.5, moving=True)
+    ))
+
+    batch = []
+    main_pico.drain_ring(batch)
+    assert main_pico.ring.peek() is None
+    assert main_pico.publish_batch(batch)
+
+    [(topic, payload)] = main_pico.mqtt_client.published
+    assert topic == f"hospital/medicine/scan/pico_{main_pico.PICO_ID}"
+    assert payload["receiver_id"] == f"pico_{main_pico.PICO_ID}"
+    scans = payload["scans"]
+    assert [s["sequence_number"] for s in scans] == [7, 8]
+    assert [s["rssi"] for s in scans] == [-61, -70]
+    assert all(s["mac"] == main_pico.TAG_MAC for s in scans)
+    assert scans[0]["medicine"] == "Insulin"
+    assert scans[0]["temperature"] == 4.25 and scans[0]["battery"] == 87
+    assert scans[1]["temperature"] == -1.5 and scans[1]["moving"] is True
+    assert main_pico.scan_count == 2
+
+
+def test_irq_copies_into_preallocated_slots():
+    ring = main_pico.ring
+    slots = list(ring.advs)
+    adv = bytearray(make_adv(1))
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -60, adv))
+    # The BLE stack reuses its buffer after the IRQ returns
+    adv[:] = b"\x00" * len(adv)
+
+    assert ring.advs == slots and ring.advs[0] is slots[0]
+    batch = []
+    main_pico.drain_ring(batch)
+    assert [s["sequence_number"] for s in batch] == [1]
+
+
+def test_ring_overflow_counts_and_recovers():
+    ring = main_pico.ring
+    capacity = ring.size - 1  # one slot stays empty to tell full from empty
+    for seq in range(ring.size + 10):
+        main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -60, make_adv(seq)))
+    assert ring.dropped == 11
+
+    batch = []
+    main_pico.drain_ring(batch)
+    # The oldest results are kept; the ones arriving while full are dropped
+    assert [s["sequence_number"] for s in batch] == list(range(capacity))
+
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -60, make_adv(500)))
+    main_pico.drain_ring(batch)
+    assert batch[-1]["sequence_number"] == 500
+    assert ring.dropped == 11
+
+
+def test_oversized_advert_is_dropped():
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(
+        main_pico.TAG_ADDR, -60, make_adv(1) + b"\x00" * 8
+    ))
+    assert main_pico.ring.dropped == 1
+    assert main_pico.ring.peek() is None
+
+
+def test_scan_done_restarts_scan():
+    main_pico.irq(main_pico._IRQ_SCAN_DONE, None)
+    assert main_pico.ble.scans == [(0, 60000, 30000, True)]
+
+
+def test_publish_failure_is_reported():
+    def fail(*args, **kwargs):
+        raise OSError("connection reset")
+
+    main_pico.mqtt_client.publish = fail
+    batch = []
+    main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -60, make_adv(1)))
+    main_pico.drain_ring(batch)
+    assert not main_pico.publish_batch(batch)
+    assert main_pico.scan_count == 0
+
+
+def test_throughput(capsys):
+    """Sustained IRQ -> drain -> publish rate without ring drops.
+
+    Results arrive in bursts just under the ring capacity, as they would
+    between two main-loop iterations, and are published in batches of
+    PUBLISH_BATCH_SIZE. CPython is far faster than the RP2040, so the
+    floor only guards against regressions such as per-result allocation
+    growth or quadratic draining.
+    """
+    burst = main_pico.RING_SIZE - 1
+    bursts = 200
+    advs = [make_adv(seq) for seq in range(burst)]
+
+    started = time.perf_counter()
+    irq_time = 0.0
+    batch = []
+    for _ in range(bursts):
+        t0 = time.perf_counter()
+        for adv in advs:
+            main_pico.irq(main_pico._IRQ_SCAN_RESULT, scan_result(main_pico.TAG_ADDR, -60, adv))
+        irq_time += time.perf_counter() - t0
+        main_pico.drain_ring(batch)
+        while len(batch) >= main_pico.PUBLISH_BATCH_SIZE:
+            main_pico.publish_batch(batch[:main_pico.PUBLISH_BATCH_SIZE])
+            del batch[:main_pico.PUBLISH_BATCH_SIZE]
+    elapsed = time.perf_counter() - started
+
+    total = burst * bursts
+    with capsys.disabled():
+        print(
+            f"\n  {total} scans: {total / elapsed:,.0f} scans/s end to end, "
+            f"{irq_time / total * 1e6:.2f} us per IRQ"
+        )
+    assert main_pico.ring.dropped == 0
+    assert main_pico.scan_count + len(batch) == total
+    assert sum(len(p["scans"]) for _, p in main_pico.mqtt_client.published) == main_pico.scan_count
+    assert total / elapsed > 2000
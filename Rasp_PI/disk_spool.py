@@ -0,0 +1,144 @@
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger("ble_scanner")
+
+DROP_OLDEST = "drop_oldest"
+DOWNSAMPLE = "downsample"
+
+
+class DiskSpool:
+    """Bounded on-disk store-and-forward queue for MQTT publishes.
+
+    Messages are appended to a SQLite table in WAL mode and removed from the
+    head once published, so the SD card only ever sees appends to the WAL
+    plus periodic checkpoints. Puts are buffered in memory and committed in
+    one transaction per flush() to keep the write count low.
+
+    When the spool exceeds max_messages it either drops the oldest messages
+    (DROP_OLDEST) or, with DOWNSAMPLE, deletes every second message within
+    the oldest half, oldest first and only as many as it takes to get back
+    to the cap (anything still over is then dropped from the head). The
+    outage stays covered end to end, the oldest data at lower resolution.
+    """
+
+    def __init__(self, path: str, max_messages: int, policy: str = DROP_OLDEST,
+                 commit_every: int = 50):
+        if policy not in (DROP_OLDEST, DOWNSAMPLE):
+            raise ValueError(f"Unknown spool policy: {policy}")
+
+        self.max_messages = max_messages
+        self.policy = policy
+        self.commit_every = commit_every
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                qos INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self._pending: List[Tuple[str, bytes, int]] = []
+        self._stored = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+        self.spooled_count = 0
+        self.dropped_count = 0
+        self.drained_count = 0
+
+        if self._stored:
+            logger.info(f"Spool {path} holds {self._stored} messages from a previous run")
+
+    def __len__(self) -> int:
+        return self._stored + len(self._pending)
+
+    def put(self, topic: str, payload: str, qos: int):
+        self._pending.append((topic, payload.encode(), qos))
+        self.spooled_count += 1
+        if len(self._pending) >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO spool (topic, payload, qos) VALUES (?, ?, ?)",
+                self._pending
+            )
+        self._stored += len(self._pending)
+        self._pending.clear()
+        if self._stored > self.max_messages:
+            self._enforce_cap()
+
+    def _enforce_cap(self):
+        excess = self._stored - self.max_messages
+        with self._conn:
+            if self.policy == DOWNSAMPLE:
+                # Drop every second message of the oldest half, oldest first,
+                # until back at the cap; repeated passes keep thinning the
+                # oldest data
+                self._conn.execute(
+                    "DELETE FROM spool WHERE id IN ("
+                    "  SELECT id FROM ("
+                    "    SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n"
+                    "    FROM spool ORDER BY id LIMIT ?"
+                    "  ) WHERE n % 2 = 0 LIMIT ?)",
+                    (self._stored // 2, excess)
+                )
+            # Anything still over the cap is dropped from the head
+            self._conn.execute(
+                "DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT "
+                "  MAX(0, (SELECT COUNT(*) FROM spool) - ?))",
+                (self.max_messages,)
+            )
+        remaining = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+        if not self.dropped_count:
+            logger.warning(f"Spool full ({self.max_messages} messages), applying {self.policy}")
+        self.dropped_count += self._stored - remaining
+        self._stored = remaining
+
+    def drain(self, publish: Callable[[str, bytes, int], bool], max_batch: int) -> int:
+        """Publish up to max_batch spooled messages, oldest first.
+
+        Stops at the first publish that fails; only published messages are
+        removed from the spool. Returns the number drained.
+        """
+        self.flush()
+        rows = self._conn.execute(
+            "SELECT id, topic, payload, qos FROM spool ORDER BY id LIMIT ?",
+            (max_batch,)
+        ).fetchall()
+
+        last_id = None
+        sent = 0
+        for row_id, topic, payload, qos in rows:
+            if not publish(topic, payload, qos):
+                break
+            last_id = row_id
+            sent += 1
+
+        if last_id is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+            self._stored -= sent
+            self.drained_count += sent
+        return sent
+
+    def stats(self) -> dict:
+        return {
+            'spool_depth': len(self),
+            'spooled': self.spooled_count,
+            'spool_dropped': self.dropped_count,
+            'spool_drained': self.drained_count,
+        }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -1,13 +1,17 @@
 import asyncio
 import json
+import queue
 import time
 import logging
-from collections import deque
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from bleak import BleakScanner
 import paho.mqtt.client as mqtt
 from m5stick_parser import M5StickCNameParser
+from scan_aggregator import ScanAggregator
+from tag_registry import TagRegistry
+from disk_spool import DiskSpool
+from rssi_filter import RSSIFilterBank, build_chain
 import psutil
 import ssl
 
@@ -27,9 +31,34 @@ KNOWN_MEDICINE_TAGS = [
 
 PUBLISH_ONLY_KNOWN_TAGS = False
 COMPANY_ID = 0xFFFF
+# Advertised device name of the medicine tags
+TAG_NAME = "MED_TAG"
+
+# Retained JSON {"tags": [...], "only_known_tags": bool} replaces the
+# allowlist at runtime without restarting the scanner
+TAG_CONFIG_TOPIC = "hospital/config/tags"
+
+# Store-and-forward: publishes made while the broker is unreachable go to an
+# on-disk spool and are drained in batches of SPOOL_DRAIN_BATCH per tick
+# (4 ticks/s) after reconnecting. SPOOL_FULL_POLICY is "drop_oldest" or
+# "downsample".
+SPOOL_PATH = "ble_spool.db"
+SPOOL_MAX_MESSAGES = 200_000
+SPOOL_FULL_POLICY = "drop_oldest"
+SPOOL_DRAIN_BATCH = 25
+
+# Repeated reports of one advertisement are collapsed into a single summary,
+# published when the tag's sequence number changes or after this long
+AGGREGATION_WINDOW_SECONDS = 1.0
 
 # --- Logging setup ---
-# Writes to ble_scanner.log, max 1MB per file, keeps 3 old files
+# Writes to ble_scanner.log, max 1MB per file, keeps 3 old files. Records go
+# through a queue so SD-card writes happen on a listener thread, not in the
+# scan loop; if the queue fills up, records are dropped instead of blocking.
+LOG_QUEUE_SIZE = 1000
+# Log one published scan in this many (errors are always logged)
+SCAN_LOG_EVERY = 10
+
 logger = logging.getLogger("ble_scanner")
 logger.setLevel(logging.INFO)
 
@@ -39,18 +68,36 @@ _file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(messag
 _console_handler = logging.StreamHandler()
 _console_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
 
-logger.addHandler(_file_handler)
-logger.addHandler(_console_handler)
 
-# --- RSSI Smoothing ---
-# Keeps last 5 RSSI readings per MAC and returns the average
-_rssi_history: dict[str, deque] = {}
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Same process, so format on the listener thread instead of here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+logger.addHandler(_NonBlockingQueueHandler(_log_queue))
+_log_listener = QueueListener(_log_queue, _file_handler, _console_handler)
+_log_listener.start()
+
+# --- RSSI Filtering ---
+# Filter chain applied to each aggregation-window mean, per MAC. Stages run
+# left to right: "hampel:<window>:<k>", "median:<n>", "ema:<alpha>".
+# Per-MAC state is evicted after RSSI_STATE_TTL_SECONDS idle, and the least
+# recently seen MAC is evicted beyond RSSI_STATE_MAX_MACS.
+RSSI_FILTER_CHAIN = "hampel:7:3,median:5"
+RSSI_STATE_TTL_SECONDS = 300
+RSSI_STATE_MAX_MACS = 512
 
-def smooth_rssi(mac: str, rssi: int) -> int:
-    if mac not in _rssi_history:
-        _rssi_history[mac] = deque(maxlen=5)
-    _rssi_history[mac].append(rssi)
-    return round(sum(_rssi_history[mac]) / len(_rssi_history[mac]))
+rssi_filters = RSSIFilterBank(
+    build_chain(RSSI_FILTER_CHAIN), RSSI_STATE_TTL_SECONDS, RSSI_STATE_MAX_MACS
+)
 
 
 parser = M5StickCNameParser()
@@ -59,43 +106,45 @@ parser = M5StickCNameParser()
 class MQTTPublisher:
 
     def __init__(self, broker: str, port: int, receiver_id: str,
-                 username: str = None, password: str = None):
+                 username: str = None, password: str = None,
+                 registry: TagRegistry = None, spool: DiskSpool = None):
         self.broker = broker
         self.port = port
         self.receiver_id = receiver_id
+        self.registry = registry
+        self.spool = spool
         self.client = mqtt.Client(client_id=f"{receiver_id}_{int(time.time())}")
         if username and password:
             self.client.username_pw_set(username, password)
         # Connection resilience: auto-reconnect after 1s, up to 30s backoff
         self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        # Keep paho's in-memory queue small; anything beyond it goes to the spool
+        if spool is not None:
+            self.client.max_queued_messages_set(SPOOL_DRAIN_BATCH * 8)
 
         self.client.on_connect = self._on_connect
         self.client.on_publish = self._on_publish
         self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
 
         self.connected = False
         self.publish_count = 0
-
-    def publish_rssi(self, mac: str, rssi: int):
-        topic = f"hospital/medicine/rssi_only/{mac}"
-
-        payload = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'receiver_id': self.receiver_id,
-            'mac': mac,
-            'rssi': rssi
-        }
-
-        self.client.publish(topic, json.dumps(payload), qos=MQTT_QOS)
+        self.scans_published = 0
 
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logger.info(f"Connected to MQTT broker at {self.broker}:{self.port}")
             self.connected = True
+            if self.registry:
+                self.client.subscribe(TAG_CONFIG_TOPIC, qos=1)
         else:
             logger.error(f"Connection failed with code {rc}")
             self.connected = False
 
+    def _on_message(self, client, userdata, msg):
+        if msg.topic == TAG_CONFIG_TOPIC and self.registry:
+            self.registry.handle_config(msg.payload)
+
     def _on_publish(self, client, userdata, mid):
         self.publish_count += 1
 
@@ -108,49 +157,97 @@ class MQTTPublisher:
             logger.info("Disconnected from MQTT broker")
 
     def connect(self):
-        try:
-            logger.info(f"Connecting to MQTT broker at {self.broker}:{self.port}...")
-            self.client.connect(self.broker, self.port, keepalive=60)
-            self.client.loop_start()
+        logger.info(f"Connecting to MQTT broker at {self.broker}:{self.port}...")
+        self.client.connect_async(self.broker, self.port, keepalive=60)
+        self.client.loop_start()
 
-            timeout = 5
-            while not self.connected and timeout > 0:
-                time.sleep(0.1)
-                timeout -= 0.1
+        timeout = 5
+        while not self.connected and timeout > 0:
+            time.sleep(0.1)
+            timeout -= 0.1
 
-            if not self.connected:
+        if not self.connected:
+            if self.spool is None:
                 raise Exception("Connection timeout")
+            # paho keeps retrying in the background; spool until it succeeds
+            logger.warning("MQTT broker not reachable yet, spooling publishes to disk")
+
+    @staticmethod
+    def _accepted(rc: int, qos: int) -> bool:
+        """Whether paho took ownership of a publish with this result code.
+
+        With QoS > 0, MQTT_ERR_NO_CONN still leaves the message in paho's
+        queue and it is sent after reconnecting; only MQTT_ERR_QUEUE_SIZE
+        means it was refused. QoS 0 messages are only kept on success.
+        """
+        if rc == mqtt.MQTT_ERR_SUCCESS:
+            return True
+        return qos > 0 and rc != mqtt.MQTT_ERR_QUEUE_SIZE
+
+    def _publish(self, topic: str, payload: str, qos: int = MQTT_QOS) -> bool:
+        """Publish, or spool to disk while disconnected or a backlog is draining."""
+        # self.connected can lag a drop by a keepalive; ask paho as well
+        connected = self.connected and self.client.is_connected()
+        if self.spool is not None and (not connected or len(self.spool)):
+            self.spool.put(topic, payload, qos)
+            return True
+
+        result = self.client.publish(topic, payload, qos=qos)
+        if self._accepted(result.rc, qos):
+            return True
+        # Spool only what paho refused, or it would be delivered twice
+        if self.spool is not None:
+            self.spool.put(topic, payload, qos)
+            return True
+        return False
+
+    def drain_spool(self):
+        """Forward one rate-limited batch of spooled messages, if connected."""
+        if self.spool is None or not self.connected or not self.client.is_connected():
+            return
+        if not len(self.spool):
+            return
 
-        except Exception as e:
-            logger.error(f"Failed to connect to MQTT broker: {e}")
-            raise
+        def send(topic, payload, qos):
+            return self._accepted(self.client.publish(topic, payload, qos=qos).rc, qos)
 
-    def publish_scan(self, mac: str, rssi: int, parsed_data: dict):
+        sent = self.spool.drain(send, SPOOL_DRAIN_BATCH)
+        if sent and not len(self.spool):
+            logger.info(f"Spool drained ({self.spool.drained_count} messages forwarded so far)")
+
+    def publish_scan(self, mac: str, rssi: int, summary: dict):
         topic = f"hospital/medicine/scan/{self.receiver_id}"
 
+        now = datetime.utcnow()
         payload = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'timestamp': now.isoformat() + 'Z',
+            # When the advert was first heard, for radio->publish latency
+            'observed_at': (now - timedelta(seconds=summary['window_age'])).isoformat() + 'Z',
             'receiver_id': self.receiver_id,
             'mac': mac,
             'rssi': rssi,
-            'temperature': parsed_data['temperature'],
-            'battery': parsed_data['battery'],
-            'medicine': parsed_data['medicine'],
-            'sequence_number': parsed_data['sequence_number'],
-            'moving': parsed_data.get('moving', False),
+            'rssi_mean': summary['rssi_mean'],
+            'rssi_max': summary['rssi_max'],
+            'rssi_count': summary['rssi_count'],
+            'rssi_variance': summary['rssi_variance'],
+            'temperature': summary['temperature'],
+            'battery': summary['battery'],
+            'medicine': summary['medicine'],
+            'sequence_number': summary['sequence_number'],
+            'moving': summary.get('moving', False),
         }
 
-        result = self.client.publish(topic, json.dumps(payload), qos=MQTT_QOS)
-
-        if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            logger.info(
-                f"SCAN | {parsed_data['medicine']} | MAC: {mac} | "
-                f"RSSI: {rssi} dBm | Temp: {parsed_data['temperature']}C | "
-                f"Bat: {parsed_data['battery']}% | Seq: {parsed_data['sequence_number']}"
-            )
+        if self._publish(topic, json.dumps(payload)):
+            self.scans_published += 1
+            if self.scans_published % SCAN_LOG_EVERY == 0:
+                logger.info(
+                    "SCAN | %s | MAC: %s | RSSI: %s dBm (max %s, n=%s) | Temp: %sC | Bat: %s%% | Seq: %s",
+                    summary['medicine'], mac, rssi, summary['rssi_max'], summary['rssi_count'],
+                    summary['temperature'], summary['battery'], summary['sequence_number']
+                )
             return True
         else:
-            logger.error(f"Publish failed for {mac}: {result.rc}")
+            logger.error(f"Publish failed for {mac}")
             return False
 
     def publish_heartbeat(self):
@@ -163,13 +260,23 @@ class MQTTPublisher:
             'scan_count': self.publish_count,
             'status': 'online'
         }
+        if self.registry:
+            payload.update(self.registry.stats())
+        if self.spool is not None:
+            payload.update(self.spool.stats())
+        payload['rssi_state_macs'] = len(rssi_filters)
 
         self.client.publish(topic, json.dumps(payload), qos=1)
-        logger.info(f"Heartbeat | uptime: {payload['uptime']}s | scans: {self.publish_count}")
+        logger.info(
+            f"Heartbeat | uptime: {payload['uptime']}s | scans: {self.publish_count} | "
+            f"adverts seen/passed: {payload.get('adverts_seen', '-')}/{payload.get('adverts_passed', '-')}"
+        )
 
     def disconnect(self):
         self.client.loop_stop()
         self.client.disconnect()
+        if self.spool is not None:
+            self.spool.close()
 
 
 async def scan_and_publish():
@@ -178,9 +285,13 @@ async def scan_and_publish():
     logger.info(f"Broker: {MQTT_BROKER}:{MQTT_PORT}  Receiver: {RECEIVER_ID}")
     logger.info("=" * 60)
 
+    registry = TagRegistry(KNOWN_MEDICINE_TAGS, COMPANY_ID, PUBLISH_ONLY_KNOWN_TAGS, TAG_NAME)
+
     publisher = MQTTPublisher(
         MQTT_BROKER, MQTT_PORT, RECEIVER_ID,
-        MQTT_USERNAME, MQTT_PASSWORD
+        MQTT_USERNAME, MQTT_PASSWORD,
+        registry=registry,
+        spool=DiskSpool(SPOOL_PATH, SPOOL_MAX_MESSAGES, SPOOL_FULL_POLICY)
     )
 
     try:
@@ -189,26 +300,26 @@ async def scan_and_publish():
         logger.error("Cannot start: MQTT broker not available")
         return
 
-    logger.info("Scanning for MED_TAG devices...")
+    logger.info(f"Scanning for {TAG_NAME} devices...")
+
+    def on_summary(summary):
+        # Filter the per-window mean across windows before publishing
+        filtered = rssi_filters.apply(summary['mac'], summary['rssi_mean'])
+        publisher.publish_scan(summary['mac'], filtered, summary)
+
+    aggregator = ScanAggregator(AGGREGATION_WINDOW_SECONDS, on_summary)
 
     def callback(device, advertisement_data):
         mac = device.address.upper()
-        device_name = device.name if device.name else "Unknown"
-        raw_rssi = advertisement_data.rssi
 
-        is_known_tag = mac in [tag.upper() for tag in KNOWN_MEDICINE_TAGS]
-        if PUBLISH_ONLY_KNOWN_TAGS and not is_known_tag:
+        # Company ID / name / allowlist prefilter — rejects unrelated devices cheaply
+        mfg_bytes = registry.match(mac, device.name, advertisement_data.manufacturer_data)
+        if not mfg_bytes:
             return
 
-        if device_name == "MED_TAG":
-            mfg_bytes = advertisement_data.manufacturer_data.get(COMPANY_ID)
-            if mfg_bytes:
-                parsed_data = parser.parse_manufacturer(mfg_bytes, mac)
-                if parsed_data:
-                    # Smooth RSSI before publishing
-                    smoothed = smooth_rssi(mac, raw_rssi)
-                    publisher.publish_scan(mac, smoothed, parsed_data)
-                    publisher.publish_rssi(mac, smoothed)
+        parsed_data = parser.parse_manufacturer(mfg_bytes, mac)
+        if parsed_data:
+            aggregator.add(mac, advertisement_data.rssi, parsed_data)
 
     scanner = BleakScanner(callback, scanning_mode="active")
     await scanner.start()
@@ -217,7 +328,10 @@ async def scan_and_publish():
 
     try:
         while True:
-            await asyncio.sleep(1)
+            await asyncio.sleep(AGGREGATION_WINDOW_SECONDS / 4)
+            aggregator.flush_expired()
+            rssi_filters.evict_idle()
+            publisher.drain_spool()
             if time.time() - last_heartbeat >= 60:
                 publisher.publish_heartbeat()
                 last_heartbeat = time.time()
@@ -226,8 +340,12 @@ async def scan_and_publish():
         logger.info("Stopping scanner...")
     finally:
         await scanner.stop()
+        aggregator.flush_all()
         publisher.disconnect()
-        logger.info(f"Total messages published: {publisher.publish_count}")
+        logger.info(
+            f"Total messages published: {publisher.publish_count} "
+            f"({aggregator.adverts_seen} adverts aggregated into {aggregator.summaries_emitted} summaries)"
+        )
 
 
 def main():
@@ -235,6 +353,8 @@ def main():
         asyncio.run(scan_and_publish())
     except KeyboardInterrupt:
         logger.info("Exiting...")
+    finally:
+        _log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict, deque
+from statistics import median
+from typing import List, Optional
+
+
+class EMAFilter:
+    """Exponential moving average; state is the last output."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+
+    def new_state(self):
+        return [None]
+
+    def apply(self, state, value: float) -> float:
+        prev = state[0]
+        state[0] = value if prev is None else prev + self.alpha * (value - prev)
+        return state[0]
+
+
+class MedianFilter:
+    """Median of the last n values."""
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def new_state(self):
+        return deque(maxlen=self.n)
+
+    def apply(self, state, value: float) -> float:
+        state.append(value)
+        return median(state)
+
+
+class HampelFilter:
+    """Replace outliers more than k scaled MADs from the window median."""
+
+    def __init__(self, window: int, k: float):
+        self.window = window
+        self.k = k
+
+    def new_state(self):
+        return deque(maxlen=self.window)
+
+    def apply(self, state, value: float) -> float:
+        state.append(value)
+        if len(state) < 3:
+            return value
+        med = median(state)
+        mad = 1.4826 * median(abs(v - med) for v in state)
+        if mad and abs(value - med) > self.k * mad:
+            state[-1] = med
+            return med
+        return value
+
+
+_FILTERS = {
+    'ema': lambda alpha: EMAFilter(float(alpha)),
+    'median': lambda n: MedianFilter(int(n)),
+    'hampel': lambda window, k: HampelFilter(int(window), float(k)),
+}
+
+
+def build_chain(spec: str) -> list:
+    """Parse a chain spec like "hampel:7:3,median:5,ema:0.3"."""
+    stages = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, *args = item.split(':')
+        if name not in _FILTERS:
+            raise ValueError(f"Unknown RSSI filter: {name}")
+        stages.append(_FILTERS[name](*args))
+    return stages
+
+
+class RSSIFilterBank:
+    """Per-MAC RSSI filter chain with bounded, self-evicting state.
+
+    State is kept in an OrderedDict ordered by last use, so MACs idle for
+    longer than ttl_seconds are popped from the front, and the least recently
+    seen MAC is evicted as soon as max_macs is exceeded. Phones walking past
+    a receiver therefore cost memory only while they are in range.
+    """
+
+    def __init__(self, stages: list, ttl_seconds: float, max_macs: int):
+        self.stages = stages
+        self.ttl_seconds = ttl_seconds
+        self.max_macs = max_macs
+        # mac -> (last_seen, [state per stage])
+        self._state: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evicted_count = 0
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def apply(self, mac: str, rssi: float, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+
+        entry = self._state.pop(mac, None)
+        states: List = entry[1] if entry else [stage.new_state() for stage in self.stages]
+        self._state[mac] = (now, states)
+
+        if len(self._state) > self.max_macs:
+            self._state.popitem(last=False)
+            self.evicted_count += 1
+
+        value = rssi
+        for stage, state in zip(self.stages, states):
+            value = stage.apply(state, value)
+        return round(value)
+
+    def evict_idle(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        while self._state:
+            mac, (last_seen, _) = next(iter(self._state.items()))
+            if now - last_seen < self.ttl_seconds:
+                break
+            del self._state[mac]
+            self.evicted_count += 1
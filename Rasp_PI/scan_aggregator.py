@@ -0,0 +1,91 @@
+import time
+from typing import Callable, Dict, Optional
+
+
+class _Window:
+    """RSSI statistics for one (MAC, sequence_number) advertisement."""
+
+    __slots__ = ("mac", "parsed", "opened", "count", "mean", "m2", "max")
+
+    def __init__(self, mac: str, parsed: dict, opened: float):
+        self.mac = mac
+        self.parsed = parsed
+        self.opened = opened
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = None
+
+    def add(self, rssi: int):
+        # Welford's running mean/variance, so no per-advert list is kept
+        self.count += 1
+        delta = rssi - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (rssi - self.mean)
+        if self.max is None or rssi > self.max:
+            self.max = rssi
+
+    def summary(self, now: float) -> dict:
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            'mac': self.mac,
+            # Seconds since the first report, to date the advert on publish
+            'window_age': round(now - self.opened, 3),
+            'rssi_mean': round(self.mean, 2),
+            'rssi_max': self.max,
+            'rssi_count': self.count,
+            'rssi_variance': round(variance, 2),
+            **self.parsed,
+        }
+
+
+class ScanAggregator:
+    """Collapse repeated reports of the same advertisement into one summary.
+
+    Active scanning reports each advertisement many times. Reports for a MAC
+    are accumulated until its sequence_number changes or the window has been
+    open for window_seconds, then on_summary is called once with the RSSI
+    mean, max, count and variance plus the parsed telemetry.
+    """
+
+    def __init__(self, window_seconds: float, on_summary: Callable[[dict], None]):
+        self.window_seconds = window_seconds
+        self.on_summary = on_summary
+        self._windows: Dict[str, _Window] = {}
+
+        self.adverts_seen = 0
+        self.summaries_emitted = 0
+
+    def add(self, mac: str, rssi: int, parsed: dict, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.adverts_seen += 1
+
+        window = self._windows.get(mac)
+        if window is not None and window.parsed['sequence_number'] != parsed['sequence_number']:
+            # Tag moved on to a new advertisement — close the old one now
+            self._emit(self._windows.pop(mac), now)
+            window = None
+
+        if window is None:
+            window = _Window(mac, parsed, now)
+            self._windows[mac] = window
+
+        window.add(rssi)
+
+    def flush_expired(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        expired = [
+            mac for mac, window in self._windows.items()
+            if now - window.opened >= self.window_seconds
+        ]
+        for mac in expired:
+            self._emit(self._windows.pop(mac), now)
+
+    def flush_all(self):
+        now = time.monotonic()
+        for mac in list(self._windows):
+            self._emit(self._windows.pop(mac), now)
+
+    def _emit(self, window: _Window, now: float):
+        self.summaries_emitted += 1
+        self.on_summary(window.summary(now))
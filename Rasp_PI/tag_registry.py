@@ -0,0 +1,81 @@
+import json
+import logging
+from typing import Iterable, Optional
+
+logger = logging.getLogger("ble_scanner")
+
+
+class TagRegistry:
+    """Allowlist prefilter for BLE advertisements.
+
+    Runs first in the scan callback, so a hospital full of unrelated BLE
+    devices costs one dict lookup per advert: adverts without COMPANY_ID
+    manufacturer data are rejected before anything else, then devices not
+    named like a tag (0xFFFF is the shared test ID, so other devices use it
+    too) and (optionally) MACs outside the allowlist. The allowlist is a frozenset that is replaced
+    wholesale by update(), so the MQTT thread can swap it while the scanner
+    keeps reading the old one without a lock.
+    """
+
+    def __init__(self, tags: Iterable[str], company_id: int, only_known: bool, tag_name: str):
+        self.company_id = company_id
+        self.tag_name = tag_name
+        self.only_known = only_known
+        self._tags = frozenset(tag.upper() for tag in tags)
+
+        self.adverts_seen = 0
+        self.adverts_passed = 0
+
+    @property
+    def tags(self) -> frozenset:
+        return self._tags
+
+    def match(self, mac: str, name: Optional[str], manufacturer_data: dict) -> Optional[bytes]:
+        """Return the tag's manufacturer payload if the advert passes, else None."""
+        self.adverts_seen += 1
+
+        mfg_bytes = manufacturer_data.get(self.company_id)
+        if mfg_bytes is None:
+            return None
+        if name != self.tag_name:
+            return None
+        if self.only_known and mac not in self._tags:
+            return None
+
+        self.adverts_passed += 1
+        return mfg_bytes
+
+    def update(self, tags: Iterable[str], only_known: Optional[bool] = None):
+        self._tags = frozenset(tag.upper() for tag in tags)
+        if only_known is not None:
+            self.only_known = only_known
+        logger.info(f"Tag allowlist updated: {len(self._tags)} tags, only_known={self.only_known}")
+
+    def handle_config(self, payload: bytes):
+        """Apply a config message: {"tags": [...], "only_known_tags": bool}.
+
+        Runs in the paho callback, so nothing may escape: an exception here
+        would end the MQTT loop. Invalid messages are logged and ignored.
+        """
+        try:
+            config = json.loads(payload.decode())
+            if not isinstance(config, dict):
+                raise ValueError("config must be a JSON object")
+            tags = config.get('tags')
+            if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                raise ValueError("'tags' must be a list of strings")
+            only_known = config.get('only_known_tags')
+            if only_known is not None and not isinstance(only_known, bool):
+                raise ValueError("'only_known_tags' must be a boolean")
+            self.update(tags, only_known)
+        except ValueError as e:
+            logger.error(f"Ignoring invalid tag config: {e}")
+        except Exception as e:
+            logger.error(f"Ignoring tag config that could not be applied: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'adverts_seen': self.adverts_seen,
+            'adverts_passed': self.adverts_passed,
+            'known_tags': len(self._tags),
+        }
@@ -0,0 +1,191 @@
+"""Admission control for the Medical Tracker IoT backend.
+
+MQTT callbacks run on paho's network thread. If handling a message blocks
+(a slow InfluxDB write, say), that thread stops reading the socket,
+keepalives slip and the broker drops the connection, losing everything.
+AdmissionQueue decouples the two: the callback only classifies and
+enqueues, and a worker thread does the real work, highest priority first.
+
+Priority classes, most important first:
+    CRITICAL    alerts and movement
+    TRACKING    RSSI readings that feed position solving
+    TELEMETRY   persistence of raw scans
+
+The queue is bounded. Its shed level rises with depth and falls with
+hysteresis: at level 1 new TELEMETRY work is shed, at level 2 TRACKING
+work is shed as well, and CRITICAL work is only dropped when the queue is
+completely full. A level only drops once the depth has fallen to
+recover_ratio of the threshold that raised it, so the service does not
+flap between states.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = 0
+TRACKING = 1
+TELEMETRY = 2
+CLASS_NAMES = ("critical", "tracking", "telemetry")
+
+
+class AdmissionQueue:
+    """Bounded priority work queue with hysteretic load shedding."""
+
+    def __init__(
+        self,
+        capacity: int,
+        shed_telemetry_at: float = 0.5,
+        shed_tracking_at: float = 0.8,
+        recover_ratio: float = 0.5
+    ) -> None:
+        """Initialize the queue.
+
+        Args:
+            capacity: Maximum queued jobs across all classes.
+            shed_telemetry_at: Fill ratio that raises the level to 1.
+            shed_tracking_at: Fill ratio that raises the level to 2.
+            recover_ratio: A level drops once depth falls below this
+                fraction of the threshold that raised it.
+        """
+        self.capacity = capacity
+        self._raise_at = (int(capacity * shed_telemetry_at), int(capacity * shed_tracking_at))
+        self._lower_at = tuple(int(t * recover_ratio) for t in self._raise_at)
+
+        self._queues: List[deque] = [deque() for _ in CLASS_NAMES]
+        self._depth = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.level = 0
+        self.offered = [0] * len(CLASS_NAMES)
+        self.shed = [0] * len(CLASS_NAMES)
+        self.done = [0] * len(CLASS_NAMES)
+        self.failed = 0
+        self.max_depth = 0
+        self.transitions = 0
+        self._overloaded_since = None
+        self.overload_seconds = 0.0
+
+    def _update_level(self) -> None:
+        """Recompute the shed level from the depth; the caller holds the lock."""
+        level = self.level
+        while level < 2 and self._depth >= self._raise_at[level]:
+            level += 1
+        while level > 0 and self._depth <= self._lower_at[level - 1]:
+            level -= 1
+        if level == self.level:
+            return
+
+        now = time.monotonic()
+        if self.level == 0:
+            self._overloaded_since = now
+        elif level == 0:
+            self.overload_seconds += now - self._overloaded_since
+            self._overloaded_since = None
+        logger.warning(
+            f"Admission level {self.level} -> {level} at depth {self._depth}/{self.capacity}"
+            + (f", shedding {', '.join(CLASS_NAMES[3 - level:])}" if level else ", recovered")
+        )
+        self.level = level
+        self.transitions += 1
+
+    def sheds(self, priority: int) -> bool:
+        """Whether new work of this class is currently being shed."""
+        return priority != CRITICAL and priority >= 3 - self.level
+
+    def offer(self, priority: int, fn: Callable[..., Any], *args: Any) -> bool:
+        """Queue fn(*args) under a priority class, unless it is shed.
+
+        Never blocks.
+
+        Returns:
+            bool: True if the job was queued.
+        """
+        with self._cond:
+            self.offered[priority] += 1
+            if self.sheds(priority) or self._depth >= self.capacity:
+                self.shed[priority] += 1
+                return False
+            self._queues[priority].append((fn, args))
+            self._depth += 1
+            if self._depth > self.max_depth:
+                self.max_depth = self._depth
+            self._update_level()
+            self._cond.notify()
+            return True
+
+    def _take(self):
+        """Pop the highest-priority job; the caller holds the lock."""
+        for priority, jobs in enumerate(self._queues):
+            if jobs:
+                self._depth -= 1
+                self._update_level()
+                return priority, jobs.popleft()
+        return None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="admission-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker after draining what it can within timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._depth and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not self._depth:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                priority, (fn, args) = self._take()
+            try:
+                fn(*args)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Admitted {CLASS_NAMES[priority]} job failed: {e}")
+            self.done[priority] += 1
+            if not self._depth:
+                with self._cond:
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            overload = self.overload_seconds
+            if self._overloaded_since is not None:
+                overload += time.monotonic() - self._overloaded_since
+            return {
+                "level": self.level,
+                "depth": self._depth,
+                "capacity": self.capacity,
+                "max_depth": self.max_depth,
+                "transitions": self.transitions,
+                "overload_seconds": round(overload, 1),
+                "failed": self.failed,
+                "classes": {
+                    name: {
+                        "queued": len(self._queues[i]),
+                        "offered": self.offered[i],
+                        "shed": self.shed[i],
+                        "done": self.done[i],
+                    }
+                    for i, name in enumerate(CLASS_NAMES)
+                },
+            }
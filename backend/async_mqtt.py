@@ -0,0 +1,221 @@
+"""Run the paho MQTT client on the asyncio event loop.
+
+In the default thread mode, main.py runs paho's loop_forever() in a daemon
+thread. AsyncMqttRunner instead drives the same client from the server's
+event loop through paho's external-loop hooks: the socket is registered
+with loop.add_reader/add_writer, loop_read()/loop_write() run when it is
+ready, and a task calls loop_misc() for keepalives. Messages are therefore
+received on the event loop thread; the tracker only routes them into its
+admission queue there, and storage writes stay on the worker threads.
+
+Reconnects use capped exponential backoff with full jitter, so a fleet of
+backends restarting together does not hit the broker in lockstep, and the
+time from losing the connection to the next CONNACK is recorded.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(
+    attempt: int,
+    min_delay: float,
+    max_delay: float,
+    rng: Optional[random.Random] = None
+) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max, min * 2**attempt)].
+
+    The first retry (attempt 0) waits at most min_delay.
+    """
+    ceiling = min(max_delay, min_delay * (2 ** min(attempt, 32)))
+    return (rng or random).uniform(0.0, ceiling)
+
+
+class AsyncMqttRunner:
+    """Connects, services and reconnects a paho client on the running event loop."""
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        host: str,
+        port: int,
+        keepalive: int = 60,
+        min_delay: float = 0.5,
+        max_delay: float = 30.0
+    ) -> None:
+        """Initialize the runner.
+
+        Args:
+            client: Configured paho client (callbacks and TLS already set).
+            host: Broker host.
+            port: Broker port.
+            keepalive: MQTT keepalive in seconds.
+            min_delay: Backoff ceiling of the first reconnect attempt.
+            max_delay: Largest backoff ceiling.
+        """
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._fd: Optional[int] = None
+        self._writing = False
+
+        self.attempt = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.failed_attempts = 0
+        self.reconnects = 0
+        self._down_since: Optional[float] = None
+        # Seconds from losing the connection to the next CONNACK
+        self.reconnect_seconds: deque = deque(maxlen=100)
+
+        self._on_connect = client.on_connect
+        client.on_connect = self._handle_connect
+        client.on_socket_open = self._socket_open
+        client.on_socket_close = self._socket_close
+        client.on_socket_register_write = self._register_write
+        client.on_socket_unregister_write = self._unregister_write
+
+    def _on_loop(self, fn, *args) -> None:
+        """Run fn on the event loop; connect() opens the socket on an executor thread."""
+        if threading.get_ident() == self._loop_thread:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _socket_open(self, client, userdata, sock) -> None:
+        self._on_loop(self._add_reader, sock.fileno())
+
+    def _add_reader(self, fd: int) -> None:
+        self._fd = fd
+        self._loop.add_reader(fd, self.client.loop_read)
+
+    def _socket_close(self, client, userdata, sock) -> None:
+        # sock is closed right after this returns, so pass on the descriptor
+        self._on_loop(self._remove, sock.fileno())
+
+    def _remove(self, fd: int) -> None:
+        self._loop.remove_reader(fd)
+        self._loop.remove_writer(fd)
+        self._writing = False
+        if self._fd == fd:
+            self._fd = None
+            self._closed.set()
+
+    def _register_write(self, client, userdata, sock) -> None:
+        self._on_loop(self._add_writer, sock.fileno())
+
+    def _add_writer(self, fd: int) -> None:
+        if not self._writing and fd == self._fd:
+            self._writing = True
+            self._loop.add_writer(fd, self.client.loop_write)
+
+    def _unregister_write(self, client, userdata, sock) -> None:
+        self._on_loop(self._remove_writer, sock.fileno())
+
+    def _remove_writer(self, fd: int) -> None:
+        if self._writing:
+            self._writing = False
+            self._loop.remove_writer(fd)
+
+    def _handle_connect(self, client, userdata, flags, rc) -> None:
+        if self._on_connect is not None:
+            self._on_connect(client, userdata, flags, rc)
+        if rc != 0:
+            return
+        self.connects += 1
+        self.attempt = 0
+        if self._down_since is not None:
+            self.reconnects += 1
+            self.reconnect_seconds.append(time.monotonic() - self._down_since)
+            self._down_since = None
+
+    async def _misc_loop(self) -> None:
+        """Send keepalive pings and detect a silent broker."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1.0)
+
+    async def _wait_stopping(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        """Keep the client connected until stop() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+
+        while not self._stopping.is_set():
+            self._closed.clear()
+            logger.info(f"Connecting to MQTT broker at {self.host}:{self.port}")
+            try:
+                await self._loop.run_in_executor(
+                    None, self.client.connect, self.host, self.port, self.keepalive
+                )
+            except Exception as e:
+                self.failed_attempts += 1
+                logger.error(f"MQTT error: {e}")
+            else:
+                misc = asyncio.create_task(self._misc_loop())
+                await self._closed.wait()
+                misc.cancel()
+                if self._down_since is None and self.connects:
+                    self._down_since = time.monotonic()
+                    self.disconnects += 1
+
+            if self._stopping.is_set():
+                break
+            delay = backoff_delay(self.attempt, self.min_delay, self.max_delay)
+            self.attempt += 1
+            logger.info(f"Reconnecting to MQTT broker in {delay:.2f}s (attempt {self.attempt})")
+            await self._wait_stopping(delay)
+
+    def start(self) -> asyncio.Task:
+        """Start run() as a task on the running event loop."""
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Disconnect cleanly and wait for run() to return."""
+        self._stopping.set()
+        if self.client.is_connected():
+            self.client.disconnect()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        reconnects = list(self.reconnect_seconds)
+        return {
+            "mode": "asyncio",
+            "connected": self.client.is_connected(),
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "failed_attempts": self.failed_attempts,
+            "attempt": self.attempt,
+            "reconnects": self.reconnects,
+            "last_reconnect_seconds": round(reconnects[-1], 3) if reconnects else None,
+            "mean_reconnect_seconds": round(sum(reconnects) / len(reconnects), 3) if reconnects else None,
+            "max_reconnect_seconds": round(max(reconnects), 3) if reconnects else None,
+        }
@@ -0,0 +1,111 @@
+"""Benchmark N single history calls against one batch call.
+
+A ward dashboard used to fetch /api/medicine/{mac}/history once per tag.
+This script fills a temporary SQLite store with synthetic scans and
+positions, then times, through the FastAPI app in-process:
+
+    single   one GET /api/medicine/{mac}/history per tag
+    batch    one GET /api/medicines/history?mac=...&mac=...
+
+With STORAGE_BACKEND=influxdb and a reachable InfluxDB holding data for
+the same tags, pass --influx to time the real Flux queries instead (no
+data is written).
+
+Usage:
+    python bench_batch_history.py --tags 50 --hours 2 --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from fastapi.testclient import TestClient
+
+import main
+from sqlite_database import SQLiteDatabase
+
+
+def make_macs(tags: int) -> List[str]:
+    return [f"AA:BB:CC:00:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}" for i in range(tags)]
+
+
+def fill(db: SQLiteDatabase, macs: List[str], hours: float, interval: float, receivers: int) -> int:
+    """Write one scan per receiver and one position per tag every interval seconds."""
+    now = datetime.utcnow()
+    steps = int(hours * 3600 / interval)
+    rows = 0
+    for step in range(steps):
+        ts = now - timedelta(seconds=step * interval)
+        for i, mac in enumerate(macs):
+            for r in range(receivers):
+                db.write_scan(mac, f"receiver_{r}", 2.0 + r, f"medicine_{i % 5}", battery=90, timestamp=ts)
+            db.write_positions([{
+                "mac": mac, "x": 1.0, "y": 2.0, "z": 0.0, "accuracy": 0.5,
+                "medicine": f"medicine_{i % 5}", "receiver_count": receivers, "timestamp": ts,
+            }])
+            rows += receivers + 1
+    db.flush()
+    return rows
+
+
+def timed(fn: Callable[[], int], repeat: int) -> tuple:
+    """Best-of-repeat seconds and the record count of the last run."""
+    best, records = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, records
+
+
+def main_(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark batch history queries")
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--hours", type=float, default=2.0, help="History to generate and query")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between synthetic records")
+    parser.add_argument("--receivers", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--influx", action="store_true", help="Query the configured InfluxDB instead")
+    args = parser.parse_args(argv)
+
+    macs = make_macs(args.tags)
+    hours = max(1, int(round(args.hours)))
+    if args.influx:
+        db = main.create_database()
+        db.connect()
+        print(f"InfluxDB at {main.settings.INFLUXDB_URL}, {args.tags} tags")
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        db = SQLiteDatabase(path, batch_size=5000)
+        db.connect()
+        rows = fill(db, macs, args.hours, args.interval, args.receivers)
+        print(f"SQLite, {args.tags} tags, {rows} rows over {args.hours:g}h")
+    main.db = db
+
+    client = TestClient(main.app)
+
+    def single() -> int:
+        return sum(
+            len(client.get(f"/api/medicine/{mac}/history", params={"hours": hours}).json())
+            for mac in macs
+        )
+
+    def batch() -> int:
+        body = client.get("/api/medicines/history", params={"mac": macs, "hours": hours}).json()
+        return sum(map(len, body.values()))
+
+    single_s, single_records = timed(single, args.repeat)
+    batch_s, batch_records = timed(batch, args.repeat)
+    print(f"  {args.tags} single calls  {single_s * 1000:9.1f} ms  {single_records} records")
+    print(f"  1 batch call      {batch_s * 1000:9.1f} ms  {batch_records} records")
+    print(f"  speedup           {single_s / batch_s:9.2f}x")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,144 @@
+"""Benchmark the MQTT ingest path and its logging overhead.
+
+Feeds synthetic scan messages through MedicineTracker.on_message against an
+in-memory storage stub, so the numbers cover routing, decoding, dedup,
+buffering, alignment and scheduling but no real database I/O. Each run
+uses a different logging setup, all writing to os.devnull:
+
+    off        root level WARNING, nothing is logged
+    sync       every hot-path record formatted and written on the caller's
+               thread (the previous basicConfig behaviour)
+    queued     configure_logging() with LOG_SAMPLING and LOG_RATE_LIMIT
+
+Usage:
+    python bench_ingest.py --tags 300 --adverts 20
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, List
+
+from config import settings
+from hot_logging import LOG_FORMAT, configure_logging, set_sampling, stop_logging
+from mqtt_handler import MedicineTracker
+
+
+class NullStorage:
+    """Accepts every write and keeps only counts."""
+
+    def __init__(self) -> None:
+        self.scans = 0
+        self.positions = 0
+
+    def write_scan(self, **kwargs: Any) -> bool:
+        self.scans += 1
+        return True
+
+    def write_positions(self, positions: List[dict]) -> bool:
+        self.positions += len(positions)
+        return True
+
+    def write_position(self, **kwargs: Any) -> bool:
+        self.positions += 1
+        return True
+
+    def write_alert(self, **kwargs: Any) -> bool:
+        return True
+
+
+class Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic: str, payload: bytes) -> None:
+        self.topic = topic
+        self.payload = payload
+
+
+def make_messages(receivers: List[str], tags: int, adverts: int) -> List[Message]:
+    messages = []
+    for seq in range(1, adverts + 1):
+        for tag in range(tags):
+            for i, receiver_id in enumerate(receivers):
+                payload = {
+                    "receiver_id": receiver_id,
+                    "mac": f"AA:BB:CC:00:{tag >> 8:02X}:{tag & 0xFF:02X}",
+                    "rssi": -55 - 4 * i - seq % 5,
+                    "temperature": 21.5,
+                    "battery": 90,
+                    "medicine": "Insulin",
+                    "sequence_number": seq,
+                }
+                messages.append(Message(
+                    f"hospital/medicine/scan/{receiver_id}", json.dumps(payload).encode()
+                ))
+    return messages
+
+
+def reset_logging(level: int, devnull) -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    stop_logging()
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in ("payload", "scan_write", "db_write", "trilateration"):
+        set_sampling(name, every=1, per_second=0)
+
+
+def run(messages: List[Message]) -> float:
+    """Seconds per message through on_message."""
+    tracker = MedicineTracker(NullStorage())
+    tracker.start()
+    tracker.on_storage_ready()
+    start = time.perf_counter()
+    for message in messages:
+        tracker.on_message(None, None, message)
+    elapsed = time.perf_counter() - start
+    tracker.stop()
+    return elapsed / len(messages)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark MQTT ingest and logging overhead")
+    parser.add_argument("--tags", type=int, default=300)
+    parser.add_argument("--adverts", type=int, default=20, help="Advertisements per tag")
+    args = parser.parse_args(argv)
+
+    receivers = list(settings.RECEIVER_COORDINATES)
+    messages = make_messages(receivers, args.tags, args.adverts)
+
+    results = []
+    with open(os.devnull, "w") as devnull:
+        reset_logging(logging.WARNING, devnull)
+        results.append(("off", run(messages)))
+
+        reset_logging(logging.INFO, devnull)
+        results.append(("sync", run(messages)))
+
+        reset_logging(logging.WARNING, devnull)
+        logging.getLogger().handlers.clear()
+        configure_logging(
+            level="INFO",
+            queue_size=settings.LOG_QUEUE_SIZE,
+            sampling=settings.LOG_SAMPLING,
+            rate_limit=settings.LOG_RATE_LIMIT,
+            stream=devnull
+        )
+        results.append(("queued", run(messages)))
+        stop_logging()
+
+    baseline = results[0][1]
+    print(f"{len(messages)} messages, {args.tags} tags x {len(receivers)} receivers x {args.adverts} adverts")
+    for name, seconds in results:
+        print(f"  {name:<8} {seconds * 1e6:7.1f} us/msg  (+{(seconds - baseline) * 1e6:5.1f} us logging)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Measure MQTT reconnect time in thread and asyncio modes.
+
+Runs a minimal MQTT 3.1.1 broker stand-in in-process (CONNECT, SUBSCRIBE,
+PINGREQ and DISCONNECT only), connects a client configured the way main.py
+does it, then repeatedly takes the broker down for a given outage and
+brings it back. Reported per mode and outage: seconds from the broker
+coming back to the client's next CONNECT, i.e. how long the backend stays
+deaf after the broker has already recovered.
+
+    thread    main.mqtt_loop (paho loop_forever and its built-in reconnect)
+    asyncio   AsyncMqttRunner on this script's event loop
+
+Usage:
+    python bench_reconnect.py --outages 1,5,15 --trials 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from async_mqtt import AsyncMqttRunner
+from config import settings
+
+
+class BrokerStandIn:
+    """Just enough of an MQTT broker to accept clients and answer pings."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.connects: List[float] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: List[asyncio.StreamWriter] = []
+        self._handlers: List[asyncio.Task] = []
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, "127.0.0.1", self.port, reuse_address=True
+        )
+
+    async def stop(self) -> None:
+        """Close the listener and drop every client, like a broker crash."""
+        self._server.close()
+        for writer in self._writers:
+            writer.transport.abort()
+        self._writers.clear()
+        handlers, self._handlers = self._handlers, []
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def wait_connect(self, after: int, timeout: float) -> float:
+        """Wait for connection number after + 1 and return its time."""
+        deadline = time.monotonic() + timeout
+        while len(self.connects) <= after:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no reconnect within {timeout}s")
+            self._connected.clear()
+            try:
+                await asyncio.wait_for(self._connected.wait(), 0.05)
+            except asyncio.TimeoutError:
+                pass
+        return self.connects[after]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.append(writer)
+        self._handlers.append(asyncio.current_task())
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                kind = header >> 4
+                if kind == 1:  # CONNECT -> CONNACK accepted
+                    self.connects.append(time.monotonic())
+                    self._connected.set()
+                    writer.write(b"\x20\x02\x00\x00")
+                elif kind == 8:  # SUBSCRIBE -> SUBACK granting QoS 0 per filter
+                    filters, pos = 0, 2
+                    while pos < len(body):
+                        pos += 2 + int.from_bytes(body[pos:pos + 2], "big") + 1
+                        filters += 1
+                    writer.write(bytes((0x90, 2 + filters)) + body[:2] + b"\x00" * filters)
+                elif kind == 12:  # PINGREQ -> PINGRESP
+                    writer.write(b"\xd0\x00")
+                elif kind == 14:  # DISCONNECT
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class _NoTracker:
+    def on_message(self, client, userdata, message) -> None:
+        pass
+
+
+async def measure(mode: str, port: int, outages: List[float], trials: int, timeout: float) -> dict:
+    """Reconnect delays after the broker returns, per outage length."""
+    import main
+
+    settings.MQTT_HOST = "127.0.0.1"
+    settings.MQTT_PORT = port
+    settings.MQTT_CA_CERT = None
+    settings.MQTT_USERNAME = ""
+
+    broker = BrokerStandIn(port)
+    await broker.start()
+    client = main.setup_mqtt_client(_NoTracker())
+    runner = None
+    if mode == "asyncio":
+        runner = AsyncMqttRunner(
+            client, settings.MQTT_HOST, port, keepalive=60,
+            min_delay=settings.MQTT_RECONNECT_MIN_SECONDS,
+            max_delay=settings.MQTT_RECONNECT_MAX_SECONDS
+        )
+        runner.start()
+    else:
+        threading.Thread(target=main.mqtt_loop, args=(client,), daemon=True).start()
+
+    results = {}
+    await broker.wait_connect(0, timeout)
+    for outage in outages:
+        delays = []
+        for _ in range(trials):
+            seen = len(broker.connects)
+            await broker.stop()
+            await asyncio.sleep(outage)
+            await broker.start()
+            back = time.monotonic()
+            delays.append(await broker.wait_connect(seen, timeout) - back)
+        results[outage] = delays
+
+    if runner is not None:
+        await runner.stop()
+        await broker.stop()
+    else:
+        # Stop the broker first so mqtt_loop's retry finds nothing to connect to
+        await broker.stop()
+        client.disconnect()
+    return results
+
+
+async def run(args) -> None:
+    outages = [float(o) for o in args.outages.split(",")]
+    print(f"Reconnect delay after the broker returns, {args.trials} trials per outage")
+    # Thread mode last: mqtt_loop cannot be stopped and keeps retrying
+    for offset, mode in enumerate(("asyncio", "thread")):
+        results = await measure(mode, args.port + offset, outages, args.trials, args.timeout)
+        for outage, delays in results.items():
+            print(
+                f"  {mode:<8} outage {outage:5.1f}s: mean {statistics.mean(delays):6.2f}s"
+                f"  max {max(delays):6.2f}s"
+            )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark MQTT reconnect time")
+    parser.add_argument("--outages", default="1,5,15", help="Comma-separated outage seconds")
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18830, help="First of two local ports")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Benchmark topic routing against the old split-and-index approach.
+
+The old on_message split every topic, matched it against the status
+subscription with paho's topic_matches_sub, and took topic_parts[1] as the
+receiver ID. This script times that against TopicRouter.match, both with its
+per-topic cache (steady state) and walking the trie for every topic (cold).
+
+Usage:
+    python bench_topic_router.py --receivers 50 --tags 500 --messages 200000
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, List
+
+from paho.mqtt.client import topic_matches_sub
+
+from topic_router import TopicRouter
+
+
+def make_topics(receivers: int, tags: int, messages: int, seed: int) -> List[str]:
+    """A message mix shaped like live traffic: mostly scans, some RSSI-only, fused and heartbeats."""
+    rng = random.Random(seed)
+    receiver_ids = [f"rpi4_zone_{i}" for i in range(receivers)]
+    macs = [f"AA:BB:CC:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}" for i in range(tags)]
+    families = [
+        (0.70, lambda: f"hospital/medicine/scan/{rng.choice(receiver_ids)}"),
+        (0.15, lambda: f"hospital/medicine/rssi_only/{rng.choice(macs)}"),
+        (0.10, lambda: f"hospital/medicine/rssi/fused/{rng.choice(macs)}"),
+        (0.05, lambda: f"hospital/system/rpi_status/{rng.choice(receiver_ids)}"),
+    ]
+    weights = [w for w, _ in families]
+    return [rng.choices(families, weights)[0][1]() for _ in range(messages)]
+
+
+def legacy_route(topic: str) -> str:
+    if topic_matches_sub("hospital/system/#", topic):
+        return topic.split("/")[-1]
+    topic_parts = topic.split("/")
+    if len(topic_parts) < 3:
+        return ""
+    return topic_parts[1]
+
+
+def build_router() -> TopicRouter:
+    def noop(params, raw_payload, received_at):
+        pass
+
+    router = TopicRouter()
+    router.add("hospital/medicine/scan/+", "scan", noop)
+    router.add("hospital/medicine/rssi_only/+", "rssi_only", noop)
+    router.add("hospital/medicine/rssi/+/+", "rssi", noop)
+    router.add("hospital/system/+_status/+", "status", noop, needs_storage=False)
+    router.add("medical/+/status", "legacy_scan", noop)
+    return router
+
+
+def timed(route: Callable[[str], object], topics: List[str], repeat: int) -> float:
+    """Best-of-repeat nanoseconds per topic."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for topic in topics:
+            route(topic)
+        best = min(best, (time.perf_counter_ns() - start) / len(topics))
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark MQTT topic routing")
+    parser.add_argument("--receivers", type=int, default=50)
+    parser.add_argument("--tags", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    topics = make_topics(args.receivers, args.tags, args.messages, args.seed)
+    router = build_router()
+
+    def cold(topic):
+        return router._walk(router._root, topic.split("/"), 0, ())
+
+    results = [
+        ("split + topic_matches_sub", timed(legacy_route, topics, args.repeat)),
+        ("router, cold (trie walk)", timed(cold, topics, args.repeat)),
+        ("router, cached", timed(router.match, topics, args.repeat)),
+    ]
+    baseline = results[0][1]
+    print(f"{len(topics)} topics, {args.receivers} receivers, {args.tags} tags, best of {args.repeat}")
+    for name, ns in results:
+        print(f"  {name:<28} {ns:8.0f} ns/msg  {baseline / ns:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
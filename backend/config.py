@@ -1,7 +1,7 @@
 """Configuration settings for the Medical Tracker IoT backend.
 
 This module provides python-dotenv based configuration management for MQTT,
-InfluxDB, and receiver coordinates used in trilateration.
+storage (InfluxDB or SQLite), and receiver coordinates used in trilateration.
 """
 
 import os
@@ -25,6 +25,39 @@ class Settings:
     MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "")
     MQTT_CA_CERT = os.getenv("MQTT_CA_CERT")  # None if not set
     MQTT_TOPIC = os.getenv("MQTT_TOPIC", "hospital/medicine/scan/#")
+    # Receiver heartbeats, used for clock skew and health (empty disables)
+    MQTT_STATUS_TOPIC = os.getenv("MQTT_STATUS_TOPIC", "hospital/system/#")
+    # "thread" runs paho's loop in a daemon thread; "asyncio" drives it from
+    # the server's event loop and reconnects with jittered exponential
+    # backoff between MQTT_RECONNECT_MIN_SECONDS and MQTT_RECONNECT_MAX_SECONDS
+    # (asyncio requires ADMISSION_QUEUE_SIZE > 0 so processing stays off the loop)
+    MQTT_MODE = os.getenv("MQTT_MODE", "thread").lower()
+    MQTT_RECONNECT_MIN_SECONDS = float(os.getenv("MQTT_RECONNECT_MIN_SECONDS", "0.5"))
+    MQTT_RECONNECT_MAX_SECONDS = float(os.getenv("MQTT_RECONNECT_MAX_SECONDS", "30"))
+
+    # Storage backend: "influxdb" or "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "influxdb").lower()
+
+    # SQLite Settings (used when STORAGE_BACKEND=sqlite)
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "hospital_iot.db")
+    SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", "200"))
+    SQLITE_FLUSH_INTERVAL = float(os.getenv("SQLITE_FLUSH_INTERVAL", "1.0"))
+    # Days of daily rssi_readings partitions to keep (0 keeps everything)
+    SQLITE_RETENTION_DAYS = int(os.getenv("SQLITE_RETENTION_DAYS", "30"))
+
+    # Hot tier: recent data kept in memory in front of the storage backend
+    # (0 minutes disables it). History and alert queries take whole hours, so
+    # windows under 60 minutes only serve /api/data; nothing is served until
+    # one full window has passed since startup.
+    HOT_WINDOW_MINUTES = float(os.getenv("HOT_WINDOW_MINUTES", "60"))
+    HOT_WINDOW_MEMORY_MB = float(os.getenv("HOT_WINDOW_MEMORY_MB", "128"))
+
+    # Persistence policy per measurement: "all", "interval:N" (one write per
+    # tag every N seconds), "change" or "change:N" (only when tracked fields
+    # change, plus one every N seconds). The tracker always sees every scan.
+    PERSIST_STATUS_POLICY = os.getenv("PERSIST_STATUS_POLICY", "all")
+    PERSIST_POSITION_POLICY = os.getenv("PERSIST_POSITION_POLICY", "all")
+    PERSIST_ALERT_POLICY = os.getenv("PERSIST_ALERT_POLICY", "all")
 
     # InfluxDB Settings
     INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
@@ -32,7 +65,16 @@ class Settings:
     INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "medical")
     INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "medicine_tracking")
 
-    # Receiver coordinates for trilateration (receiver_id -> (x, y, z))
+    # Receivers are read from the receivers table of RECEIVERS_DB_PATH and
+    # reloaded every RECEIVER_RELOAD_SECONDS (0 disables); z is derived from
+    # floor_level. RECEIVER_COORDINATES is the fallback when the table is
+    # missing or empty.
+    RECEIVERS_DB_PATH = os.getenv("RECEIVERS_DB_PATH", "hospital_iot.db")
+    RECEIVER_RELOAD_SECONDS = float(os.getenv("RECEIVER_RELOAD_SECONDS", "60"))
+    FLOOR_HEIGHT_METERS = float(os.getenv("FLOOR_HEIGHT_METERS", "4.0"))
+    RECEIVER_MOUNT_HEIGHT = float(os.getenv("RECEIVER_MOUNT_HEIGHT", "2.0"))
+
+    # Fallback receiver coordinates for trilateration (receiver_id -> (x, y, z))
     # Coordinates are in meters relative to a reference point
     RECEIVER_COORDINATES: Dict[str, Tuple[float, float, float]] = {
         "receiver_1": (0.0, 0.0, 2.0),
@@ -45,9 +87,74 @@ class Settings:
     RSSI_REFERENCE = int(os.getenv("RSSI_REFERENCE", "-59"))
     PATH_LOSS_EXPONENT = float(os.getenv("PATH_LOSS_EXPONENT", "2.5"))
 
+    # Receivers are excluded from solving when heartbeats stop for
+    # RECEIVER_DEAD_SECONDS or their skew-corrected publish->backend latency
+    # averages above RECEIVER_MAX_LAG_SECONDS
+    RECEIVER_DEAD_SECONDS = float(os.getenv("RECEIVER_DEAD_SECONDS", "180"))
+    RECEIVER_MAX_LAG_SECONDS = float(os.getenv("RECEIVER_MAX_LAG_SECONDS", "5.0"))
+
+    # Solve each tag only against the receivers on its strongest floor, with
+    # one worker thread per floor (false solves inline against all receivers)
+    SHARD_BY_FLOOR = os.getenv("SHARD_BY_FLOOR", "true").lower() == "true"
+    FLOOR_SHARD_MAX_PENDING = int(os.getenv("FLOOR_SHARD_MAX_PENDING", "10000"))
+
+    # Group readings by (mac, sequence_number) and solve once per advertisement,
+    # when every expected receiver reported or the alignment window ran out
+    ALIGN_BY_SEQUENCE = os.getenv("ALIGN_BY_SEQUENCE", "true").lower() == "true"
+    ALIGNMENT_WINDOW_SECONDS = float(os.getenv("ALIGNMENT_WINDOW_SECONDS", "0.5"))
+
+    # Localization: "trilateration", or "fingerprint" to try k-NN matching
+    # against surveyed RSSI vectors (see survey.py) before trilateration
+    LOCALIZATION_MODE = os.getenv("LOCALIZATION_MODE", "trilateration").lower()
+    FINGERPRINT_DB_PATH = os.getenv("FINGERPRINT_DB_PATH", "fingerprints.db")
+    FINGERPRINT_K = int(os.getenv("FINGERPRINT_K", "4"))
+
     # Buffer management settings
     BUFFER_TIMEOUT_SECONDS = float(os.getenv("BUFFER_TIMEOUT_SECONDS", "10.0"))
     POSITION_CALCULATION_INTERVAL = float(os.getenv("POSITION_CALCULATION_INTERVAL", "2.0"))
+    # Mark tags dirty on ingest and solve all of them together every
+    # POSITION_CALCULATION_INTERVAL (false solves per message, throttled)
+    BATCH_POSITION_SCHEDULER = os.getenv("BATCH_POSITION_SCHEDULER", "true").lower() == "true"
+
+    # Packet loss accounting per (tag, receiver): rolling reception ratio
+    # over the last LOSS_WINDOW sequence numbers, per-link summaries stored
+    # every LOSS_SUMMARY_INTERVAL_SECONDS (0 = API only), links idle for
+    # LOSS_IDLE_SECONDS forgotten
+    LOSS_WINDOW = int(os.getenv("LOSS_WINDOW", "256"))
+    LOSS_SUMMARY_INTERVAL_SECONDS = float(os.getenv("LOSS_SUMMARY_INTERVAL_SECONDS", "60"))
+    LOSS_IDLE_SECONDS = float(os.getenv("LOSS_IDLE_SECONDS", "600"))
+
+    # Most tags a batch query endpoint accepts (or resolves from a filter)
+    BATCH_QUERY_MAX_TAGS = int(os.getenv("BATCH_QUERY_MAX_TAGS", "200"))
+
+    # Columnar export (export.py, /api/export): minutes of history per
+    # storage query and rows per Parquet row group / Arrow record batch
+    EXPORT_CHUNK_MINUTES = int(os.getenv("EXPORT_CHUNK_MINUTES", "60"))
+    EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+
+    # Startup settings
+    # Messages received before storage is ready are held in memory (oldest
+    # dropped first once full) and replayed when the connection comes up.
+    STARTUP_BUFFER_SIZE = int(os.getenv("STARTUP_BUFFER_SIZE", "5000"))
+    STORAGE_RETRY_SECONDS = float(os.getenv("STORAGE_RETRY_SECONDS", "5.0"))
+
+    # Admission control: MQTT callbacks only enqueue, a worker processes
+    # movement first, then tracking scans, then raw scan writes. Past the
+    # fill ratios below new telemetry, then tracking work is shed; shedding
+    # stops once the queue drains to ADMISSION_RECOVER_RATIO of the ratio
+    # that started it. 0 disables the queue and processes inline.
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20000"))
+    ADMISSION_SHED_TELEMETRY_AT = float(os.getenv("ADMISSION_SHED_TELEMETRY_AT", "0.5"))
+    ADMISSION_SHED_TRACKING_AT = float(os.getenv("ADMISSION_SHED_TRACKING_AT", "0.8"))
+    ADMISSION_RECOVER_RATIO = float(os.getenv("ADMISSION_RECOVER_RATIO", "0.5"))
+
+    # Logging goes through a background queue (records beyond LOG_QUEUE_SIZE
+    # are dropped). Per-message log categories (payload, scan_write, db_write,
+    # trilateration) keep 1 in N records and at most LOG_RATE_LIMIT per second.
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_SAMPLING = os.getenv("LOG_SAMPLING", "payload:100,scan_write:100,db_write:100,trilateration:10")
+    LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "20"))
 
     # For backward compatibility - nested access
     @property
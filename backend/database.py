@@ -6,13 +6,18 @@ scan data, calculated positions, and alerts in InfluxDB.
 
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Dict, Iterator, List, Optional
 
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
-from influxdb_client.domain.write_precision import WritePrecision
+from hot_logging import category
 
 logger = logging.getLogger(__name__)
+write_log = category("db_write")
+
+
+def _flux_string(value: str) -> str:
+    """Quote a value as a Flux string literal (without ${...} interpolation)."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("${", "\\${")
+    return '"' + escaped + '"'
 
 
 class Database:
@@ -25,47 +30,62 @@ class Database:
         org: str,
         bucket: str
     ) -> None:
-        """Initialize the InfluxDB client.
+        """Initialize the InfluxDB wrapper without touching the network.
+
+        The client itself is created by connect(), so the application can
+        start serving (and buffering MQTT traffic) before InfluxDB is up.
 
         Args:
             url: InfluxDB server URL (e.g., "http://localhost:8086").
             token: Authentication token for InfluxDB.
             org: Organization name in InfluxDB.
             bucket: Bucket name for storing data.
-
-        Raises:
-            ConnectionError: If unable to connect to InfluxDB.
         """
         self.url = url
         self.token = token
         self.org = org
         self.bucket = bucket
 
+        self.client = None
+        self.write_api = None
+        self.query_api = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether connect() has succeeded and the client can be used."""
+        return self.write_api is not None
+
+    def connect(self) -> None:
+        """Connect to InfluxDB and verify it is healthy.
+
+        influxdb_client is imported here rather than at module level because
+        it is slow to import and is not needed until storage is reachable.
+
+        Raises:
+            ConnectionError: If unable to connect to InfluxDB.
+        """
+        from influxdb_client import InfluxDBClient
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
         try:
-            self.client = InfluxDBClient(
-                url=url,
-                token=token,
-                org=org
+            client = InfluxDBClient(
+                url=self.url,
+                token=self.token,
+                org=self.org
             )
-            # Test connection
-            health = self.client.health()
+            health = client.health()
             if health.status == "fail":
+                client.close()
                 raise ConnectionError(f"InfluxDB health check failed: {health.message}")
 
-            self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
-            self.query_api = self.client.query_api()
-
-            # Test write to verify bucket exists and is writable
-            from influxdb_client import Point
-            from datetime import datetime
-            test_point = Point("test").tag("source", "startup").field("value", 1).time(datetime.utcnow())
-            try:
-                self.write_api.write(bucket=bucket, org=org, record=test_point)
-                logger.info(f"Connected to InfluxDB at {url}, bucket={bucket} is writable")
-            except Exception as e:
-                logger.warning(f"InfluxDB connection OK but bucket={bucket} test write failed: {e}")
-                logger.warning("Data may not be stored properly!")
+            self.client = client
+            self.query_api = client.query_api()
+            self.write_api = client.write_api(write_options=SYNCHRONOUS)
+            self.last_error = None
+            logger.info(f"Connected to InfluxDB at {self.url}, bucket={self.bucket}")
         except Exception as e:
+            self.last_error = str(e)
             logger.error(f"Failed to connect to InfluxDB: {e}")
             raise ConnectionError(f"Failed to connect to InfluxDB: {e}") from e
 
@@ -101,6 +121,9 @@ class Database:
         Returns:
             bool: True if write was successful, False otherwise.
         """
+        from influxdb_client import Point
+        from influxdb_client.domain.write_precision import WritePrecision
+
         try:
             point = (
                 Point("medicine_status")
@@ -123,7 +146,10 @@ class Database:
 
             self.write_api.write(bucket=self.bucket, org=self.org, record=point)
             self.write_api.flush()  # Force immediate write
-            logger.info(f"✓ DB WRITE SUCCESS: {mac} distance={distance:.2f}m temp={temperature} batt={battery} to bucket={self.bucket} org={self.org}")
+            write_log.info(
+                "✓ DB WRITE SUCCESS: %s distance=%.2fm temp=%s batt=%s to bucket=%s org=%s",
+                mac, distance, temperature, battery, self.bucket, self.org
+            )
             return True
         except Exception as e:
             logger.error(f"✗ DB WRITE FAILED: {e}")
@@ -157,6 +183,9 @@ class Database:
         Returns:
             bool: True if write was successful, False otherwise.
         """
+        from influxdb_client import Point
+        from influxdb_client.domain.write_precision import WritePrecision
+
         try:
             point = (
                 Point("medicine_position")
@@ -173,12 +202,50 @@ class Database:
                 point = point.time(timestamp, WritePrecision.NS)
 
             self.write_api.write(bucket=self.bucket, record=point)
-            logger.info(f"Wrote position for {mac}: ({x:.2f}, {y:.2f}, {z:.2f})")
+            write_log.info("Wrote position for %s: (%.2f, %.2f, %.2f)", mac, x, y, z)
             return True
         except Exception as e:
             logger.error(f"Failed to write position: {e}")
             return False
 
+    def write_positions(self, positions: List[Dict[str, Any]]) -> bool:
+        """Store several calculated positions in one write.
+
+        Args:
+            positions: Keyword arguments of write_position, one dict per fix.
+
+        Returns:
+            bool: True if write was successful, False otherwise.
+        """
+        from influxdb_client import Point
+        from influxdb_client.domain.write_precision import WritePrecision
+
+        if not positions:
+            return True
+        try:
+            points = []
+            for p in positions:
+                point = (
+                    Point("medicine_position")
+                    .tag("mac", p["mac"])
+                    .tag("medicine", p["medicine"])
+                    .field("x", p["x"])
+                    .field("y", p["y"])
+                    .field("z", p["z"])
+                    .field("accuracy", p["accuracy"])
+                    .field("receiver_count", p["receiver_count"])
+                )
+                if p.get("timestamp"):
+                    point = point.time(p["timestamp"], WritePrecision.NS)
+                points.append(point)
+
+            self.write_api.write(bucket=self.bucket, record=points)
+            write_log.info("Wrote %d positions", len(points))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(positions)} positions: {e}")
+            return False
+
     def write_alert(
         self,
         mac: str,
@@ -203,6 +270,9 @@ class Database:
         Returns:
             bool: True if write was successful, False otherwise.
         """
+        from influxdb_client import Point
+        from influxdb_client.domain.write_precision import WritePrecision
+
         try:
             point = (
                 Point("alerts")
@@ -229,6 +299,43 @@ class Database:
             logger.error(f"Failed to write alert: {e}")
             return False
 
+    def write_link_stats(self, links: List[Dict[str, Any]]) -> bool:
+        """Store one summary interval of per-link reception counters.
+
+        Args:
+            links: Rows from LossAccounting.summary(): mac, receiver_id,
+                interval counts (received, expected, lost, duplicates,
+                reordered, resets), window_ratio and max_reorder_depth.
+
+        Returns:
+            bool: True if write was successful, False otherwise.
+        """
+        from influxdb_client import Point
+
+        if not links:
+            return True
+        try:
+            points = []
+            for link in links:
+                point = (
+                    Point("link_quality")
+                    .tag("mac", link["mac"])
+                    .tag("receiver_id", link["receiver_id"])
+                )
+                for name in ("received", "expected", "lost", "duplicates", "reordered", "resets",
+                             "max_reorder_depth"):
+                    point = point.field(name, link[name])
+                if link["window_ratio"] is not None:
+                    point = point.field("window_ratio", link["window_ratio"])
+                points.append(point)
+
+            self.write_api.write(bucket=self.bucket, record=points)
+            write_log.info("Wrote %d link quality summaries", len(points))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(links)} link quality summaries: {e}")
+            return False
+
     def query_all_data(
         self,
         minutes: int = 60
@@ -412,6 +519,96 @@ class Database:
             logger.error(f"Failed to query medicine history: {e}")
             return []
 
+    def query_histories(
+        self,
+        macs: Optional[List[str]] = None,
+        medicine: Optional[str] = None,
+        hours: int = 24
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get position and status history for several medicines in one query.
+
+        The MACs become an or-chain of equality predicates rather than
+        contains(), so InfluxDB can still push the filter down to storage.
+
+        Args:
+            macs: MAC addresses to include (all tags if omitted).
+            medicine: Only include tags of this medicine.
+            hours: Number of hours of history to retrieve.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Records per MAC, sorted by time;
+                every requested MAC is present, possibly with no records.
+        """
+        predicates = ['r._measurement == "medicine_position" or r._measurement == "medicine_status"']
+        if macs:
+            predicates.append(" or ".join(f"r.mac == {_flux_string(mac)}" for mac in macs))
+        if medicine:
+            predicates.append(f"r.medicine == {_flux_string(medicine)}")
+        filters = "".join(f"\n            |> filter(fn: (r) => {p})" for p in predicates)
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: -{hours}h){filters}
+            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+
+        histories: Dict[str, List[Dict[str, Any]]] = {mac: [] for mac in macs or ()}
+        try:
+            tables = self.query_api.query(query, org=self.org)
+            for table in tables:
+                for record in table.records:
+                    mac = record.values.get("mac")
+                    data = {
+                        "measurement": record.values.get("_measurement"),
+                        "time": record.get_time(),
+                        "mac": mac
+                    }
+                    for key, value in record.values.items():
+                        if not key.startswith("_") and key not in ["mac", "result", "table"]:
+                            data[key] = value
+                    histories.setdefault(mac, []).append(data)
+
+            for records in histories.values():
+                records.sort(key=lambda x: x["time"])
+            logger.debug(
+                f"Retrieved {sum(map(len, histories.values()))} history records for {len(histories)} tags"
+            )
+            return histories
+        except Exception as e:
+            logger.error(f"Failed to query medicine histories: {e}")
+            return {}
+
+    def query_medicine_macs(self, medicine: str, hours: int = 24) -> List[str]:
+        """Get the MACs of a medicine's tags seen in the last `hours` hours.
+
+        Uses schema.tagValues, which reads the tag index instead of the
+        records, so callers can bound a query_histories() call before
+        running it.
+
+        Args:
+            medicine: Medicine name.
+            hours: Number of hours to look back.
+
+        Returns:
+            List[str]: Distinct MAC addresses (empty on error).
+        """
+        query = f'''
+        import "influxdata/influxdb/schema"
+
+        schema.tagValues(
+            bucket: "{self.bucket}",
+            tag: "mac",
+            predicate: (r) => (r._measurement == "medicine_position" or r._measurement == "medicine_status")
+                and r.medicine == {_flux_string(medicine)},
+            start: -{hours}h
+        )
+        '''
+        try:
+            tables = self.query_api.query(query, org=self.org)
+            return [record.get_value() for table in tables for record in table.records]
+        except Exception as e:
+            logger.error(f"Failed to query tags of {medicine}: {e}")
+            return []
+
     def query_alerts(
         self,
         hours: int = 24,
@@ -461,8 +658,45 @@ class Database:
             logger.error(f"Failed to query alerts: {e}")
             return []
 
+    def iter_export(
+        self,
+        measurement: str,
+        start: datetime,
+        stop: datetime
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream every record of one measurement in [start, stop), oldest first.
+
+        Records are read with query_stream, so only the current one is held
+        in memory; callers bound the server-side pivot and sort by keeping
+        the range short. Unlike the query_* methods, errors propagate.
+
+        Args:
+            measurement: "medicine_status", "medicine_position" or "alerts".
+            start: Inclusive start of the range (timezone-aware).
+            stop: Exclusive end of the range (timezone-aware).
+
+        Yields:
+            Dict[str, Any]: "time" plus the record's tags and fields.
+        """
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: {start.isoformat()}, stop: {stop.isoformat()})
+            |> filter(fn: (r) => r._measurement == {_flux_string(measurement)})
+            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> group()
+            |> sort(columns: ["_time"])
+        '''
+        for record in self.query_api.query_stream(query, org=self.org):
+            data = {"time": record.get_time()}
+            for key, value in record.values.items():
+                if not key.startswith("_") and key not in ["result", "table"]:
+                    data[key] = value
+            yield data
+
     def close(self) -> None:
         """Close the InfluxDB client connection."""
+        if self.client is None:
+            return
         try:
             self.client.close()
             logger.info("InfluxDB connection closed")
@@ -0,0 +1,286 @@
+"""Columnar export of historical tracking data.
+
+Streams medicine_status, medicine_position or alerts records out of storage
+in time chunks and writes them as Parquet or as an Arrow IPC stream. MAC,
+receiver, medicine and alert type/severity columns are dictionary-encoded,
+so each distinct value is stored once per record batch instead of once per
+row. Rows are converted and written one record batch at a time, so memory
+use depends on the batch size, not on the length of the range.
+
+pyarrow is only needed here and is imported lazily, like influxdb_client in
+database.py; the API reports the export endpoint as unavailable without it.
+
+Usage:
+    python export.py medicine_status --start 2026-09-01 --stop 2026-10-01 -o status.parquet
+    python export.py alerts --start 2026-09-01 --stop 2026-10-01 --format arrow -o alerts.arrow
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MEASUREMENTS = ("medicine_status", "medicine_position", "alerts")
+FORMATS = ("parquet", "arrow")
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Column name -> type name per measurement; "dict" columns are dictionary-encoded strings
+_COLUMNS = {
+    "medicine_status": {
+        "time": "timestamp", "mac": "dict", "receiver_id": "dict", "medicine": "dict",
+        "distance": "float64", "temperature": "float64", "battery": "int32",
+        "moving": "bool", "sequence_number": "int32",
+    },
+    "medicine_position": {
+        "time": "timestamp", "mac": "dict", "medicine": "dict",
+        "x": "float64", "y": "float64", "z": "float64", "accuracy": "float64",
+        "receiver_count": "int32",
+    },
+    "alerts": {
+        "time": "timestamp", "mac": "dict", "medicine": "dict",
+        "alert_type": "dict", "severity": "dict", "message": "string",
+    },
+}
+
+
+def schema(measurement: str):
+    """Arrow schema of an exported measurement.
+
+    Raises:
+        ValueError: If measurement is not exportable.
+        ImportError: If pyarrow is not installed.
+    """
+    import pyarrow as pa
+
+    if measurement not in _COLUMNS:
+        raise ValueError(f"Unknown measurement: {measurement}")
+    types = {
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "dict": pa.dictionary(pa.int32(), pa.string()),
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "int32": pa.int32(),
+        "bool": pa.bool_(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in _COLUMNS[measurement].items()])
+
+
+def iter_batches(
+    db: Any,
+    measurement: str,
+    start: datetime,
+    stop: datetime,
+    chunk: timedelta = timedelta(hours=1),
+    batch_rows: int = 50000
+) -> Iterator[Any]:
+    """Read [start, stop) chunk by chunk and yield Arrow record batches.
+
+    Args:
+        db: Storage backend providing iter_export().
+        measurement: One of MEASUREMENTS.
+        start: Inclusive start (timezone-aware).
+        stop: Exclusive end (timezone-aware).
+        chunk: Time span of each storage query.
+        batch_rows: Maximum rows per record batch.
+
+    Yields:
+        pyarrow.RecordBatch: Batches of at most batch_rows rows, oldest first.
+    """
+    import pyarrow as pa
+
+    target = schema(measurement)
+    names = target.names
+    columns: Dict[str, List[Any]] = {name: [] for name in names}
+
+    def build() -> Any:
+        arrays = []
+        for field in target:
+            values = columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+            values.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=target)
+
+    rows = 0
+    chunk_start = start
+    while chunk_start < stop:
+        chunk_stop = min(chunk_start + chunk, stop)
+        for record in db.iter_export(measurement, chunk_start, chunk_stop):
+            for name in names:
+                columns[name].append(record.get(name))
+            rows += 1
+            if rows == batch_rows:
+                yield build()
+                rows = 0
+        chunk_start = chunk_stop
+    if rows:
+        yield build()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self) -> None:
+        self.closed = False
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _open_writer(sink: Any, measurement: str, fmt: str, compression: str) -> Any:
+    import pyarrow as pa
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, schema(measurement), compression=compression)
+    if fmt == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+        return pa.ipc.new_stream(sink, schema(measurement), options=options)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def write(
+    db: Any,
+    measurement: str,
+    start: datetime,
+    stop: datetime,
+    sink: Any,
+    fmt: str = "parquet",
+    chunk: timedelta = timedelta(hours=1),
+    batch_rows: int = 50000,
+    compression: str = "zstd"
+) -> int:
+    """Export a measurement to a path or writable file object.
+
+    Each record batch becomes one Parquet row group or one IPC message.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rows = 0
+    writer = _open_writer(sink, measurement, fmt, compression)
+    try:
+        for batch in iter_batches(db, measurement, start, stop, chunk, batch_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+def stream(
+    db: Any,
+    measurement: str,
+    start: datetime,
+    stop: datetime,
+    fmt: str = "parquet",
+    chunk: timedelta = timedelta(hours=1),
+    batch_rows: int = 50000,
+    compression: str = "zstd"
+) -> Iterator[bytes]:
+    """Like write(), but yield the encoded file piece by piece (one per batch).
+
+    Meant for a streaming HTTP response: at most one encoded batch is held
+    at a time. Errors after the first piece can only be logged, so the
+    client then receives a truncated file.
+    """
+    sink = _ChunkSink()
+    writer = _open_writer(sink, measurement, fmt, compression)
+    rows = 0
+    try:
+        for batch in iter_batches(db, measurement, start, stop, chunk, batch_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            data = sink.take()
+            if data:
+                yield data
+        writer.close()
+        yield sink.take()
+        logger.info(f"Exported {rows} {measurement} rows as {fmt}")
+    except Exception as e:
+        logger.error(f"Export of {measurement} failed after {rows} rows: {e}")
+        raise
+
+
+def _parse_time(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="Export tracking history as Parquet or Arrow")
+    parser.add_argument("measurement", choices=MEASUREMENTS)
+    parser.add_argument("--start", required=True, help="ISO start time (UTC if no offset)")
+    parser.add_argument("--stop", required=True, help="ISO stop time (exclusive)")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    parser.add_argument("--chunk-hours", type=float, default=settings.EXPORT_CHUNK_MINUTES / 60,
+                        help="Hours of history per storage query")
+    parser.add_argument("--batch-rows", type=int, default=settings.EXPORT_BATCH_ROWS,
+                        help="Rows per Parquet row group / Arrow record batch")
+    parser.add_argument("--compression", default="zstd", help="zstd, lz4, snappy or none")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    start, stop = _parse_time(args.start), _parse_time(args.stop)
+    if stop <= start:
+        parser.error("--stop must be after --start")
+    if args.chunk_hours <= 0 or args.batch_rows < 1:
+        parser.error("--chunk-hours and --batch-rows must be positive")
+
+    # Same backend selection as the API (InfluxDB unless STORAGE_BACKEND says otherwise)
+    from storage import create_database
+
+    database = create_database()
+    database.connect()
+    started = time.monotonic()
+    try:
+        rows = write(
+            database, args.measurement, start, stop, args.output,
+            fmt=args.format, chunk=timedelta(hours=args.chunk_hours),
+            batch_rows=args.batch_rows, compression=args.compression
+        )
+    finally:
+        database.close()
+    logger.info(
+        f"Wrote {rows} {args.measurement} rows to {args.output} in {time.monotonic() - started:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
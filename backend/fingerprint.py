@@ -0,0 +1,242 @@
+"""RSSI fingerprint localization for the Medical Tracker IoT backend.
+
+Path-loss trilateration assumes free-space-like propagation and goes wrong
+around walls and metal cabinets. Fingerprinting instead compares the live
+RSSI vector of a tag against vectors recorded at known survey points
+(see survey.py) and interpolates between the nearest matches.
+
+This module provides the fingerprint store (a small SQLite file) and
+FingerprintIndex, a k-nearest-neighbour index over the surveyed vectors
+backed by scipy's cKDTree.
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS survey_points(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        x REAL NOT NULL,
+        y REAL NOT NULL,
+        z REAL NOT NULL,
+        label TEXT,
+        surveyed_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fingerprint_rssi(
+        point_id INTEGER NOT NULL,
+        receiver_id TEXT NOT NULL,
+        rssi_mean REAL NOT NULL,
+        rssi_std REAL,
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (point_id, receiver_id),
+        FOREIGN KEY (point_id) REFERENCES survey_points(id)
+    )
+    """,
+]
+
+
+def save_survey_point(
+    path: str,
+    position: Tuple[float, float, float],
+    samples: Dict[str, List[float]],
+    label: Optional[str] = None
+) -> int:
+    """Store the RSSI samples recorded at one survey point.
+
+    Args:
+        path: Fingerprint database file.
+        position: Surveyed (x, y, z) position in meters.
+        samples: RSSI samples per receiver_id.
+        label: Optional human-readable label (room, shelf, ...).
+
+    Returns:
+        int: ID of the new survey point.
+    """
+    with sqlite3.connect(path) as conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        cursor = conn.execute(
+            "INSERT INTO survey_points (x, y, z, label, surveyed_at) VALUES (?, ?, ?, ?, ?)",
+            (*position, label, datetime.utcnow().isoformat())
+        )
+        point_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO fingerprint_rssi (point_id, receiver_id, rssi_mean, rssi_std, samples) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (point_id, receiver_id, float(np.mean(values)), float(np.std(values)), len(values))
+                for receiver_id, values in samples.items() if values
+            ]
+        )
+    return point_id
+
+
+class FingerprintIndex:
+    """k-NN position lookup over surveyed RSSI vectors.
+
+    Each survey point is a vector with one RSSI per receiver; receivers not
+    heard at a survey point are filled with rssi_floor. A live reading
+    usually covers only some receivers, so lookups search a KD-tree built
+    over just the receivers that were heard. Those trees are built on first
+    use and kept in a small LRU cache keyed by the receiver subset, so in
+    steady state every lookup is a single cKDTree query.
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        receivers: Sequence[str],
+        rssi: np.ndarray,
+        k: int = 4,
+        rssi_floor: float = -100.0,
+        min_receivers: int = 2,
+        cache_size: int = 64
+    ) -> None:
+        """Build the index.
+
+        Args:
+            positions: (n, 3) survey point coordinates.
+            receivers: Receiver IDs, one per column of rssi.
+            rssi: (n, len(receivers)) mean RSSI, NaN where not heard.
+            k: Number of neighbours to interpolate between.
+            rssi_floor: RSSI substituted for receivers not heard.
+            min_receivers: Fewest known receivers a lookup needs.
+            cache_size: Number of per-subset trees to keep.
+        """
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.receivers = list(receivers)
+        self.columns = {receiver_id: i for i, receiver_id in enumerate(self.receivers)}
+        self.vectors = np.where(np.isnan(rssi), rssi_floor, rssi).astype(np.float64)
+        self.k = max(1, min(k, len(self.positions)))
+        self.rssi_floor = rssi_floor
+        self.min_receivers = min_receivers
+        self.cache_size = cache_size
+
+        self._trees: "OrderedDict[Tuple[int, ...], cKDTree]" = OrderedDict()
+        self._lock = threading.Lock()
+        if len(self.positions):
+            self._tree(tuple(range(len(self.receivers))))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @classmethod
+    def from_db(cls, path: str, **kwargs) -> "FingerprintIndex":
+        """Load every survey point from a fingerprint database."""
+        with sqlite3.connect(path) as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            points = conn.execute("SELECT id, x, y, z FROM survey_points ORDER BY id").fetchall()
+            readings = conn.execute(
+                "SELECT point_id, receiver_id, rssi_mean FROM fingerprint_rssi"
+            ).fetchall()
+
+        receivers = sorted({receiver_id for _, receiver_id, _ in readings})
+        rows = {point_id: i for i, (point_id, *_) in enumerate(points)}
+        columns = {receiver_id: i for i, receiver_id in enumerate(receivers)}
+
+        rssi = np.full((len(points), len(receivers)), np.nan)
+        for point_id, receiver_id, rssi_mean in readings:
+            rssi[rows[point_id], columns[receiver_id]] = rssi_mean
+        positions = np.array([p[1:] for p in points], dtype=np.float64).reshape(-1, 3)
+
+        logger.info(f"Loaded {len(points)} fingerprints over {len(receivers)} receivers from {path}")
+        return cls(positions, receivers, rssi, **kwargs)
+
+    def _tree(self, subset: Tuple[int, ...]) -> cKDTree:
+        with self._lock:
+            tree = self._trees.get(subset)
+            if tree is not None:
+                self._trees.move_to_end(subset)
+                return tree
+
+        tree = cKDTree(self.vectors[:, subset])
+        with self._lock:
+            self._trees[subset] = tree
+            if len(self._trees) > self.cache_size:
+                self._trees.popitem(last=False)
+        return tree
+
+    def _interpolate(
+        self,
+        distances: np.ndarray,
+        indices: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Inverse-distance weighted positions and their neighbour spread."""
+        distances = distances.reshape(len(distances), -1)
+        indices = indices.reshape(len(indices), -1)
+        weights = 1.0 / np.maximum(distances, 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        neighbours = self.positions[indices]                     # (q, k, 3)
+        estimates = np.einsum("qk,qkd->qd", weights, neighbours)
+        spread = np.sqrt(np.einsum(
+            "qk,qk->q", weights, ((neighbours - estimates[:, None, :]) ** 2).sum(axis=2)
+        ))
+        return estimates, spread
+
+    def locate(self, rssi_by_receiver: Dict[str, float]) -> Optional[Tuple[Tuple[float, float, float], float]]:
+        """Estimate a position from the current RSSI per receiver.
+
+        Receivers that were never surveyed are ignored.
+
+        Returns:
+            ((x, y, z), spread) where spread is the weighted RMS distance of
+            the neighbours from the estimate in meters, or None if too few
+            surveyed receivers were heard.
+        """
+        heard = sorted(
+            (self.columns[receiver_id], rssi)
+            for receiver_id, rssi in rssi_by_receiver.items()
+            if receiver_id in self.columns
+        )
+        if len(heard) < self.min_receivers or not len(self):
+            return None
+
+        subset = tuple(col for col, _ in heard)
+        query = np.array([rssi for _, rssi in heard], dtype=np.float64)
+        distances, indices = self._tree(subset).query(query, k=self.k)
+        estimates, spread = self._interpolate(np.atleast_1d(distances)[None], np.atleast_1d(indices)[None])
+        x, y, z = estimates[0]
+        return (float(x), float(y), float(z)), float(spread[0])
+
+    def locate_many(self, rssi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized lookup for many tags at once.
+
+        Args:
+            rssi: (q, len(receivers)) array in index column order, NaN for
+                receivers not heard.
+
+        Returns:
+            (q, 3) positions and (q,) spreads; rows with too few receivers
+            are NaN.
+        """
+        rssi = np.asarray(rssi, dtype=np.float64)
+        estimates = np.full((len(rssi), 3), np.nan)
+        spread = np.full(len(rssi), np.nan)
+        if not len(self):
+            return estimates, spread
+
+        # One tree query per distinct receiver subset
+        heard = ~np.isnan(rssi)
+        patterns, groups = np.unique(heard, axis=0, return_inverse=True)
+        for g, pattern in enumerate(patterns):
+            subset = tuple(np.flatnonzero(pattern))
+            if len(subset) < self.min_receivers:
+                continue
+            rows = np.flatnonzero(groups.ravel() == g)
+            distances, indices = self._tree(subset).query(rssi[np.ix_(rows, subset)], k=self.k)
+            estimates[rows], spread[rows] = self._interpolate(distances, indices)
+        return estimates, spread
@@ -0,0 +1,185 @@
+"""Floor-partitioned position solving for the Medical Tracker IoT backend.
+
+Receivers on different floors do not share a useful coordinate space, and
+solving every tag against every receiver makes each fix more expensive as
+floors are added. This module assigns each tag to the floor whose receivers
+hear it best and queues the solve on that floor's shard. Each shard has its
+own worker thread and pending set, so a busy floor cannot delay another.
+A worker takes everything pending at once and solves it as one batch.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# receiver_id -> reading (distance, rssi, ts, ...)
+Readings = Dict[str, Dict[str, Any]]
+# (mac, medicine, readings or None for the buffer)
+SolveItem = Tuple[str, str, Optional[Readings]]
+SolveBatch = Callable[[int, List[SolveItem]], None]
+
+
+def assign_floor(
+    receiver_data: Dict[str, Dict[str, Any]],
+    floor_of: Dict[str, int]
+) -> Optional[int]:
+    """Pick the floor whose strongest receivers hear the tag best.
+
+    Floors are ranked by the mean RSSI of their two strongest buffered
+    receivers (a single receiver counts alone); readings without RSSI are
+    ranked by distance instead.
+
+    Args:
+        receiver_data: Buffered readings per receiver_id.
+        floor_of: receiver_id -> floor_level from the receiver registry.
+
+    Returns:
+        Optional[int]: Floor level, or None if no known receiver heard the tag.
+    """
+    by_floor: Dict[int, list] = {}
+    for receiver_id, data in receiver_data.items():
+        floor = floor_of.get(receiver_id)
+        if floor is None:
+            continue
+        rssi = data.get("rssi")
+        # Higher is better; a distance in meters maps onto the same ordering
+        score = rssi if rssi is not None else -data["distance"]
+        by_floor.setdefault(floor, []).append(score)
+
+    if not by_floor:
+        return None
+
+    def strength(scores: list) -> float:
+        top = sorted(scores, reverse=True)[:2]
+        return sum(top) / len(top)
+
+    return max(by_floor, key=lambda floor: strength(by_floor[floor]))
+
+
+class FloorShard:
+    """Pending solves and a worker thread for one floor.
+
+    Pending work is coalesced per tag: a tag queued again before its solve
+    runs is solved once, against the freshest buffer contents or the most
+    recently submitted readings.
+    """
+
+    def __init__(self, floor: int, solve: SolveBatch, max_pending: int) -> None:
+        self.floor = floor
+        self.solve = solve
+        self.max_pending = max_pending
+
+        # mac -> (medicine, readings or None for the buffer), oldest first
+        self._pending: "OrderedDict[str, Tuple[str, Optional[Readings]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._running = True
+
+        self.solved = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"floor-shard-{floor}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, mac: str, medicine: str, readings: Optional[Readings] = None) -> None:
+        self.submit_many([(mac, medicine, readings)])
+
+    def submit_many(self, items: Iterable[SolveItem]) -> None:
+        with self._cond:
+            for mac, medicine, readings in items:
+                if mac in self._pending:
+                    # Keep the queue position, solve the newer readings
+                    self._pending[mac] = (medicine, readings)
+                    self.coalesced += 1
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+                self._pending[mac] = (medicine, readings)
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                batch = [(mac, medicine, readings) for mac, (medicine, readings) in self._pending.items()]
+                self._pending.clear()
+            try:
+                self.solve(self.floor, batch)
+                self.solved += len(batch)
+                self.batches += 1
+            except Exception as e:
+                logger.error(f"Floor {self.floor} solve of {len(batch)} tags failed: {e}")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "solved": self.solved,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
+class FloorShards:
+    """Routes solves to per-floor shards, creating shards on first use."""
+
+    def __init__(self, solve: SolveBatch, max_pending: int = 10000) -> None:
+        """Initialize the router.
+
+        Args:
+            solve: Called as solve(floor, [(mac, medicine, readings), ...]) on
+                the shard's thread; readings is None when the buffer should
+                be used.
+            max_pending: Pending tags per shard before the oldest is dropped.
+        """
+        self.solve = solve
+        self.max_pending = max_pending
+        self._shards: Dict[int, FloorShard] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        floor: int,
+        mac: str,
+        medicine: str,
+        readings: Optional[Readings] = None
+    ) -> None:
+        self._shard(floor).submit(mac, medicine, readings)
+
+    def submit_many(self, floor: int, items: Iterable[SolveItem]) -> None:
+        self._shard(floor).submit_many(items)
+
+    def _shard(self, floor: int) -> FloorShard:
+        shard = self._shards.get(floor)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(floor)
+                if shard is None:
+                    shard = self._shards[floor] = FloorShard(floor, self.solve, self.max_pending)
+                    logger.info(f"Started tracking shard for floor {floor}")
+        return shard
+
+    def stop(self) -> None:
+        with self._lock:
+            for shard in self._shards.values():
+                shard.stop()
+            self._shards.clear()
+
+    def stats(self) -> Dict[int, Dict[str, int]]:
+        return {floor: shard.stats() for floor, shard in sorted(self._shards.items())}
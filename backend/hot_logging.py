@@ -0,0 +1,237 @@
+"""Non-blocking, rate-limited logging for the Medical Tracker IoT backend.
+
+Two pieces keep logging off the ingest hot path:
+
+* configure_logging() installs a QueueHandler on the root logger, so a log
+  call only enqueues the record; formatting and handler I/O run on a
+  QueueListener thread. When the queue is full, records are dropped and
+  counted instead of blocking the caller.
+* category() hands out CategoryLogger instances for chatty per-message log
+  lines (raw payloads, scan writes, solver summaries). Each category checks
+  the level first, then keeps 1 in N records and caps the rest at a rate
+  per second, all before a LogRecord is even created. Messages use lazy
+  %-style arguments.
+
+Levels and sampling can be changed at runtime through set_level() and
+set_sampling() (exposed by the API).
+"""
+
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any, Dict, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Parent of all category loggers, e.g. "hotpath.payload"
+CATEGORY_PREFIX = "hotpath"
+
+
+class CategoryLogger:
+    """Sampled and rate-limited logger for one hot-path category.
+
+    Counters are updated without a lock; under contention they may be off
+    by a few, which is fine for sampling and stats.
+    """
+
+    def __init__(self, name: str, every: int = 1, per_second: float = 0.0) -> None:
+        """Initialize the category.
+
+        Args:
+            name: Category name; logs go to the "hotpath.<name>" logger.
+            every: Keep one record in every this many.
+            per_second: Maximum records per second after sampling (0 = no limit).
+        """
+        self.name = name
+        self.logger = logging.getLogger(f"{CATEGORY_PREFIX}.{name}")
+        self.every = max(1, int(every))
+        self.per_second = per_second
+
+        self._seen = 0
+        self._tokens = per_second
+        self._refilled = time.monotonic()
+        self.emitted = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def debug(self, msg: str, *args: Any) -> None:
+        self._log(logging.DEBUG, msg, args)
+
+    def info(self, msg: str, *args: Any) -> None:
+        self._log(logging.INFO, msg, args)
+
+    def _log(self, level: int, msg: str, args: tuple) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        self._seen += 1
+        if self.every > 1 and self._seen % self.every:
+            self.sampled_out += 1
+            return
+        if self.per_second > 0:
+            now = time.monotonic()
+            self._tokens = min(self.per_second, self._tokens + (now - self._refilled) * self.per_second)
+            self._refilled = now
+            if self._tokens < 1.0:
+                self.rate_limited += 1
+                return
+            self._tokens -= 1.0
+        self.emitted += 1
+        self.logger.log(level, msg, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": logging.getLevelName(self.logger.getEffectiveLevel()),
+            "every": self.every,
+            "per_second": self.per_second,
+            "emitted": self.emitted,
+            "sampled_out": self.sampled_out,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in-process, so the record needs no pickling
+        # and its message can be formatted on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_categories: Dict[str, CategoryLogger] = {}
+_categories_lock = threading.Lock()
+# Applied to categories created after configure_logging()
+_sampling: Dict[str, int] = {}
+_rate_limit = 0.0
+_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def category(name: str) -> CategoryLogger:
+    """Get (or create) the CategoryLogger for a hot-path category."""
+    with _categories_lock:
+        logger = _categories.get(name)
+        if logger is None:
+            logger = _categories[name] = CategoryLogger(name, _sampling.get(name, 1), _rate_limit)
+        return logger
+
+
+def parse_sampling(spec: str) -> Dict[str, int]:
+    """Parse "payload:100,trilateration:10" into {category: every}.
+
+    Raises:
+        ValueError: If an entry is not name:positive-integer.
+    """
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, every = entry.partition(":")
+        try:
+            rates[name.strip()] = int(every)
+        except ValueError:
+            raise ValueError(f"Invalid log sampling entry '{entry}', expected name:N") from None
+        if rates[name.strip()] < 1:
+            raise ValueError(f"Invalid log sampling entry '{entry}', N must be at least 1")
+    return rates
+
+
+def set_sampling(name: str, every: Optional[int] = None, per_second: Optional[float] = None) -> CategoryLogger:
+    """Change a category's 1-in-N sampling and/or rate limit."""
+    logger = category(name)
+    if every is not None:
+        logger.every = max(1, int(every))
+    if per_second is not None:
+        logger.per_second = max(0.0, float(per_second))
+        logger._tokens = logger.per_second
+    return logger
+
+
+def set_level(level: str, logger_name: Optional[str] = None) -> str:
+    """Set the level of the root logger, or of one named logger.
+
+    Returns:
+        str: The normalised level name.
+
+    Raises:
+        ValueError: If the level is not a standard logging level.
+    """
+    level = level.upper()
+    if level not in ("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG", "NOTSET"):
+        raise ValueError(f"Unknown log level '{level}'")
+    logging.getLogger(logger_name or None).setLevel(level)
+    return level
+
+
+def configure_logging(
+    level: str = "INFO",
+    queue_size: int = 10000,
+    sampling: str = "",
+    rate_limit: float = 0.0,
+    stream: Optional[IO] = None
+) -> QueueListener:
+    """Route all logging through a background queue and configure categories.
+
+    Args:
+        level: Root log level.
+        queue_size: Records buffered before new ones are dropped.
+        sampling: Per-category 1-in-N sampling, e.g. "payload:100,trilateration:10".
+        rate_limit: Maximum records per second per category (0 = no limit).
+        stream: Where the listener writes (defaults to stderr).
+
+    Returns:
+        QueueListener: The running listener; stop it on shutdown to flush.
+    """
+    global _handler, _listener, _sampling, _rate_limit
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    _handler = _DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+    _sampling = parse_sampling(sampling)
+    _rate_limit = rate_limit
+    with _categories_lock:
+        names = set(_categories) | set(_sampling)
+    for name in names:
+        set_sampling(name, every=_sampling.get(name, 1), per_second=rate_limit)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    with _categories_lock:
+        categories = {name: logger.stats() for name, logger in sorted(_categories.items())}
+    return {
+        "level": logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+        "queue_depth": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "categories": categories,
+    }
@@ -0,0 +1,575 @@
+"""In-process hot tier for recent medicine data.
+
+This module provides HotTierDatabase, a wrapper around Database or
+SQLiteDatabase that keeps the most recent window of status, position and
+alert records in columnar NumPy ring buffers. Writes go to the wrapped
+backend first and are appended to the hot tier on success; query_all_data,
+query_medicine_history and query_alerts are answered from memory whenever
+the requested range is fully covered, and fall back to the backend otherwise.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Column layout per measurement. Strings (mac, medicine, receiver, ...) are
+# stored as int32 codes into a shared interner; missing floats are NaN and a
+# missing sequence number is -1.
+STATUS_COLUMNS = {
+    "time": np.float64,
+    "mac": np.int32,
+    "medicine": np.int32,
+    "receiver_id": np.int32,
+    "distance": np.float64,
+    "temperature": np.float64,
+    "battery": np.float32,
+    "moving": np.bool_,
+    "sequence_number": np.int32,
+}
+POSITION_COLUMNS = {
+    "time": np.float64,
+    "mac": np.int32,
+    "medicine": np.int32,
+    "x": np.float64,
+    "y": np.float64,
+    "z": np.float64,
+    "accuracy": np.float64,
+    "receiver_count": np.int16,
+}
+ALERT_COLUMNS = {
+    "time": np.float64,
+    "mac": np.int32,
+    "medicine": np.int32,
+    "alert_type": np.int32,
+    "severity": np.int32,
+    "message": np.object_,
+}
+
+# Share of the memory budget given to each measurement
+_BUDGET_SHARES = {"medicine_status": 0.7, "medicine_position": 0.25, "alerts": 0.05}
+
+# Rough per-row cost of a Python str referenced from an object column
+_OBJECT_ROW_BYTES = 96
+
+
+def _epoch(ts: Optional[datetime]) -> float:
+    """Seconds since the epoch for a naive-UTC or aware datetime."""
+    if ts is None:
+        return time.time()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _nan_if_none(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+class _Interner:
+    """Map strings to stable int32 codes and back."""
+
+    def __init__(self) -> None:
+        self._codes: Dict[Optional[str], int] = {}
+        self._values: List[Optional[str]] = []
+        self._lock = threading.Lock()
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            # Writes can come from several threads (MQTT, floor shards)
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def lookup(self, value: Optional[str]) -> Optional[int]:
+        return self._codes.get(value)
+
+    def value(self, code: int) -> Optional[str]:
+        return self._values[code]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class ColumnRing:
+    """Fixed-capacity ring buffer of NumPy columns for one measurement.
+
+    Rows are appended in arrival order. When the ring is full the oldest row
+    is overwritten and evicted_until advances, so callers can tell which
+    time ranges are no longer complete in memory.
+    """
+
+    def __init__(self, columns: Dict[str, Any], capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self.columns = {name: np.empty(self.capacity, dtype=dtype) for name, dtype in columns.items()}
+        self._head = 0
+        self.size = 0
+        # Newest timestamp that has been dropped from the ring
+        self.evicted_until = float("-inf")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self.columns.values())
+
+    def append(self, row: Dict[str, Any]) -> None:
+        if self.size == self.capacity:
+            self.evicted_until = max(self.evicted_until, float(self.columns["time"][self._head]))
+            self._head = (self._head + 1) % self.capacity
+            self.size -= 1
+        index = (self._head + self.size) % self.capacity
+        for name, col in self.columns.items():
+            col[index] = row[name]
+        self.size += 1
+
+    def evict_before(self, cutoff: float) -> int:
+        """Drop rows from the head that are older than cutoff."""
+        times = self.columns["time"]
+        dropped = 0
+        while self.size and times[self._head] < cutoff:
+            self.evicted_until = max(self.evicted_until, float(times[self._head]))
+            self._head = (self._head + 1) % self.capacity
+            self.size -= 1
+            dropped += 1
+        return dropped
+
+    def _ordered(self, name: str) -> np.ndarray:
+        col = self.columns[name]
+        end = self._head + self.size
+        if end <= self.capacity:
+            return col[self._head:end]
+        return np.concatenate((col[self._head:], col[:end - self.capacity]))
+
+    def select(self, since: float, **equals: int) -> Dict[str, np.ndarray]:
+        """Columns (oldest first) for rows at or after since matching equals."""
+        mask = self._ordered("time") >= since
+        for name, value in equals.items():
+            mask &= self._ordered(name) == value
+        return {name: self._ordered(name)[mask] for name in self.columns}
+
+
+class HotWindow:
+    """Columnar store of the last window_seconds of data within a memory budget."""
+
+    def __init__(self, window_seconds: float, memory_budget_bytes: int) -> None:
+        self.window_seconds = window_seconds
+        self.strings = _Interner()
+        self.rings: Dict[str, ColumnRing] = {}
+        for measurement, columns in (
+            ("medicine_status", STATUS_COLUMNS),
+            ("medicine_position", POSITION_COLUMNS),
+            ("alerts", ALERT_COLUMNS),
+        ):
+            row_bytes = sum(
+                _OBJECT_ROW_BYTES if dtype is np.object_ else np.dtype(dtype).itemsize
+                for dtype in columns.values()
+            )
+            capacity = int(memory_budget_bytes * _BUDGET_SHARES[measurement]) // row_bytes
+            self.rings[measurement] = ColumnRing(columns, capacity)
+
+        # Nothing written before the first append is in memory
+        self.first_append: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def append(self, measurement: str, row: Dict[str, Any]) -> None:
+        ring = self.rings[measurement]
+        with self._lock:
+            now = time.time()
+            if self.first_append is None:
+                self.first_append = now
+            ring.evict_before(now - self.window_seconds)
+            ring.append(row)
+
+    def covered_since(self, measurement: str, now: Optional[float] = None) -> float:
+        """Earliest time from which the measurement is complete in memory.
+
+        Nothing is covered until a full window has passed since the first
+        append, since older rows are only in the backend.
+        """
+        now = time.time() if now is None else now
+        if self.first_append is None or now < self.first_append + self.window_seconds:
+            return float("inf")
+        return max(self.rings[measurement].evicted_until, now - self.window_seconds)
+
+    def covers(self, since: float, *measurements: str, now: Optional[float] = None) -> bool:
+        """Whether [since, now] is complete in memory for every measurement.
+
+        Pass the now that since was computed from, so a range of exactly
+        the window length is covered.
+        """
+        return all(since >= self.covered_since(m, now) for m in measurements)
+
+    def select(self, measurement: str, since: float, **equals: int) -> Dict[str, np.ndarray]:
+        with self._lock:
+            return self.rings[measurement].select(since, **equals)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "window_seconds": self.window_seconds,
+            "memory_bytes": sum(ring.nbytes for ring in self.rings.values()),
+            "interned_strings": len(self.strings),
+            "measurements": {
+                name: {
+                    "rows": ring.size,
+                    "capacity": ring.capacity,
+                    "covered_seconds": round(max(0.0, now - self.covered_since(name, now)), 1),
+                }
+                for name, ring in self.rings.items()
+            },
+        }
+
+
+class HotTierDatabase:
+    """Storage wrapper that serves recent-range queries from a HotWindow.
+
+    Everything not overridden here (connect, close, is_ready, last_error,
+    query_latest_status, ...) is delegated to the wrapped backend.
+    """
+
+    def __init__(self, backend: Any, window_minutes: float, memory_budget_mb: float) -> None:
+        """Initialize the hot tier.
+
+        Args:
+            backend: Database or SQLiteDatabase instance to wrap.
+            window_minutes: How many minutes of recent data to keep in memory.
+            memory_budget_mb: Memory budget for the column buffers in MiB.
+        """
+        self.backend = backend
+        self.hot = HotWindow(window_minutes * 60, int(memory_budget_mb * 1024 * 1024))
+        self.hot_queries = 0
+        self.cold_queries = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+    def __enter__(self) -> "HotTierDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.backend.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def write_scan(
+        self,
+        mac: str,
+        receiver_id: str,
+        distance: float,
+        medicine: str,
+        temperature: Optional[float] = None,
+        battery: Optional[int] = None,
+        moving: bool = False,
+        sequence_number: Optional[int] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store a scan in the backend, then in the hot window."""
+        ok = self.backend.write_scan(
+            mac, receiver_id, distance, medicine, temperature=temperature,
+            battery=battery, moving=moving, sequence_number=sequence_number,
+            timestamp=timestamp
+        )
+        if ok:
+            strings = self.hot.strings
+            self.hot.append("medicine_status", {
+                "time": _epoch(timestamp),
+                "mac": strings.code(mac),
+                "medicine": strings.code(medicine),
+                "receiver_id": strings.code(receiver_id),
+                "distance": distance,
+                "temperature": _nan_if_none(temperature),
+                "battery": _nan_if_none(battery),
+                "moving": bool(moving),
+                "sequence_number": -1 if sequence_number is None else sequence_number,
+            })
+        return ok
+
+    def write_position(
+        self,
+        mac: str,
+        x: float,
+        y: float,
+        z: float,
+        accuracy: float,
+        medicine: str,
+        receiver_count: int,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store a position in the backend, then in the hot window."""
+        ok = self.backend.write_position(
+            mac, x, y, z, accuracy, medicine, receiver_count, timestamp=timestamp
+        )
+        if ok:
+            strings = self.hot.strings
+            self.hot.append("medicine_position", {
+                "time": _epoch(timestamp),
+                "mac": strings.code(mac),
+                "medicine": strings.code(medicine),
+                "x": x,
+                "y": y,
+                "z": z,
+                "accuracy": accuracy,
+                "receiver_count": receiver_count,
+            })
+        return ok
+
+    def write_positions(self, positions: List[Dict[str, Any]]) -> bool:
+        """Store a batch of positions in the backend, then in the hot window."""
+        ok = self.backend.write_positions(positions)
+        if ok:
+            strings = self.hot.strings
+            for p in positions:
+                self.hot.append("medicine_position", {
+                    "time": _epoch(p.get("timestamp")),
+                    "mac": strings.code(p["mac"]),
+                    "medicine": strings.code(p["medicine"]),
+                    "x": p["x"],
+                    "y": p["y"],
+                    "z": p["z"],
+                    "accuracy": p["accuracy"],
+                    "receiver_count": p["receiver_count"],
+                })
+        return ok
+
+    def write_alert(
+        self,
+        mac: str,
+        alert_type: str,
+        message: str,
+        severity: str = "warning",
+        medicine: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store an alert in the backend, then in the hot window."""
+        ok = self.backend.write_alert(
+            mac, alert_type, message, severity=severity, medicine=medicine,
+            metadata=metadata, timestamp=timestamp
+        )
+        if ok:
+            strings = self.hot.strings
+            self.hot.append("alerts", {
+                "time": _epoch(timestamp),
+                "mac": strings.code(mac),
+                "medicine": strings.code(medicine),
+                "alert_type": strings.code(alert_type),
+                "severity": strings.code(severity),
+                "message": message,
+            })
+        return ok
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _times(self, column: np.ndarray) -> List[datetime]:
+        return [datetime.fromtimestamp(t, tz=timezone.utc) for t in column.tolist()]
+
+    def _strings(self, column: np.ndarray) -> List[Optional[str]]:
+        value = self.hot.strings.value
+        return [value(code) for code in column.tolist()]
+
+    def _status_records(self, cols: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        order = np.argsort(cols["time"], kind="stable")
+        cols = {name: col[order] for name, col in cols.items()}
+        return [
+            {
+                "time": t,
+                "mac": mac,
+                "medicine": medicine,
+                "receiver_id": receiver_id,
+                "distance": distance,
+                "temperature": _none_if_nan(temperature),
+                "battery": None if battery != battery else int(battery),
+                "moving": moving,
+                "sequence_number": None if seq < 0 else seq,
+            }
+            for t, mac, medicine, receiver_id, distance, temperature, battery, moving, seq in zip(
+                self._times(cols["time"]),
+                self._strings(cols["mac"]),
+                self._strings(cols["medicine"]),
+                self._strings(cols["receiver_id"]),
+                cols["distance"].tolist(),
+                cols["temperature"].tolist(),
+                cols["battery"].tolist(),
+                cols["moving"].tolist(),
+                cols["sequence_number"].tolist(),
+            )
+        ]
+
+    def _position_records(self, cols: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "measurement": "medicine_position",
+                "time": t,
+                "mac": mac,
+                "medicine": medicine,
+                "x": x,
+                "y": y,
+                "z": z,
+                "accuracy": accuracy,
+                "receiver_count": receiver_count,
+            }
+            for t, mac, medicine, x, y, z, accuracy, receiver_count in zip(
+                self._times(cols["time"]),
+                self._strings(cols["mac"]),
+                self._strings(cols["medicine"]),
+                cols["x"].tolist(),
+                cols["y"].tolist(),
+                cols["z"].tolist(),
+                cols["accuracy"].tolist(),
+                cols["receiver_count"].tolist(),
+            )
+        ]
+
+    def query_all_data(self, minutes: int = 60) -> List[Dict[str, Any]]:
+        """Get raw status data, from memory when the range is hot."""
+        now = time.time()
+        since = now - minutes * 60
+        if not self.hot.covers(since, "medicine_status", now=now):
+            self.cold_queries += 1
+            return self.backend.query_all_data(minutes)
+
+        self.hot_queries += 1
+        results = self._status_records(self.hot.select("medicine_status", since))
+        logger.info(f"Retrieved {len(results)} records from last {minutes} minutes (hot tier)")
+        return results
+
+    def query_medicine_history(self, mac: str, hours: int = 24) -> List[Dict[str, Any]]:
+        """Get position and status history for a medicine, from memory when hot."""
+        now = time.time()
+        since = now - hours * 3600
+        if not self.hot.covers(since, "medicine_status", "medicine_position", now=now):
+            self.cold_queries += 1
+            return self.backend.query_medicine_history(mac, hours)
+
+        self.hot_queries += 1
+        code = self.hot.strings.lookup(mac)
+        if code is None:
+            return []
+
+        results = []
+        for record in self._status_records(self.hot.select("medicine_status", since, mac=code)):
+            record["measurement"] = "medicine_status"
+            results.append({k: v for k, v in record.items() if v is not None})
+
+        results.extend(self._position_records(self.hot.select("medicine_position", since, mac=code)))
+
+        results.sort(key=lambda r: r["time"])
+        logger.debug(f"Retrieved {len(results)} history records for {mac} (hot tier)")
+        return results
+
+    def query_histories(
+        self,
+        macs: Optional[List[str]] = None,
+        medicine: Optional[str] = None,
+        hours: int = 24
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get histories for several medicines, from memory when hot."""
+        now = time.time()
+        since = now - hours * 3600
+        if not self.hot.covers(since, "medicine_status", "medicine_position", now=now):
+            self.cold_queries += 1
+            return self.backend.query_histories(macs, medicine, hours)
+
+        self.hot_queries += 1
+        histories: Dict[str, List[Dict[str, Any]]] = {mac: [] for mac in macs or ()}
+        equals = {}
+        if medicine:
+            equals["medicine"] = self.hot.strings.lookup(medicine)
+            if equals["medicine"] is None:
+                return histories
+        codes = None
+        if macs:
+            codes = [code for code in map(self.hot.strings.lookup, macs) if code is not None]
+
+        def select(measurement: str) -> Dict[str, np.ndarray]:
+            cols = self.hot.select(measurement, since, **equals)
+            if codes is not None:
+                keep = np.isin(cols["mac"], codes)
+                cols = {name: col[keep] for name, col in cols.items()}
+            return cols
+
+        for record in self._status_records(select("medicine_status")):
+            record["measurement"] = "medicine_status"
+            histories.setdefault(record["mac"], []).append(
+                {k: v for k, v in record.items() if v is not None}
+            )
+        for record in self._position_records(select("medicine_position")):
+            histories.setdefault(record["mac"], []).append(record)
+
+        for records in histories.values():
+            records.sort(key=lambda r: r["time"])
+        logger.debug(
+            f"Retrieved {sum(map(len, histories.values()))} history records "
+            f"for {len(histories)} tags (hot tier)"
+        )
+        return histories
+
+    def query_alerts(
+        self,
+        hours: int = 24,
+        severity: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Query alerts, from memory when the range is hot."""
+        now = time.time()
+        since = now - hours * 3600
+        if not self.hot.covers(since, "alerts", now=now):
+            self.cold_queries += 1
+            return self.backend.query_alerts(hours=hours, severity=severity, limit=limit)
+
+        self.hot_queries += 1
+        equals = {}
+        if severity:
+            code = self.hot.strings.lookup(severity)
+            if code is None:
+                return []
+            equals["severity"] = code
+
+        cols = self.hot.select("alerts", since, **equals)
+        order = np.argsort(cols["time"], kind="stable")[::-1][:limit]
+        cols = {name: col[order] for name, col in cols.items()}
+        results = [
+            {
+                "mac": mac,
+                "alert_type": alert_type,
+                "severity": sev,
+                "message": message,
+                "medicine": medicine,
+                "time": t,
+            }
+            for t, mac, medicine, alert_type, sev, message in zip(
+                self._times(cols["time"]),
+                self._strings(cols["mac"]),
+                self._strings(cols["medicine"]),
+                self._strings(cols["alert_type"]),
+                self._strings(cols["severity"]),
+                cols["message"].tolist(),
+            )
+        ]
+        logger.debug(f"Retrieved {len(results)} alerts (hot tier)")
+        return results
+
+    def get_hot_stats(self) -> Dict[str, Any]:
+        """Get hot tier occupancy and hit counters."""
+        return {
+            **self.hot.stats(),
+            "hot_queries": self.hot_queries,
+            "cold_queries": self.cold_queries,
+        }
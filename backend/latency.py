@@ -0,0 +1,241 @@
+"""End-to-end latency tracing for the Medical Tracker IoT backend.
+
+Receivers stamp their payloads with their own clocks: ISO strings on the
+Raspberry Pi, epoch-second strings on the Pico. This module parses those
+timestamps, estimates each receiver's clock skew from its heartbeats, and
+keeps latency histograms for every hop a reading takes:
+
+    radio_to_publish    advert observed -> message published (receiver clock)
+    publish_to_backend  message published -> received here (network + broker,
+                        corrected for the receiver's clock skew)
+    backend_to_stored   received here -> scan write returned
+    backend_to_fix      newest reading received -> position write returned
+
+It also decides which receivers are unhealthy: a receiver whose heartbeats
+stopped is dead, and one whose skew-corrected publish_to_backend latency
+stays above the limit is lagging. Both are excluded from position solving.
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+# MicroPython ports without MICROPY_EPOCH_IS_1970 count from 2000-01-01
+_EPOCH_2000 = 946684800.0
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+HOPS = ("radio_to_publish", "publish_to_backend", "backend_to_stored", "backend_to_fix")
+
+
+def parse_source_time(value: Any) -> Optional[float]:
+    """Convert a receiver timestamp to epoch seconds.
+
+    Accepts ISO 8601 strings (a trailing "Z" is fine, naive means UTC) and
+    epoch seconds as numbers or strings. Returns None if unparseable.
+    """
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    if not math.isfinite(seconds):
+        return None
+    if seconds < _EPOCH_2000:
+        seconds += _EPOCH_2000
+    return seconds
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        ms = max(0.0, seconds * 1000.0)
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding the p-th percentile, capped at the max."""
+        if not self.count:
+            return None
+        target = math.ceil(self.count * p / 100.0)
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running >= target:
+                return min(float(BUCKETS_MS[i]), round(self.max_ms, 2)) if i < len(BUCKETS_MS) else round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets_ms": dict(zip([str(b) for b in BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class ReceiverClock:
+    """Clock skew and health of one receiver."""
+
+    # Heartbeat offsets kept for the skew estimate
+    WINDOW = 20
+    # Smoothing for the per-receiver lag average
+    LAG_ALPHA = 0.2
+
+    def __init__(self) -> None:
+        self._offsets: deque = deque(maxlen=self.WINDOW)
+        self.last_heartbeat: Optional[float] = None
+        self.last_message: Optional[float] = None
+        self.lag_seconds: Optional[float] = None
+
+    @property
+    def skew_seconds(self) -> float:
+        """Receiver clock minus backend clock.
+
+        Each heartbeat offset (source time minus arrival time) is skew minus
+        a non-negative transit delay, so the maximum over recent heartbeats
+        is the tightest estimate.
+        """
+        return max(self._offsets) if self._offsets else 0.0
+
+    def on_heartbeat(self, source_ts: float, received_at: float) -> None:
+        self._offsets.append(source_ts - received_at)
+        self.last_heartbeat = received_at
+
+    def on_message(self, lag: Optional[float], received_at: float) -> None:
+        self.last_message = received_at
+        if lag is not None:
+            self.lag_seconds = lag if self.lag_seconds is None else (
+                self.lag_seconds + self.LAG_ALPHA * (lag - self.lag_seconds)
+            )
+
+
+class LatencyTracker:
+    """Per-hop latency histograms and receiver health for the tracker."""
+
+    def __init__(self, dead_after_seconds: float, max_lag_seconds: float) -> None:
+        """Initialize the tracker.
+
+        Args:
+            dead_after_seconds: A receiver that has sent heartbeats before is
+                dead once none arrived for this long.
+            max_lag_seconds: A receiver whose average publish_to_backend
+                latency exceeds this is lagging.
+        """
+        self.dead_after_seconds = dead_after_seconds
+        self.max_lag_seconds = max_lag_seconds
+
+        self.histograms = {hop: LatencyHistogram() for hop in HOPS}
+        self.receivers: Dict[str, ReceiverClock] = {}
+        self.excluded: Set[str] = set()
+        self.unparsed_timestamps = 0
+        self._lock = threading.Lock()
+
+    def _clock(self, receiver_id: str) -> ReceiverClock:
+        clock = self.receivers.get(receiver_id)
+        if clock is None:
+            clock = self.receivers[receiver_id] = ReceiverClock()
+        return clock
+
+    def record(self, hop: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[hop].record(seconds)
+
+    def on_heartbeat(self, receiver_id: str, payload: Dict[str, Any], received_at: float) -> None:
+        """Feed a receiver heartbeat into its skew estimate."""
+        source_ts = parse_source_time(payload.get("timestamp"))
+        with self._lock:
+            if source_ts is None:
+                self.unparsed_timestamps += 1
+                return
+            self._clock(receiver_id).on_heartbeat(source_ts, received_at)
+
+    def on_scan(
+        self,
+        receiver_id: str,
+        sent_at: Any,
+        observed_at: Any,
+        received_at: float
+    ) -> None:
+        """Record the receiver-side and transport hops of one scan.
+
+        Args:
+            receiver_id: Receiver that published the scan.
+            sent_at: Message-level publish timestamp from the receiver.
+            observed_at: Scan-level observation timestamp, if any.
+            received_at: Epoch seconds the message reached the backend.
+        """
+        sent = parse_source_time(sent_at)
+        observed = parse_source_time(observed_at)
+        with self._lock:
+            clock = self._clock(receiver_id)
+            if sent is None:
+                self.unparsed_timestamps += 1
+                clock.on_message(None, received_at)
+                return
+            if observed is not None:
+                self.histograms["radio_to_publish"].record(sent - observed)
+            lag = received_at - (sent - clock.skew_seconds)
+            self.histograms["publish_to_backend"].record(lag)
+            clock.on_message(lag, received_at)
+
+    def refresh(self, now: Optional[float] = None) -> Set[str]:
+        """Recompute the set of receivers excluded from solving."""
+        now = time.time() if now is None else now
+        excluded = set()
+        with self._lock:
+            for receiver_id, clock in self.receivers.items():
+                if clock.last_heartbeat is not None and now - clock.last_heartbeat > self.dead_after_seconds:
+                    excluded.add(receiver_id)
+                elif clock.lag_seconds is not None and clock.lag_seconds > self.max_lag_seconds:
+                    excluded.add(receiver_id)
+        # Swapped in whole so readers never see a half-built set
+        self.excluded = excluded
+        return excluded
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "hops": {hop: hist.to_dict() for hop, hist in self.histograms.items()},
+                "receivers": {
+                    receiver_id: {
+                        "skew_seconds": round(clock.skew_seconds, 3),
+                        "lag_seconds": None if clock.lag_seconds is None else round(clock.lag_seconds, 3),
+                        "heartbeat_age_seconds": (
+                            None if clock.last_heartbeat is None else round(now - clock.last_heartbeat, 1)
+                        ),
+                        "message_age_seconds": (
+                            None if clock.last_message is None else round(now - clock.last_message, 1)
+                        ),
+                        "excluded": receiver_id in self.excluded,
+                    }
+                    for receiver_id, clock in sorted(self.receivers.items())
+                },
+                "unparsed_timestamps": self.unparsed_timestamps,
+            }
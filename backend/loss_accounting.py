@@ -0,0 +1,282 @@
+"""Packet loss and sequence gap accounting for the Medical Tracker IoT backend.
+
+Tags number their advertisements with a 16-bit sequence number. The tracker
+only uses it to drop duplicates; this module uses it to measure how well
+each receiver hears each tag. For every (tag, receiver) link it counts
+received, missing, duplicate and reordered advertisements, and keeps a
+bitmask of the last WINDOW sequence numbers for a rolling reception ratio.
+A tag-level counter fed by every receiver shows how many advertisements
+reached the backend at all, and how many receivers heard each one.
+
+Sequence arithmetic is modulo 2**16. A forward step of d means d - 1
+advertisements were missed. A step back within the window fills a gap
+(reordered) or repeats a number already seen (duplicate). A jump forward
+by more than max_gap, or back past the window, is taken as the tag
+restarting its counter and starts the link afresh rather than counting as
+loss.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+SEQ_MODULUS = 1 << 16
+
+# Counters reported per summary interval as deltas
+_COUNTERS = ("received", "expected", "duplicates", "reordered", "resets")
+
+
+class SequenceCounter:
+    """Reception counters for one stream of sequence numbers."""
+
+    __slots__ = (
+        "window", "max_gap", "highest", "mask", "span", "last_seen",
+        "received", "expected", "duplicates", "reordered", "max_reorder_depth",
+        "resets", "longest_gap", "_reported",
+    )
+
+    def __init__(self, window: int, max_gap: int) -> None:
+        self.window = window
+        self.max_gap = max_gap
+        self.highest: Optional[int] = None
+        # Bit i set: sequence number highest - i was received
+        self.mask = 0
+        # Sequence numbers the mask covers so far (at most window)
+        self.span = 0
+        self.last_seen = 0.0
+
+        self.received = 0
+        self.expected = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.max_reorder_depth = 0
+        self.resets = 0
+        self.longest_gap = 0
+        self._reported = (0,) * len(_COUNTERS)
+
+    def observe(self, seq: int, now: float) -> str:
+        """Account for one received sequence number.
+
+        Returns:
+            str: "new", "gap", "duplicate", "reordered" or "reset".
+        """
+        self.last_seen = now
+        if self.highest is None:
+            self._restart(seq)
+            return "new"
+
+        step = (seq - self.highest) % SEQ_MODULUS
+        if 0 < step <= self.max_gap:
+            self.highest = seq
+            self.mask = ((self.mask << step) | 1) & ((1 << self.window) - 1)
+            self.span = min(self.window, self.span + step)
+            self.expected += step
+            self.received += 1
+            if step > 1:
+                self.longest_gap = max(self.longest_gap, step - 1)
+                return "gap"
+            return "new"
+
+        behind = (self.highest - seq) % SEQ_MODULUS
+        if behind < self.window:
+            if self.mask >> behind & 1:
+                self.duplicates += 1
+                return "duplicate"
+            if behind >= self.span:
+                # Older than anything seen yet: the stream started earlier
+                self.expected += behind + 1 - self.span
+                self.span = behind + 1
+            self.mask |= 1 << behind
+            self.received += 1
+            self.reordered += 1
+            self.max_reorder_depth = max(self.max_reorder_depth, behind)
+            return "reordered"
+
+        self.resets += 1
+        self._restart(seq)
+        return "reset"
+
+    def _restart(self, seq: int) -> None:
+        self.highest = seq
+        self.mask = 1
+        self.span = 1
+        self.expected += 1
+        self.received += 1
+
+    @property
+    def window_ratio(self) -> Optional[float]:
+        """Share of the last span sequence numbers that arrived."""
+        if not self.span:
+            return None
+        return bin(self.mask).count("1") / self.span
+
+    def stats(self) -> Dict[str, Any]:
+        lost = max(0, self.expected - self.received)
+        return {
+            "received": self.received,
+            "expected": self.expected,
+            "lost": lost,
+            "reception_ratio": round(self.received / self.expected, 4) if self.expected else None,
+            "window_ratio": _round(self.window_ratio),
+            "duplicates": self.duplicates,
+            "duplicate_rate": round(self.duplicates / (self.received + self.duplicates), 4)
+            if self.received else None,
+            "reordered": self.reordered,
+            "max_reorder_depth": self.max_reorder_depth,
+            "longest_gap": self.longest_gap,
+            "resets": self.resets,
+            "last_seq": self.highest,
+        }
+
+    def delta(self) -> Dict[str, int]:
+        """Counter increments since the previous call."""
+        current = tuple(getattr(self, name) for name in _COUNTERS)
+        delta = {name: now - then for name, now, then in zip(_COUNTERS, current, self._reported)}
+        self._reported = current
+        return delta
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+def _merge(counters: List[SequenceCounter]) -> Dict[str, Any]:
+    """Combine several links' counters, e.g. all tags heard by a receiver."""
+    received = sum(c.received for c in counters)
+    expected = sum(c.expected for c in counters)
+    span = sum(c.span for c in counters)
+    duplicates = sum(c.duplicates for c in counters)
+    return {
+        "links": len(counters),
+        "received": received,
+        "expected": expected,
+        "lost": max(0, expected - received),
+        "reception_ratio": round(received / expected, 4) if expected else None,
+        "window_ratio": round(sum(bin(c.mask).count("1") for c in counters) / span, 4) if span else None,
+        "duplicate_rate": round(duplicates / (received + duplicates), 4) if received else None,
+        "reordered": sum(c.reordered for c in counters),
+        "max_reorder_depth": max((c.max_reorder_depth for c in counters), default=0),
+    }
+
+
+class LossAccounting:
+    """Per (tag, receiver) and per-tag reception accounting."""
+
+    def __init__(self, window: int = 256, max_gap: int = 1024, idle_seconds: float = 600.0) -> None:
+        """Initialize the accounting.
+
+        Args:
+            window: Sequence numbers covered by the rolling reception ratio.
+            max_gap: Larger forward jumps count as a counter restart, not loss.
+            idle_seconds: Links not heard from for this long are forgotten.
+        """
+        self.window = window
+        self.max_gap = max_gap
+        self.idle_seconds = idle_seconds
+        # (mac, receiver_id) -> link counter; (mac, None) -> tag counter
+        self._counters: Dict[Tuple[str, Optional[str]], SequenceCounter] = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, key: Tuple[str, Optional[str]]) -> SequenceCounter:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = SequenceCounter(self.window, self.max_gap)
+        return counter
+
+    def observe(self, mac: str, receiver_id: str, seq: int, now: Optional[float] = None) -> str:
+        """Account for one reading of advertisement seq by a receiver.
+
+        Must see every reading, including the duplicates deduplication drops.
+
+        Returns:
+            str: What the reading was on its link (see SequenceCounter.observe).
+        """
+        now = time.time() if now is None else now
+        seq %= SEQ_MODULUS
+        with self._lock:
+            self._counter((mac, None)).observe(seq, now)
+            return self._counter((mac, receiver_id)).observe(seq, now)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Forget links idle for idle_seconds.
+
+        Returns:
+            int: Number of counters removed.
+        """
+        cutoff = (time.time() if now is None else now) - self.idle_seconds
+        with self._lock:
+            stale = [key for key, counter in self._counters.items() if counter.last_seen < cutoff]
+            for key in stale:
+                del self._counters[key]
+        return len(stale)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-link rows for periodic storage: interval deltas plus ratios.
+
+        Links with nothing received since the previous summary are skipped.
+        """
+        rows = []
+        with self._lock:
+            for (mac, receiver_id), counter in self._counters.items():
+                if receiver_id is None:
+                    continue
+                delta = counter.delta()
+                if not delta["received"] and not delta["duplicates"]:
+                    continue
+                rows.append({
+                    "mac": mac,
+                    "receiver_id": receiver_id,
+                    **delta,
+                    "lost": max(0, delta["expected"] - delta["received"]),
+                    "window_ratio": _round(counter.window_ratio),
+                    "max_reorder_depth": counter.max_reorder_depth,
+                })
+        return rows
+
+    def stats(self, mac: Optional[str] = None, receiver_id: Optional[str] = None) -> Dict[str, Any]:
+        """Reception statistics per receiver, per tag and per link.
+
+        Args:
+            mac: Only include this tag.
+            receiver_id: Only include this receiver.
+        """
+        with self._lock:
+            links: Dict[Hashable, SequenceCounter] = {
+                key: counter for key, counter in self._counters.items()
+                if key[1] is not None
+                and (mac is None or key[0] == mac)
+                and (receiver_id is None or key[1] == receiver_id)
+            }
+            tags = {
+                key[0]: counter for key, counter in self._counters.items()
+                if key[1] is None and (mac is None or key[0] == mac)
+            }
+
+            by_receiver: Dict[str, List[SequenceCounter]] = {}
+            for (_, rid), counter in links.items():
+                by_receiver.setdefault(rid, []).append(counter)
+
+            tag_stats = {}
+            for tag, counter in tags.items():
+                heard = [c for (m, _), c in links.items() if m == tag]
+                readings = sum(c.received for c in heard)
+                tag_stats[tag] = {
+                    "received": counter.received,
+                    "expected": counter.expected,
+                    "reception_ratio": round(counter.received / counter.expected, 4)
+                    if counter.expected else None,
+                    "window_ratio": _round(counter.window_ratio),
+                    "receivers": len(heard),
+                    "receivers_per_advert": round(readings / counter.received, 2)
+                    if counter.received and heard else None,
+                }
+
+            return {
+                "window": self.window,
+                "receivers": {rid: _merge(counters) for rid, counters in sorted(by_receiver.items())},
+                "tags": dict(sorted(tag_stats.items())),
+                "links": [
+                    {"mac": m, "receiver_id": rid, **counter.stats()}
+                    for (m, rid), counter in sorted(links.items())
+                ],
+            }
@@ -5,32 +5,48 @@ REST API endpoints for querying medicine data, and CORS middleware.
 """
 
 import logging
+import re
 import ssl
 import threading
 import time
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 import paho.mqtt.client as mqtt
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from async_mqtt import AsyncMqttRunner
 from config import settings
 from database import Database
+import export
+from hot_logging import configure_logging, logging_stats, set_level, set_sampling, stop_logging
 from mqtt_handler import MedicineTracker
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from receivers import ReceiverRegistry
+from storage import create_database
+
+# Configure logging: queued, with per-message categories sampled
+configure_logging(
+    level=settings.LOG_LEVEL,
+    queue_size=settings.LOG_QUEUE_SIZE,
+    sampling=settings.LOG_SAMPLING,
+    rate_limit=settings.LOG_RATE_LIMIT
 )
 logger = logging.getLogger(__name__)
 
+# MAC addresses accepted by the batch history endpoint
+_MAC_RE = re.compile(r"[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}")
+
 # Global instances
 db: Optional[Database] = None
+receiver_registry: Optional[ReceiverRegistry] = None
 medicine_tracker: Optional[MedicineTracker] = None
 mqtt_client: Optional[mqtt.Client] = None
 mqtt_thread: Optional[threading.Thread] = None
+mqtt_runner: Optional[AsyncMqttRunner] = None
+storage_thread: Optional[threading.Thread] = None
 
 
 def setup_mqtt_client(tracker: MedicineTracker) -> mqtt.Client:
@@ -65,6 +81,9 @@ def setup_mqtt_client(tracker: MedicineTracker) -> mqtt.Client:
             logger.info("Connected to MQTT broker")
             client.subscribe(settings.mqtt.topic)
             logger.info(f"Subscribed to topic: {settings.mqtt.topic}")
+            if settings.MQTT_STATUS_TOPIC:
+                client.subscribe(settings.MQTT_STATUS_TOPIC)
+                logger.info(f"Subscribed to topic: {settings.MQTT_STATUS_TOPIC}")
         else:
             logger.error(f"Failed to connect to MQTT broker: {rc}")
 
@@ -100,43 +119,95 @@ def mqtt_loop(client: mqtt.Client) -> None:
             time.sleep(5)  # Wait before reconnecting
 
 
+def storage_connect_loop(database: Database, tracker: MedicineTracker) -> None:
+    """Connect to storage in the background, retrying until it succeeds.
+
+    Runs alongside the MQTT thread so ingest starts immediately; messages
+    that arrive first are buffered by the tracker and replayed once the
+    connection is up.
+
+    Args:
+        database: Database instance to connect.
+        tracker: MedicineTracker to notify when storage is ready.
+    """
+    while True:
+        try:
+            database.connect()
+            break
+        except ConnectionError as e:
+            logger.warning(
+                f"Storage not ready ({e}), retrying in {settings.STORAGE_RETRY_SECONDS}s"
+            )
+            time.sleep(settings.STORAGE_RETRY_SECONDS)
+
+    tracker.on_storage_ready()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan context manager.
 
-    Handles startup and shutdown events for the FastAPI application,
-    including MQTT client initialization and cleanup.
+    Handles startup and shutdown events for the FastAPI application.
+    MQTT and storage connect concurrently in the background so the API
+    comes up immediately; readiness is reported by /health/ready. With
+    MQTT_MODE=asyncio the MQTT client runs as a task on this event loop
+    instead of in its own thread; that mode requires the admission queue.
 
     Args:
         app: FastAPI application instance.
     """
-    global db, medicine_tracker, mqtt_client, mqtt_thread
+    global db, receiver_registry, medicine_tracker, mqtt_client, mqtt_thread, mqtt_runner, storage_thread
 
     # Startup
     logger.info("Starting Medical Tracker backend...")
 
     try:
-        # Initialize database
-        db = Database(
-            url=settings.INFLUXDB_URL,
-            token=settings.INFLUXDB_TOKEN,
-            org=settings.INFLUXDB_ORG,
-            bucket=settings.INFLUXDB_BUCKET
-        )
-        logger.info("Database connection established")
+        # In asyncio mode paho callbacks run on the event loop, so message
+        # processing (and storage writes) must go through the admission queue
+        if settings.MQTT_MODE not in ("thread", "asyncio"):
+            raise ValueError(f"Unknown MQTT_MODE: {settings.MQTT_MODE}")
+        if settings.MQTT_MODE == "asyncio" and settings.ADMISSION_QUEUE_SIZE <= 0:
+            raise ValueError("MQTT_MODE=asyncio requires the admission queue (ADMISSION_QUEUE_SIZE > 0)")
+
+        # Create storage backend (connection happens in storage_thread)
+        db = create_database()
+        logger.info(f"Storage backend: {settings.STORAGE_BACKEND}")
+
+        # Load receivers; reloaded in the background when the table changes
+        receiver_registry = ReceiverRegistry.from_settings(settings)
+        receiver_registry.start_watch(settings.RECEIVER_RELOAD_SECONDS)
 
         # Initialize medicine tracker
-        medicine_tracker = MedicineTracker(db)
+        medicine_tracker = MedicineTracker(db, receiver_registry)
         medicine_tracker.start()
         logger.info("Medicine tracker started")
 
         # Initialize MQTT client
         mqtt_client = setup_mqtt_client(medicine_tracker)
 
-        # Start MQTT thread
-        mqtt_thread = threading.Thread(target=mqtt_loop, args=(mqtt_client,), daemon=True)
-        mqtt_thread.start()
-        logger.info("MQTT client thread started")
+        if settings.MQTT_MODE == "asyncio":
+            mqtt_runner = AsyncMqttRunner(
+                mqtt_client,
+                settings.MQTT_HOST,
+                settings.MQTT_PORT,
+                keepalive=60,
+                min_delay=settings.MQTT_RECONNECT_MIN_SECONDS,
+                max_delay=settings.MQTT_RECONNECT_MAX_SECONDS
+            )
+            mqtt_runner.start()
+            logger.info("MQTT client running on the event loop")
+        else:
+            # Start MQTT thread
+            mqtt_thread = threading.Thread(target=mqtt_loop, args=(mqtt_client,), daemon=True)
+            mqtt_thread.start()
+            logger.info("MQTT client thread started")
+
+        # Start storage connection thread
+        storage_thread = threading.Thread(
+            target=storage_connect_loop, args=(db, medicine_tracker), daemon=True
+        )
+        storage_thread.start()
+        logger.info("Storage connection thread started")
 
         yield
 
@@ -152,7 +223,13 @@ async def lifespan(app: FastAPI):
             medicine_tracker.stop()
             logger.info("Medicine tracker stopped")
 
-        if mqtt_client:
+        if receiver_registry:
+            receiver_registry.stop_watch()
+
+        if mqtt_runner:
+            await mqtt_runner.stop()
+            logger.info("MQTT client disconnected")
+        elif mqtt_client:
             mqtt_client.loop_stop()
             mqtt_client.disconnect()
             logger.info("MQTT client disconnected")
@@ -161,6 +238,9 @@ async def lifespan(app: FastAPI):
             db.close()
             logger.info("Database connection closed")
 
+        # Flush queued log records
+        stop_logging()
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -193,6 +273,8 @@ async def root() -> Dict[str, Any]:
         "status": "running",
         "endpoints": [
             "/",
+            "/health/live",
+            "/health/ready",
             "/api/medicines",
             "/api/medicine/{mac}/history",
             "/api/alerts"
@@ -200,6 +282,41 @@ async def root() -> Dict[str, Any]:
     }
 
 
+@app.get("/health/live")
+async def health_live() -> Dict[str, Any]:
+    """Liveness probe: the process is up and serving requests.
+
+    Returns:
+        Dict with liveness status.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready() -> JSONResponse:
+    """Readiness probe reporting the state of each dependency.
+
+    Returns:
+        JSONResponse with per-dependency readiness; status 503 until both
+        MQTT and storage are ready.
+    """
+    mqtt_ready = mqtt_client.is_connected() if mqtt_client else False
+    storage_ready = db.is_ready if db else False
+
+    body = {
+        "ready": mqtt_ready and storage_ready,
+        "dependencies": {
+            "mqtt": {"ready": mqtt_ready},
+            "storage": {
+                "ready": storage_ready,
+                "error": db.last_error if db else None
+            }
+        },
+        "startup_buffer": medicine_tracker.get_startup_stats() if medicine_tracker else None
+    }
+    return JSONResponse(content=body, status_code=200 if body["ready"] else 503)
+
+
 @app.get("/api/medicines")
 async def get_medicines() -> List[Dict[str, Any]]:
     """Get current status of all tracked medicines (raw scan data).
@@ -210,7 +327,7 @@ async def get_medicines() -> List[Dict[str, Any]]:
     Raises:
         HTTPException: If database is not available.
     """
-    if db is None:
+    if db is None or not db.is_ready:
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
@@ -233,7 +350,7 @@ async def get_all_data(minutes: int = 60) -> List[Dict[str, Any]]:
     Returns:
         List of all records from medicine_status.
     """
-    if db is None:
+    if db is None or not db.is_ready:
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
@@ -261,7 +378,7 @@ async def get_medicine_history(
     Raises:
         HTTPException: If database is not available or query fails.
     """
-    if db is None:
+    if db is None or not db.is_ready:
         raise HTTPException(status_code=503, detail="Database not available")
 
     if hours < 1 or hours > 168:  # Max 1 week
@@ -275,6 +392,82 @@ async def get_medicine_history(
         raise HTTPException(status_code=500, detail="Failed to query medicine history")
 
 
+@app.get("/api/medicines/history")
+async def get_medicines_history(
+    mac: Optional[List[str]] = Query(None),
+    medicine: Optional[str] = None,
+    floor: Optional[int] = None,
+    hours: int = 24
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Get position and status history for several medicines in one query.
+
+    Select tags by repeating mac (or passing comma-separated MACs), by
+    medicine, by floor, or any combination (all filters must match). A
+    floor resolves to the tags currently heard best on it.
+
+    Args:
+        mac: MAC addresses of the medicine beacons.
+        medicine: Only include tags of this medicine.
+        floor: Only include tags currently located on this floor.
+        hours: Number of hours of history to retrieve (default: 24).
+
+    Returns:
+        Dict mapping each MAC to its records, sorted by time.
+
+    Raises:
+        HTTPException: If database is not available, a MAC is malformed, no
+            filter or too many tags are given, or the query fails.
+    """
+    if db is None or not db.is_ready:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    if hours < 1 or hours > 168:  # Max 1 week
+        raise HTTPException(status_code=400, detail="Hours must be between 1 and 168")
+
+    macs = [m.strip() for value in mac or () for m in value.split(",") if m.strip()] or None
+    invalid = [m for m in macs or () if not _MAC_RE.fullmatch(m)]
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Invalid MAC address: {invalid[0]!r}")
+    if macs is None and medicine is None and floor is None:
+        raise HTTPException(status_code=400, detail="Give at least one of mac, medicine or floor")
+
+    if floor is not None:
+        if medicine_tracker is None:
+            raise HTTPException(status_code=503, detail="Tracker not available")
+        on_floor = medicine_tracker.tags_on_floor(floor)
+        if macs is not None:
+            floor_tags = set(on_floor)
+            on_floor = [m for m in macs if m in floor_tags]
+        macs = on_floor
+        if not macs:
+            return {}
+
+    # A medicine alone could match any number of tags; resolve them first so
+    # the limit below bounds every request, not only those naming MACs
+    resolved = macs is None
+    if resolved:
+        macs = db.query_medicine_macs(medicine, hours)
+        if not macs:
+            return {}
+
+    if len(macs) > settings.BATCH_QUERY_MAX_TAGS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_QUERY_MAX_TAGS} tags per request, got {len(macs)}"
+        )
+
+    try:
+        histories = db.query_histories(macs=macs, medicine=medicine, hours=hours)
+    except Exception as e:
+        logger.error(f"Error querying histories of {len(macs)} tags: {e}")
+        raise HTTPException(status_code=500, detail="Failed to query medicine histories")
+
+    if resolved:
+        # As before resolving, report only the tags that have records
+        histories = {m: records for m, records in histories.items() if records}
+    return histories
+
+
 @app.get("/api/alerts")
 async def get_alerts(
     hours: int = 24,
@@ -292,7 +485,7 @@ async def get_alerts(
     Raises:
         HTTPException: If database is not available or query fails.
     """
-    if db is None:
+    if db is None or not db.is_ready:
         raise HTTPException(status_code=503, detail="Database not available")
 
     if hours < 1 or hours > 168:
@@ -312,6 +505,204 @@ async def get_alerts(
         raise HTTPException(status_code=500, detail="Failed to query alerts")
 
 
+@app.get("/api/export/{measurement}")
+async def export_measurement(
+    measurement: str,
+    start: datetime,
+    stop: datetime,
+    fmt: str = Query("parquet", alias="format"),
+    chunk_minutes: Optional[int] = None
+) -> StreamingResponse:
+    """Stream a measurement's history as Parquet or an Arrow IPC stream.
+
+    Storage is read in chunk_minutes slices and the file is sent one
+    record batch at a time, so any range can be exported without holding
+    it in memory. MAC, receiver, medicine and alert type/severity columns
+    are dictionary-encoded.
+
+    Args:
+        measurement: "medicine_status", "medicine_position" or "alerts".
+        start: Inclusive start time (ISO 8601, UTC if no offset).
+        stop: Exclusive end time.
+        fmt: "parquet" (default) or "arrow", passed as format.
+        chunk_minutes: Minutes of history per storage query
+            (default: EXPORT_CHUNK_MINUTES).
+
+    Returns:
+        Streaming file download.
+
+    Raises:
+        HTTPException: If database or pyarrow is not available, or the
+            measurement, format or range is invalid.
+    """
+    if db is None or not db.is_ready:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    if measurement not in export.MEASUREMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Measurement must be one of: {', '.join(export.MEASUREMENTS)}"
+        )
+    if fmt not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(export.FORMATS)}")
+
+    start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    stop = stop if stop.tzinfo else stop.replace(tzinfo=timezone.utc)
+    if stop <= start:
+        raise HTTPException(status_code=400, detail="stop must be after start")
+    chunk_minutes = chunk_minutes or settings.EXPORT_CHUNK_MINUTES
+    if chunk_minutes < 1:
+        raise HTTPException(status_code=400, detail="chunk_minutes must be positive")
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Export needs pyarrow, which is not installed")
+
+    suffix = "parquet" if fmt == "parquet" else "arrows"
+    filename = f"{measurement}_{start:%Y%m%dT%H%M%S}_{stop:%Y%m%dT%H%M%S}.{suffix}"
+    return StreamingResponse(
+        export.stream(
+            db, measurement, start, stop, fmt,
+            chunk=timedelta(minutes=chunk_minutes),
+            batch_rows=settings.EXPORT_BATCH_ROWS
+        ),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/receivers")
+async def get_receivers() -> Dict[str, Any]:
+    """Get the registered receivers and the registry version.
+
+    Returns:
+        Dict with version, source, and receivers (id, index, x, y, z, floor).
+
+    Raises:
+        HTTPException: If the registry is not loaded.
+    """
+    if receiver_registry is None:
+        raise HTTPException(status_code=503, detail="Receiver registry not available")
+    return receiver_registry.geometry.to_dict()
+
+
+@app.post("/api/receivers/reload")
+async def reload_receivers() -> Dict[str, Any]:
+    """Reload receivers from the database without restarting.
+
+    Returns:
+        Dict with whether anything changed and the current version.
+
+    Raises:
+        HTTPException: If the registry is not loaded or the reload fails.
+    """
+    if receiver_registry is None:
+        raise HTTPException(status_code=503, detail="Receiver registry not available")
+    try:
+        changed = receiver_registry.reload()
+    except Exception as e:
+        logger.error(f"Error reloading receivers: {e}")
+        raise HTTPException(status_code=500, detail="Failed to reload receivers")
+    return {"changed": changed, "version": receiver_registry.version}
+
+
+@app.get("/api/latency")
+async def get_latency() -> Dict[str, Any]:
+    """Get end-to-end latency histograms and receiver clock/health.
+
+    Returns:
+        Dict with per-hop histograms (radio_to_publish, publish_to_backend,
+        backend_to_stored, backend_to_fix) and per-receiver skew, lag and
+        exclusion state.
+
+    Raises:
+        HTTPException: If tracker is not available.
+    """
+    if medicine_tracker is None:
+        raise HTTPException(status_code=503, detail="Tracker not available")
+    return medicine_tracker.latency.stats()
+
+
+@app.get("/api/loss")
+async def get_loss(mac: Optional[str] = None, receiver_id: Optional[str] = None) -> Dict[str, Any]:
+    """Get advertisement loss, duplicates and reordering from sequence numbers.
+
+    Args:
+        mac: Only include this tag.
+        receiver_id: Only include this receiver.
+
+    Returns:
+        Dict with per-receiver totals, per-tag reception (including how many
+        receivers hear each advertisement) and per-link counters with
+        lifetime and rolling reception ratios.
+
+    Raises:
+        HTTPException: If tracker is not available.
+    """
+    if medicine_tracker is None:
+        raise HTTPException(status_code=503, detail="Tracker not available")
+    return medicine_tracker.loss.stats(mac=mac, receiver_id=receiver_id)
+
+
+@app.get("/api/logging")
+async def get_logging() -> Dict[str, Any]:
+    """Get the log level, log queue state and per-category sampling counters.
+
+    Returns:
+        Dict with the root level, queue depth, dropped records and, per
+        hot-path category, its sampling settings and counters.
+    """
+    return logging_stats()
+
+
+@app.put("/api/logging/level")
+async def put_logging_level(level: str, logger_name: Optional[str] = None) -> Dict[str, Any]:
+    """Change a log level at runtime.
+
+    Args:
+        level: DEBUG, INFO, WARNING, ERROR or CRITICAL.
+        logger_name: Logger to change (e.g. "mqtt_handler", "hotpath.payload");
+            the root logger if omitted.
+
+    Returns:
+        Dict with the logger and its new level.
+
+    Raises:
+        HTTPException: If the level is invalid.
+    """
+    try:
+        level = set_level(level, logger_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.warning(f"Log level of {logger_name or 'root'} set to {level}")
+    return {"logger": logger_name or "root", "level": level}
+
+
+@app.put("/api/logging/sampling/{name}")
+async def put_logging_sampling(
+    name: str,
+    every: Optional[int] = None,
+    per_second: Optional[float] = None
+) -> Dict[str, Any]:
+    """Change the sampling of a hot-path log category at runtime.
+
+    Args:
+        name: Category (payload, scan_write, db_write, trilateration).
+        every: Keep one record in every this many.
+        per_second: Maximum records per second (0 = no limit).
+
+    Returns:
+        Dict with the category's settings and counters.
+
+    Raises:
+        HTTPException: If every is below 1 or per_second is negative.
+    """
+    if (every is not None and every < 1) or (per_second is not None and per_second < 0):
+        raise HTTPException(status_code=400, detail="every must be >= 1 and per_second >= 0")
+    return set_sampling(name, every=every, per_second=per_second).stats()
+
+
 @app.get("/api/status")
 async def get_status() -> Dict[str, Any]:
     """Get system status and buffer statistics.
@@ -327,11 +718,18 @@ async def get_status() -> Dict[str, Any]:
 
     try:
         buffer_stats = medicine_tracker.get_buffer_stats()
-        return {
+        status = {
             "status": "running",
             "buffer": buffer_stats,
             "mqtt_connected": mqtt_client.is_connected() if mqtt_client else False
         }
+        if mqtt_runner is not None:
+            status["mqtt"] = mqtt_runner.stats()
+        if db is not None and hasattr(db, "get_hot_stats"):
+            status["hot_tier"] = db.get_hot_stats()
+        if db is not None and hasattr(db, "get_persistence_stats"):
+            status["persistence"] = db.get_persistence_stats()
+        return status
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         raise HTTPException(status_code=500, detail="Failed to get status")
@@ -6,17 +6,33 @@ from BLE receivers, managing RSSI buffers, and triggering position calculations.
 
 import json
 import logging
+import re
 import threading
 import time
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Any, Callable, Dict, Optional, Tuple
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from admission import CRITICAL, TELEMETRY, TRACKING, AdmissionQueue
 from config import settings
 from database import Database
+from floor_shards import FloorShards, assign_floor
+from hot_logging import category
+from latency import LatencyTracker
+from loss_accounting import LossAccounting
+from observation_windows import ObservationWindows
+from position_scheduler import DirtyTags, DirtyTagScheduler
+from receivers import ReceiverRegistry
+from topic_router import TopicRouter
 from trilaterate import rssi_to_distance, trilaterate_weighted, calculate_position_error
 
 logger = logging.getLogger(__name__)
+# Per-message log lines, sampled and rate limited (see hot_logging)
+payload_log = category("payload")
+scan_log = category("scan_write")
+
+# Payloads reporting movement are admitted ahead of other scans
+_MOVING = re.compile(rb'"moving"\s*:\s*true')
 
 
 class MedicineTracker:
@@ -27,11 +43,16 @@ class MedicineTracker:
     movement detection.
     """
 
-    def __init__(self, database: Database) -> None:
+    def __init__(
+        self,
+        database: Database,
+        receivers: Optional[ReceiverRegistry] = None
+    ) -> None:
         """Initialize the medicine tracker.
 
         Args:
             database: Database instance for storing data.
+            receivers: Receiver registry (defaults to one built from settings).
         """
         self.db = database
         self.settings = settings
@@ -40,8 +61,9 @@ class MedicineTracker:
         self._buffer: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
         self._buffer_lock = threading.RLock()
 
-        # Deduplication: {mac: last_sequence_number}
-        self._last_seq: Dict[str, int] = {}
+        # Deduplication per receiver: {(mac, receiver_id): last_sequence_number}.
+        # Other receivers' copies of the same advertisement are not duplicates.
+        self._last_seq: Dict[Tuple[str, str], int] = {}
         self._seq_lock = threading.Lock()
 
         # Position calculation throttling: {mac: last_calculation_timestamp}
@@ -49,24 +71,114 @@ class MedicineTracker:
         self._calc_lock = threading.Lock()
 
         # Receiver positions for trilateration
-        self._receiver_positions = self.settings.receiver_coordinates
+        self.receivers = receivers or ReceiverRegistry.from_settings(self.settings)
+        self._geometry_version = self.receivers.version
+
+        # Per-hop latency histograms, receiver clock skew and health
+        self.latency = LatencyTracker(
+            dead_after_seconds=self.settings.RECEIVER_DEAD_SECONDS,
+            max_lag_seconds=self.settings.RECEIVER_MAX_LAG_SECONDS
+        )
+
+        # Sequence gaps, duplicates and reordering per (tag, receiver)
+        self.loss = LossAccounting(
+            window=self.settings.LOSS_WINDOW,
+            idle_seconds=self.settings.LOSS_IDLE_SECONDS
+        )
+        self._last_loss_summary = time.monotonic()
+
+        # Per-floor solve workers; tag -> floor it was last assigned to
+        self._shards: Optional[FloorShards] = None
+        self._tag_floor: Dict[str, int] = {}
+
+        # Readings grouped per (mac, sequence_number), solved once per group
+        self._windows: Optional[ObservationWindows] = None
+
+        # Dirty tags solved together every POSITION_CALCULATION_INTERVAL
+        self._scheduler: Optional[DirtyTagScheduler] = None
+
+        # Bounded priority queue between the MQTT thread and processing
+        self._admission: Optional[AdmissionQueue] = None
+
+        # Optional RSSI fingerprint index, tried before trilateration
+        self._fingerprints = None
+        if self.settings.LOCALIZATION_MODE == "fingerprint":
+            self._fingerprints = self._load_fingerprints()
+
+        # Topic family -> handler; topics matching no route are counted and dropped
+        self.router = self._build_router()
+        self._unrouted = 0
+
+        # Messages held until storage is ready: (topic, payload, received_at)
+        self._pending: deque = deque(maxlen=self.settings.STARTUP_BUFFER_SIZE)
+        self._pending_lock = threading.Lock()
+        self._pending_dropped = 0
+        self._storage_ready = False
+        self._replaying = False
 
         # Start cleanup thread
         self._cleanup_thread: Optional[threading.Thread] = None
         self._cleanup_running = False
 
+    def _load_fingerprints(self):
+        """Load the fingerprint index, or None to fall back to trilateration."""
+        try:
+            from fingerprint import FingerprintIndex
+            index = FingerprintIndex.from_db(
+                self.settings.FINGERPRINT_DB_PATH,
+                k=self.settings.FINGERPRINT_K
+            )
+        except Exception as e:
+            logger.error(f"Failed to load fingerprints, using trilateration only: {e}")
+            return None
+        if not len(index):
+            logger.warning(f"No fingerprints in {self.settings.FINGERPRINT_DB_PATH}, using trilateration only")
+            return None
+        return index
+
     def start(self) -> None:
-        """Start background cleanup thread."""
+        """Start background cleanup thread (and the batch scheduler, floor shards,
+        alignment windows and admission queue if enabled)."""
+        if self.settings.BATCH_POSITION_SCHEDULER:
+            self._scheduler = DirtyTagScheduler(
+                self._solve_dirty, self.settings.position_calculation_interval
+            )
+            self._scheduler.start()
+        if self.settings.SHARD_BY_FLOOR:
+            self._shards = FloorShards(self._solve_on_floor, self.settings.FLOOR_SHARD_MAX_PENDING)
+        if self.settings.ALIGN_BY_SEQUENCE:
+            self._windows = ObservationWindows(
+                self._schedule,
+                window_seconds=self.settings.ALIGNMENT_WINDOW_SECONDS
+            )
+            self._windows.start()
+        if self.settings.ADMISSION_QUEUE_SIZE > 0:
+            self._admission = AdmissionQueue(
+                self.settings.ADMISSION_QUEUE_SIZE,
+                shed_telemetry_at=self.settings.ADMISSION_SHED_TELEMETRY_AT,
+                shed_tracking_at=self.settings.ADMISSION_SHED_TRACKING_AT,
+                recover_ratio=self.settings.ADMISSION_RECOVER_RATIO
+            )
+            self._admission.start()
         self._cleanup_running = True
         self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self._cleanup_thread.start()
         logger.info("MedicineTracker cleanup thread started")
 
     def stop(self) -> None:
-        """Stop background cleanup thread."""
+        """Stop background cleanup thread, admission queue, alignment windows,
+        scheduler and floor shards."""
         self._cleanup_running = False
         if self._cleanup_thread and self._cleanup_thread.is_alive():
             self._cleanup_thread.join(timeout=5.0)
+        if self._admission:
+            self._admission.stop()
+        if self._windows:
+            self._windows.stop()
+        if self._scheduler:
+            self._scheduler.stop()
+        if self._shards:
+            self._shards.stop()
         logger.info("MedicineTracker cleanup thread stopped")
 
     def _cleanup_loop(self) -> None:
@@ -74,12 +186,45 @@ class MedicineTracker:
         while self._cleanup_running:
             try:
                 self._cleanup_old_data()
+                self._write_loss_summary()
                 time.sleep(5.0)  # Check every 5 seconds
             except Exception as e:
                 logger.error(f"Error in cleanup loop: {e}")
 
+    def _check_geometry(self) -> None:
+        """Drop buffered readings from receivers removed by a registry reload."""
+        geometry = self.receivers.geometry
+        if geometry.version == self._geometry_version:
+            return
+
+        removed = 0
+        with self._buffer_lock:
+            for mac in list(self._buffer.keys()):
+                for receiver_id in list(self._buffer[mac].keys()):
+                    if receiver_id not in geometry.index:
+                        del self._buffer[mac][receiver_id]
+                        removed += 1
+                if not self._buffer[mac]:
+                    del self._buffer[mac]
+        # Recompute positions (and floor assignments) against the new geometry right away
+        with self._calc_lock:
+            self._last_position_calc.clear()
+        self._tag_floor.clear()
+
+        logger.info(
+            f"Receiver geometry v{self._geometry_version} -> v{geometry.version}, "
+            f"dropped {removed} readings from removed receivers"
+        )
+        self._geometry_version = geometry.version
+
     def _cleanup_old_data(self) -> None:
         """Remove buffer entries older than the timeout threshold."""
+        self._check_geometry()
+
+        excluded = self.latency.excluded
+        if excluded != self.latency.refresh():
+            logger.warning(f"Receivers excluded from solving: {sorted(self.latency.excluded) or 'none'}")
+
         cutoff_time = datetime.utcnow() - timedelta(
             seconds=self.settings.buffer_timeout_seconds
         )
@@ -96,10 +241,43 @@ class MedicineTracker:
                 # Remove empty MAC entries
                 if not self._buffer[mac]:
                     del self._buffer[mac]
+                    if self._windows is not None:
+                        self._windows.forget(mac)
 
         if removed_count > 0:
             logger.debug(f"Cleaned up {removed_count} stale buffer entries")
 
+    def _write_loss_summary(self) -> None:
+        """Store per-link loss counters every LOSS_SUMMARY_INTERVAL_SECONDS."""
+        interval = self.settings.LOSS_SUMMARY_INTERVAL_SECONDS
+        if interval <= 0 or time.monotonic() - self._last_loss_summary < interval:
+            return
+        self._last_loss_summary = time.monotonic()
+
+        self.loss.evict_idle()
+        # Until storage is up, deltas keep accumulating for the next summary
+        if not self.db.is_ready:
+            return
+        rows = self.loss.summary()
+        if rows:
+            self.db.write_link_stats(rows)
+
+    def _build_router(self) -> TopicRouter:
+        """Compile the topic families receivers publish on.
+
+        Returns:
+            TopicRouter: Router dispatching to this tracker's handlers.
+        """
+        router = TopicRouter()
+        router.add("hospital/medicine/scan/+", "scan", self._handle_scan)
+        router.add("hospital/medicine/rssi_only/+", "rssi_only", self._handle_rssi_only)
+        router.add("hospital/medicine/rssi/+/+", "rssi", self._handle_fused)
+        # Heartbeats only feed latency tracing and don't need storage
+        router.add("hospital/system/+_status/+", "status", self._handle_heartbeat, needs_storage=False)
+        # Legacy topic format: medical/{receiver_id}/status
+        router.add("medical/+/status", "legacy_scan", self._handle_scan)
+        return router
+
     def on_message(
         self,
         client: Any,
@@ -108,103 +286,440 @@ class MedicineTracker:
     ) -> None:
         """MQTT message callback handler.
 
-        Processes incoming MQTT messages from BLE receivers, performs
-        deduplication, stores scan data, and triggers position calculation
-        when sufficient data is available.
+        Routes each message to the handler for its topic family. Handlers
+        that need storage are held back until it is ready and replayed by
+        on_storage_ready(). With admission control on, they are then queued
+        by priority instead of run on the MQTT network thread, so a slow
+        database cannot stall keepalives.
 
         Args:
             client: MQTT client instance.
             userdata: User data passed to callback.
             message: MQTT message object with topic and payload attributes.
         """
+        received_at = datetime.utcnow()
+
+        matched = self.router.match(message.topic)
+        if matched is None:
+            self._unrouted += 1
+            logger.debug(f"No route for topic {message.topic}")
+            return
+        route, params = matched
+
+        # An exception escaping this callback would end paho's network loop
         try:
-            # Parse topic to extract receiver_id
-            # Topic format: medical/{receiver_id}/status
-            topic_parts = message.topic.split("/")
-            if len(topic_parts) < 3:
-                logger.warning(f"Unexpected topic format: {message.topic}")
+            if route.needs_storage:
+                with self._pending_lock:
+                    if not self._storage_ready:
+                        if len(self._pending) == self._pending.maxlen:
+                            self._pending_dropped += 1
+                        self._pending.append((message.topic, message.payload, received_at))
+                        return
+                self._dispatch(route, params, message.payload, received_at)
                 return
 
-            receiver_id = topic_parts[1]
+            route.handler(params, message.payload, received_at)
+        except Exception:
+            logger.exception(f"Error processing MQTT message on {message.topic}")
+
+    def _dispatch(self, route: Any, params: Tuple[str, ...], payload: bytes, received_at: datetime) -> None:
+        """Run a storage-bound handler, through the admission queue when enabled."""
+        if self._admission is not None:
+            priority = CRITICAL if _MOVING.search(payload) else TRACKING
+            self._admission.offer(priority, route.handler, params, payload, received_at)
+            return
+        route.handler(params, payload, received_at)
+
+    def on_storage_ready(self) -> None:
+        """Replay buffered messages once storage is connected.
+
+        The buffer is swapped out under the pending lock and replayed
+        without it, so on_message never waits on storage writes. Messages
+        arriving meanwhile keep being buffered behind the backlog and are
+        replayed in the next round; storage is marked ready only once a
+        round finds the buffer empty, so older sequence numbers are never
+        overtaken by live ones and discarded as duplicates.
+        """
+        replayed = 0
+        while True:
+            with self._pending_lock:
+                if not self._pending:
+                    self._storage_ready = True
+                    self._replaying = False
+                    break
+                backlog = self._pending
+                self._pending = deque(maxlen=self.settings.STARTUP_BUFFER_SIZE)
+                self._replaying = True
+            for topic, payload, received_at in backlog:
+                route, params = self.router.match(topic)
+                try:
+                    self._dispatch(route, params, payload, received_at)
+                except Exception as e:
+                    logger.error(f"Failed to replay buffered message on {topic}: {e}")
+            replayed += len(backlog)
+
+        logger.info(
+            f"Storage ready, replayed {replayed} buffered messages "
+            f"({self._pending_dropped} dropped while waiting)"
+        )
+
+    def _decode(self, route: str, raw_payload: bytes) -> Optional[Dict[str, Any]]:
+        """Decode a JSON object payload, or None if it isn't one.
+
+        Args:
+            route: Route name, for the log message.
+            raw_payload: Raw message payload bytes.
+        """
+        try:
+            payload = json.loads(raw_payload.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to decode {route} payload: {e}")
+            return None
+        if not isinstance(payload, dict):
+            logger.warning(f"Ignoring non-object {route} payload")
+            return None
+        return payload
+
+    def _handle_heartbeat(
+        self,
+        params: Tuple[str, ...],
+        raw_payload: bytes,
+        received_at: datetime
+    ) -> None:
+        """Feed a receiver heartbeat (hospital/system/{kind}_status/{id}) into latency tracing.
+
+        Args:
+            params: (kind, receiver_id) from the topic.
+            raw_payload: Raw message payload bytes.
+            received_at: Time the message reached the backend.
+        """
+        payload = self._decode("status", raw_payload)
+        if payload is None:
+            return
+
+        receiver_id = payload.get("receiver_id") or payload.get("device_id") or params[-1]
+        if not isinstance(receiver_id, str):
+            logger.warning(f"Ignoring heartbeat on {params[-1]}: receiver_id is not a string")
+            return
+        # Unparseable strings are counted by the tracker; other types are malformed
+        timestamp = payload.get("timestamp")
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (str, int, float, type(None))):
+            logger.warning(f"Ignoring heartbeat from {receiver_id}: timestamp is not a number or string")
+            return
+        self.latency.on_heartbeat(
+            receiver_id, payload, received_at.replace(tzinfo=timezone.utc).timestamp()
+        )
+
+    def _handle_scan(
+        self,
+        params: Tuple[str, ...],
+        raw_payload: bytes,
+        received_at: datetime
+    ) -> None:
+        """Process a full scan message (hospital/medicine/scan/{receiver_id}).
+
+        Args:
+            params: (receiver_id,) from the topic.
+            raw_payload: Raw message payload bytes.
+            received_at: Time the message reached the backend.
+        """
+        payload = self._decode("scan", raw_payload)
+        if payload is None:
+            return
+        payload_log.info("RAW PAYLOAD: %s", payload)
+
+        # Receivers name themselves in the payload; the topic level is the fallback
+        receiver_id = payload.get("receiver_id") or params[0]
+
+        # Batched receivers (Pico) send {"scans": [...]} with a per-scan
+        # observation timestamp; others send one scan with observed_at
+        received_epoch = received_at.replace(tzinfo=timezone.utc).timestamp()
+        batched = payload.get("scans")
+        if batched is not None and not isinstance(batched, list):
+            logger.warning(f"Ignoring scan batch from {receiver_id}: 'scans' is not a list")
+            return
+        for scan in batched or [payload]:
+            if not isinstance(scan, dict):
+                logger.warning(f"Ignoring non-object scan in batch from {receiver_id}")
+                continue
+            try:
+                self.latency.on_scan(
+                    receiver_id,
+                    sent_at=payload.get("timestamp"),
+                    observed_at=scan.get("timestamp") if batched else scan.get("observed_at"),
+                    received_at=received_epoch
+                )
+                self._process_scan(receiver_id, scan, received_at)
+            except Exception as e:
+                logger.error(f"Error processing scan from {receiver_id}: {e}")
+
+    def _handle_rssi_only(
+        self,
+        params: Tuple[str, ...],
+        raw_payload: bytes,
+        received_at: datetime
+    ) -> None:
+        """Fast path for RSSI-only readings (hospital/medicine/rssi_only/{mac}).
+
+        These carry no telemetry, so only the reading is stored and buffered;
+        no temperature, battery or movement handling runs.
+
+        Args:
+            params: (mac,) from the topic.
+            raw_payload: Raw message payload bytes.
+            received_at: Time the message reached the backend.
+        """
+        payload = self._decode("rssi_only", raw_payload)
+        if payload is None:
+            return
+
+        receiver_id = payload.get("receiver_id")
+        mac = payload.get("mac") or params[0]
+        rssi = payload.get("rssi")
+        if not receiver_id or rssi is None:
+            logger.warning(f"Missing receiver_id or rssi in RSSI-only message for {mac}")
+            return
+        if not isinstance(receiver_id, str):
+            logger.warning(f"Ignoring RSSI-only message for {mac}: receiver_id is not a string")
+            return
+
+        try:
+            self.latency.on_scan(
+                receiver_id,
+                sent_at=payload.get("timestamp"),
+                observed_at=payload.get("observed_at"),
+                received_at=received_at.replace(tzinfo=timezone.utc).timestamp()
+            )
+            self._ingest_reading(
+                receiver_id,
+                mac,
+                rssi,
+                payload.get("sequence_number") or payload.get("seq"),
+                payload.get("medicine") or self._buffered_medicine(mac),
+                received_at
+            )
+        except Exception as e:
+            logger.error(f"Error processing RSSI-only reading from {receiver_id}: {e}")
+
+    def _handle_fused(
+        self,
+        params: Tuple[str, ...],
+        raw_payload: bytes,
+        received_at: datetime
+    ) -> None:
+        """Process coordinator-fused readings (hospital/medicine/rssi/fused/{mac}).
+
+        One message carries every receiver's RSSI for an advertisement in
+        "readings"; each is ingested as that receiver's scan. Timestamps are
+        the coordinator's, so no per-receiver latency is recorded.
+
+        Args:
+            params: (kind, mac) from the topic.
+            raw_payload: Raw message payload bytes.
+            received_at: Time the message reached the backend.
+        """
+        payload = self._decode("rssi", raw_payload)
+        if payload is None:
+            return
+
+        mac = payload.get("mac") or params[1]
+        seq = payload.get("sequence_number") or payload.get("seq")
+        medicine = payload.get("medicine", "unknown")
+        readings = payload.get("readings") or []
+        if not isinstance(readings, list):
+            logger.warning(f"Ignoring fused message for {mac}: 'readings' is not a list")
+            return
+        for reading in readings:
+            if not isinstance(reading, dict):
+                continue
+            receiver_id = reading.get("receiver_id")
+            if not receiver_id or reading.get("rssi") is None:
+                continue
+            try:
+                self._ingest_reading(
+                    receiver_id,
+                    mac,
+                    reading["rssi"],
+                    seq,
+                    medicine,
+                    received_at,
+                    temperature=payload.get("temperature"),
+                    battery=payload.get("battery")
+                )
+            except Exception as e:
+                logger.error(f"Error processing fused reading from {receiver_id}: {e}")
 
-            # Parse JSON payload
-            payload = json.loads(message.payload.decode("utf-8"))
-            logger.info(f"RAW PAYLOAD: {payload}")  # Debug: see actual data
+    def _buffered_medicine(self, mac: str) -> str:
+        """Medicine name last reported for a tag by any receiver."""
+        with self._buffer_lock:
+            for data in self._buffer.get(mac, {}).values():
+                return data["medicine"]
+        return "unknown"
 
+    def _process_scan(
+        self,
+        receiver_id: str,
+        payload: Dict[str, Any],
+        received_at: datetime
+    ) -> None:
+        """Process a single scan reported by a receiver.
+
+        Args:
+            receiver_id: ID of the receiver that reported the scan.
+            payload: Decoded scan fields (mac, rssi, sequence_number, ...).
+            received_at: Time the message reached the backend.
+        """
+        try:
             # Extract required fields
             mac = payload.get("mac")
             rssi = payload.get("rssi")
-            seq = payload.get("sequence_number") or payload.get("seq")
-            medicine = payload.get("medicine", "unknown")
 
             if not mac or rssi is None:
                 logger.warning(f"Missing required fields in message: {payload}")
                 return
 
-            # Deduplication check
-            if not self._check_sequence(mac, seq):
-                logger.debug(f"Duplicate message dropped for {mac}")
-                return
-
-            # Extract optional fields
-            temperature = payload.get("temperature")
-            battery = payload.get("battery")
-            moving = payload.get("moving", False)
-
-            # Calculate distance from RSSI using hardcoded values
-            distance = rssi_to_distance(
+            self._ingest_reading(
+                receiver_id,
+                mac,
                 rssi,
-                self.settings.rssi_reference,
-                self.settings.path_loss_exponent
+                payload.get("sequence_number") or payload.get("seq"),
+                payload.get("medicine", "unknown"),
+                received_at,
+                temperature=payload.get("temperature"),
+                battery=payload.get("battery"),
+                moving=payload.get("moving", False)
             )
 
-            logger.debug(
-                f"Received from {receiver_id}: {mac} @ {rssi}dBm -> {distance:.2f}m, "
-                f"medicine={medicine}, moving={moving}"
-            )
+        except Exception as e:
+            logger.error(f"Error processing scan from {receiver_id}: {e}")
 
-            # Store raw scan data in database (with calculated distance)
-            logger.info(f"WRITING TO DB: distance={distance:.2f}m, temp={temperature}, batt={battery}, moving={moving}, seq={seq}")
-            self.db.write_scan(
-                mac=mac,
-                receiver_id=receiver_id,
-                distance=distance,
-                medicine=medicine,
-                temperature=temperature,
-                battery=battery,
-                moving=moving,
-                sequence_number=seq
-            )
+    def _ingest_reading(
+        self,
+        receiver_id: str,
+        mac: str,
+        rssi: int,
+        seq: Optional[int],
+        medicine: str,
+        received_at: datetime,
+        temperature: Optional[float] = None,
+        battery: Optional[int] = None,
+        moving: bool = False
+    ) -> None:
+        """Deduplicate, store, and buffer one reading, then solve if due.
 
-            # Update buffer
-            self._update_buffer(
-                mac=mac,
-                receiver_id=receiver_id,
-                distance=distance,
-                medicine=medicine,
-                temperature=temperature,
-                battery=battery,
-                moving=moving
+        Args:
+            receiver_id: ID of the receiver that heard the tag.
+            mac: MAC address of the beacon.
+            rssi: Received signal strength in dBm.
+            seq: Advertisement sequence number, if any.
+            medicine: Medicine name/type.
+            received_at: Time the message reached the backend.
+            temperature: Optional temperature reading.
+            battery: Optional battery level.
+            moving: Whether the medicine is moving.
+        """
+        if seq is not None:
+            self.loss.observe(mac, receiver_id, seq)
+
+        # Deduplication check
+        if not self._check_sequence(mac, seq, receiver_id):
+            logger.debug("Duplicate message dropped for %s", mac)
+            return
+
+        # Calculate distance from RSSI using hardcoded values
+        distance = rssi_to_distance(
+            rssi,
+            self.settings.rssi_reference,
+            self.settings.path_loss_exponent
+        )
+
+        scan_log.debug(
+            "Received from %s: %s @ %sdBm -> %.2fm, medicine=%s, moving=%s",
+            receiver_id, mac, rssi, distance, medicine, moving
+        )
+
+        # Store raw scan data in database (with calculated distance); under
+        # admission control this is the first work shed under load
+        scan_log.info(
+            "WRITING TO DB: distance=%.2fm, temp=%s, batt=%s, moving=%s, seq=%s",
+            distance, temperature, battery, moving, seq
+        )
+        if self._admission is not None:
+            self._admission.offer(
+                TELEMETRY, self._store_scan, receiver_id, mac, distance, seq, medicine,
+                received_at, temperature, battery, moving
+            )
+        else:
+            self._store_scan(
+                receiver_id, mac, distance, seq, medicine, received_at, temperature, battery, moving
             )
 
-            # Handle movement detection
-            if moving:
-                self._handle_movement(mac, medicine, receiver_id)
+        # Update buffer
+        reading = self._update_buffer(
+            mac=mac,
+            receiver_id=receiver_id,
+            distance=distance,
+            rssi=rssi,
+            medicine=medicine,
+            temperature=temperature,
+            battery=battery,
+            moving=moving,
+            ts=received_at
+        )
 
+        # Handle movement detection
+        if moving:
+            self._handle_movement(mac, medicine, receiver_id)
+
+        if seq is not None and self._windows is not None:
+            # Solve once all receivers have reported this advertisement
+            if receiver_id not in self.latency.excluded:
+                self._windows.add(
+                    mac, seq, medicine, receiver_id, reading,
+                    expected=self._expected_receivers(mac)
+                )
+        else:
             # Try to calculate position
-            self._try_calculate_position(mac, medicine)
+            self._schedule(mac, medicine)
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON payload: {e}")
-        except Exception as e:
-            logger.error(f"Error processing MQTT message: {e}")
+    def _store_scan(
+        self,
+        receiver_id: str,
+        mac: str,
+        distance: float,
+        seq: Optional[int],
+        medicine: str,
+        received_at: datetime,
+        temperature: Optional[float],
+        battery: Optional[int],
+        moving: bool
+    ) -> None:
+        """Write one raw scan to storage and record its storage latency."""
+        self.db.write_scan(
+            mac=mac,
+            receiver_id=receiver_id,
+            distance=distance,
+            medicine=medicine,
+            temperature=temperature,
+            battery=battery,
+            moving=moving,
+            sequence_number=seq,
+            timestamp=received_at
+        )
+        self.latency.record(
+            "backend_to_stored", (datetime.utcnow() - received_at).total_seconds()
+        )
 
-    def _check_sequence(self, mac: str, seq: Optional[int]) -> bool:
+    def _check_sequence(self, mac: str, seq: Optional[int], receiver_id: str) -> bool:
         """Check if message is new based on sequence number.
 
+        Sequence numbers are tracked per receiver, so each receiver's reading
+        of an advertisement is kept for alignment.
+
         Args:
             mac: MAC address of the beacon.
             seq: Sequence number from the message.
+            receiver_id: ID of the receiver that reported it.
 
         Returns:
             bool: True if message should be processed, False if duplicate.
@@ -213,21 +728,33 @@ class MedicineTracker:
             # No sequence number, allow through
             return True
 
+        key = (mac, receiver_id)
         with self._seq_lock:
-            last_seq = self._last_seq.get(mac)
+            last_seq = self._last_seq.get(key)
             if last_seq is not None and seq <= last_seq:
                 # Check if it's a wraparound (seq reset to 0)
                 # If last was 90+ and new is 0-10, it's a reset, not duplicate
                 if last_seq > 90 and seq <= 10:
                     logger.debug(f"Sequence reset detected for {mac}: {last_seq} -> {seq}")
-                    self._last_seq[mac] = seq
+                    self._last_seq[key] = seq
                     return True
                 if last_seq - seq <= 100:  # Not a wraparound (within 100)
-                    logger.debug(f"Duplicate sequence detected for {mac}: {seq} <= {last_seq}")
+                    logger.debug("Duplicate sequence detected for %s: %s <= %s", mac, seq, last_seq)
                     return False
-            self._last_seq[mac] = seq
+            self._last_seq[key] = seq
             return True
 
+    def _expected_receivers(self, mac: str) -> int:
+        """Healthy receivers that heard the tag within the buffer timeout.
+
+        At least two, the fewest a solve can use, so a tag's first
+        advertisement waits for a second receiver instead of closing alone.
+        """
+        excluded = self.latency.excluded
+        with self._buffer_lock:
+            heard = sum(1 for receiver_id in self._buffer.get(mac, ()) if receiver_id not in excluded)
+        return max(heard, 2)
+
     def _update_buffer(
         self,
         mac: str,
@@ -236,8 +763,10 @@ class MedicineTracker:
         medicine: str,
         temperature: Optional[float] = None,
         battery: Optional[int] = None,
-        moving: bool = False
-    ) -> None:
+        moving: bool = False,
+        ts: Optional[datetime] = None,
+        rssi: Optional[int] = None
+    ) -> Dict[str, Any]:
         """Update the distance buffer with new data.
 
         Args:
@@ -248,16 +777,23 @@ class MedicineTracker:
             temperature: Optional temperature reading.
             battery: Optional battery level.
             moving: Whether the medicine is moving.
+            ts: When the reading was received (defaults to now).
+            rssi: Raw RSSI, used for fingerprint lookups.
+
+        Returns:
+            Dict: The buffered reading.
         """
         with self._buffer_lock:
-            self._buffer[mac][receiver_id] = {
+            entry = self._buffer[mac][receiver_id] = {
                 "distance": distance,
-                "ts": datetime.utcnow(),
+                "rssi": rssi,
+                "ts": ts or datetime.utcnow(),
                 "medicine": medicine,
                 "temperature": temperature,
                 "battery": battery,
                 "moving": moving
             }
+        return entry
 
     def _handle_movement(
         self,
@@ -283,15 +819,41 @@ class MedicineTracker:
             metadata={"receiver_id": receiver_id}
         )
 
-    def _try_calculate_position(self, mac: str, medicine: str) -> None:
+    def _schedule(
+        self,
+        mac: str,
+        medicine: str,
+        readings: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> None:
+        """Queue a tag for solving: mark it dirty, or try right away without the scheduler.
+
+        Args:
+            mac: MAC address of the medicine.
+            medicine: Medicine name/type.
+            readings: Aligned readings of one advertisement, or None to use
+                the latest buffered reading per receiver.
+        """
+        if self._scheduler is not None:
+            self._scheduler.mark(mac, medicine, readings)
+        else:
+            self._try_calculate_position(mac, medicine, readings)
+
+    def _try_calculate_position(
+        self,
+        mac: str,
+        medicine: str,
+        readings: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> None:
         """Attempt to calculate position when sufficient receivers are available.
 
-        Position calculation is throttled to avoid excessive calculations.
-        Requires at least 2 receivers for weighted centroid calculation.
+        Used per message when the batch scheduler is off. Position
+        calculation is throttled to avoid excessive calculations.
 
         Args:
             mac: MAC address of the medicine.
             medicine: Medicine name/type.
+            readings: Readings of one advertisement from the alignment
+                windows; the latest buffered reading per receiver if None.
         """
         # Check throttling
         now = datetime.utcnow()
@@ -306,19 +868,160 @@ class MedicineTracker:
                     )
                     return
 
+        self._solve_dirty({mac: (medicine, readings)})
+
+    def _solve_dirty(self, dirty: DirtyTags) -> None:
+        """Snapshot and solve a set of tags (a scheduler tick, or one tag inline).
+
+        Buffers of all tags are copied under a single lock. With
+        SHARD_BY_FLOOR each tag is queued on the worker of the floor that
+        hears it best and solved against only that floor's receivers;
+        otherwise all tags are solved here and written in one batch.
+
+        Args:
+            dirty: mac -> (medicine, aligned readings or None for the buffer).
+        """
         with self._buffer_lock:
-            if mac not in self._buffer:
-                return
+            snapshot = [
+                (mac, medicine, dict(readings if readings is not None else self._buffer.get(mac, {})))
+                for mac, (medicine, readings) in dirty.items()
+            ]
+
+        # Dead or lagging receivers would drag the fix towards stale data
+        excluded = self.latency.excluded
+        if excluded:
+            snapshot = [
+                (mac, medicine, {
+                    receiver_id: data for receiver_id, data in receiver_data.items()
+                    if receiver_id not in excluded
+                })
+                for mac, medicine, receiver_data in snapshot
+            ]
+
+        if self._shards is None:
+            self._solve_batch(snapshot, self.receivers.geometry.positions)
+            return
+
+        # Solve on the worker of the floor that hears each tag best
+        floor_of = self.receivers.geometry.floor_of
+        by_floor: Dict[int, list] = {}
+        for mac, medicine, receiver_data in snapshot:
+            floor = assign_floor(receiver_data, floor_of)
+            if floor is None:
+                logger.debug(f"No registered receiver has heard {mac}")
+                continue
+            self._tag_floor[mac] = floor
+            by_floor.setdefault(floor, []).append((mac, medicine, receiver_data))
+        for floor, items in by_floor.items():
+            self._shards.submit_many(floor, items)
+
+    def _solve_on_floor(self, floor: int, batch: List[Tuple[str, str, Any]]) -> None:
+        """Solve tags against one floor's receivers (runs on the floor shard).
+
+        Args:
+            floor: Floor level the tags were assigned to.
+            batch: (mac, medicine, readings) per tag.
+        """
+        receiver_positions = self.receivers.geometry.positions_by_floor.get(floor, {})
+        self._solve_batch(
+            [
+                (mac, medicine, {
+                    receiver_id: data for receiver_id, data in readings.items()
+                    if receiver_id in receiver_positions
+                })
+                for mac, medicine, readings in batch
+            ],
+            receiver_positions,
+            floor=floor
+        )
 
-            receiver_data = self._buffer[mac].copy()
+    def _solve_batch(
+        self,
+        batch: List[Tuple[str, str, Dict[str, Dict[str, Any]]]],
+        receiver_positions: Dict[str, Tuple[float, float, float]],
+        floor: Optional[int] = None
+    ) -> None:
+        """Solve several tags and store their positions in one write.
+
+        Args:
+            batch: (mac, medicine, readings per receiver) per tag.
+            receiver_positions: Coordinates of the receivers to solve against.
+            floor: Floor every tag was assigned to, or None to assign each
+                tag from its readings (for the bounds check).
+        """
+        now = datetime.utcnow()
+        fixes = []
+        for mac, medicine, receiver_data in batch:
+            solved = self._locate(mac, receiver_data, receiver_positions)
+            if solved:
+                fixes.append((mac, medicine, receiver_data, *solved))
+        if not fixes:
+            return
+
+        # Store positions
+        success = self.db.write_positions([
+            {
+                "mac": mac,
+                "x": position[0],
+                "y": position[1],
+                "z": position[2],
+                "accuracy": accuracy,
+                "medicine": medicine,
+                "receiver_count": len(receiver_data),
+            }
+            for mac, medicine, receiver_data, position, accuracy in fixes
+        ])
+        if not success:
+            return
+
+        written = datetime.utcnow()
+        floor_of = self.receivers.geometry.floor_of
+        for mac, medicine, receiver_data, position, accuracy in fixes:
+            newest = max(data["ts"] for data in receiver_data.values())
+            self.latency.record("backend_to_fix", (written - newest).total_seconds())
+
+            # Update last calculation time
+            with self._calc_lock:
+                self._last_position_calc[mac] = now
+
+            # Check for position-based alerts (e.g., out of bounds)
+            tag_floor = floor if floor is not None else assign_floor(receiver_data, floor_of)
+            self._check_position_alerts(mac, medicine, position, tag_floor)
+
+    def _locate(
+        self,
+        mac: str,
+        receiver_data: Dict[str, Dict[str, Any]],
+        receiver_positions: Dict[str, Tuple[float, float, float]]
+    ) -> Optional[Tuple[Tuple[float, float, float], float]]:
+        """Calculate a position and its accuracy from one tag's readings.
 
+        Args:
+            mac: MAC address of the medicine.
+            receiver_data: Readings per receiver to solve with.
+            receiver_positions: Coordinates of the receivers to solve against.
+
+        Returns:
+            ((x, y, z), accuracy) or None if no position could be calculated.
+        """
         # Need at least 2 receivers for trilateration
         if len(receiver_data) < 2:
             logger.debug(
                 f"Insufficient receivers for {mac}: {len(receiver_data)} "
                 f"(need at least 2)"
             )
-            return
+            return None
+
+        if self._fingerprints is not None:
+            # Fingerprint match on raw RSSI; falls through to trilateration
+            # when too few surveyed receivers are in the buffer
+            located = self._fingerprints.locate({
+                receiver_id: data["rssi"]
+                for receiver_id, data in receiver_data.items()
+                if data.get("rssi") is not None
+            })
+            if located:
+                return located
 
         # Use pre-calculated distances from buffer
         distances: Dict[str, float] = {}
@@ -327,45 +1030,27 @@ class MedicineTracker:
 
         # Perform trilateration
         position = trilaterate_weighted(
-            self._receiver_positions,
+            receiver_positions,
             distances,
             min_receivers=2
         )
-
-        if position:
-            x, y, z = position
-
-            # Calculate accuracy (RMSE)
-            accuracy = calculate_position_error(
-                position,
-                self._receiver_positions,
-                distances
-            )
-
-            # Store position
-            success = self.db.write_position(
-                mac=mac,
-                x=x,
-                y=y,
-                z=z,
-                accuracy=accuracy,
-                medicine=medicine,
-                receiver_count=len(receiver_data)
-            )
-
-            if success:
-                # Update last calculation time
-                with self._calc_lock:
-                    self._last_position_calc[mac] = now
-
-                # Check for position-based alerts (e.g., out of bounds)
-                self._check_position_alerts(mac, medicine, position)
+        if not position:
+            return None
+
+        # Calculate accuracy (RMSE)
+        accuracy = calculate_position_error(
+            position,
+            receiver_positions,
+            distances
+        )
+        return position, accuracy
 
     def _check_position_alerts(
         self,
         mac: str,
         medicine: str,
-        position: Tuple[float, float, float]
+        position: Tuple[float, float, float],
+        floor: Optional[int] = None
     ) -> None:
         """Check if position triggers any alerts.
 
@@ -373,8 +1058,13 @@ class MedicineTracker:
             mac: MAC address of the medicine.
             medicine: Medicine name/type.
             position: Calculated (x, y, z) position.
+            floor: Floor level the tag was assigned to (1 if unknown). The
+                z bounds apply relative to that floor, whose receivers sit
+                (floor - 1) * floor_height higher than the ground floor's.
         """
         x, y, z = position
+        floor = floor or 1
+        z_floor = z - (floor - 1) * self.receivers.floor_height
 
         # Example: Alert if medicine is outside defined area
         # This is a placeholder - adjust bounds as needed
@@ -386,19 +1076,33 @@ class MedicineTracker:
 
         if (x < bounds["x_min"] or x > bounds["x_max"] or
             y < bounds["y_min"] or y > bounds["y_max"] or
-            z < bounds["z_min"] or z > bounds["z_max"]):
+            z_floor < bounds["z_min"] or z_floor > bounds["z_max"]):
 
-            logger.warning(f"Medicine {mac} out of bounds at ({x:.2f}, {y:.2f}, {z:.2f})")
+            logger.warning(f"Medicine {mac} out of bounds at ({x:.2f}, {y:.2f}, {z:.2f}) on floor {floor}")
 
             self.db.write_alert(
                 mac=mac,
                 alert_type="out_of_bounds",
-                message=f"Medicine position ({x:.1f}, {y:.1f}, {z:.1f}) outside safe area",
+                message=f"Medicine position ({x:.1f}, {y:.1f}, {z:.1f}) outside safe area on floor {floor}",
                 severity="critical",
                 medicine=medicine,
-                metadata={"x": x, "y": y, "z": z}
+                metadata={"x": x, "y": y, "z": z, "floor": floor}
             )
 
+    def tags_on_floor(self, floor: int) -> List[str]:
+        """MACs of currently buffered tags whose receivers place them on a floor.
+
+        Args:
+            floor: Floor level from the receiver registry.
+        """
+        floor_of = self.receivers.geometry.floor_of
+        with self._buffer_lock:
+            snapshot = [(mac, dict(receiver_data)) for mac, receiver_data in self._buffer.items()]
+        return sorted(
+            mac for mac, receiver_data in snapshot
+            if assign_floor(receiver_data, floor_of) == floor
+        )
+
     def get_buffer_stats(self) -> Dict[str, Any]:
         """Get statistics about the current buffer state.
 
@@ -409,10 +1113,39 @@ class MedicineTracker:
             mac_count = len(self._buffer)
             total_entries = sum(len(receivers) for receivers in self._buffer.values())
 
-            return {
+            stats = {
                 "mac_count": mac_count,
                 "total_entries": total_entries,
                 "receivers_per_mac": {
                     mac: len(receivers) for mac, receivers in self._buffer.items()
                 }
             }
+
+        if self._shards is not None:
+            floors = list(self._tag_floor.values())
+            stats["floor_shards"] = {
+                floor: {**shard_stats, "tags": floors.count(floor)}
+                for floor, shard_stats in self._shards.stats().items()
+            }
+        if self._windows is not None:
+            stats["observation_windows"] = self._windows.stats()
+        if self._scheduler is not None:
+            stats["position_scheduler"] = self._scheduler.stats()
+        if self._admission is not None:
+            stats["admission"] = self._admission.stats()
+        stats["unrouted_messages"] = self._unrouted
+        return stats
+
+    def get_startup_stats(self) -> Dict[str, Any]:
+        """Get statistics about messages buffered while storage was down.
+
+        Returns:
+            Dict with pending and dropped message counts.
+        """
+        with self._pending_lock:
+            return {
+                "storage_ready": self._storage_ready,
+                "replaying": self._replaying,
+                "pending": len(self._pending),
+                "dropped": self._pending_dropped
+            }
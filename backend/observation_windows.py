@@ -0,0 +1,195 @@
+"""Sequence-aligned observation windows for the Medical Tracker IoT backend.
+
+Every advertisement a tag sends carries a sequence number, and each receiver
+that hears it reports its own RSSI for that same advertisement. Solving on
+every incoming message mixes readings from different advertisements and
+repeats the solve once per receiver. This module groups readings by
+(mac, sequence_number) instead: a group closes as soon as every receiver
+expected to hear the tag has reported, or when the alignment window runs
+out, and is then handed to the solver exactly once.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Recently closed sequence numbers remembered per tag, to spot late readings
+_CLOSED_MEMORY = 8
+
+
+class ObservationGroup:
+    """Readings of one advertisement, keyed by receiver_id."""
+
+    __slots__ = ("mac", "seq", "medicine", "opened", "expected", "readings")
+
+    def __init__(self, mac: str, seq: int, medicine: str, opened: float) -> None:
+        self.mac = mac
+        self.seq = seq
+        self.medicine = medicine
+        self.opened = opened
+        self.expected = 0
+        self.readings: Dict[str, Dict[str, Any]] = {}
+
+
+class ObservationWindows:
+    """Collects readings per (mac, sequence_number) and emits closed groups.
+
+    Groups close when complete (on the caller's thread) or when their
+    alignment window expires (on the flush thread). Readings for a sequence
+    number whose group already closed are counted as late and dropped.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, str, Dict[str, Dict[str, Any]]], None],
+        window_seconds: float,
+        max_open: int = 10000
+    ) -> None:
+        """Initialize the windows.
+
+        Args:
+            emit: Called as emit(mac, medicine, readings) once per closed group.
+            window_seconds: How long a group waits for missing receivers.
+            max_open: Open groups before the oldest is closed early.
+        """
+        self.emit = emit
+        self.window_seconds = window_seconds
+        self.max_open = max_open
+
+        # (mac, seq) -> group, oldest first
+        self._open: "OrderedDict[Tuple[str, int], ObservationGroup]" = OrderedDict()
+        self._closed: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.complete = 0
+        self.timed_out = 0
+        self.late = 0
+        self.readings_per_group = 0
+
+    def add(
+        self,
+        mac: str,
+        seq: int,
+        medicine: str,
+        receiver_id: str,
+        reading: Dict[str, Any],
+        expected: int
+    ) -> None:
+        """Add one receiver's reading of an advertisement.
+
+        Args:
+            mac: MAC address of the beacon.
+            seq: Sequence number of the advertisement.
+            medicine: Medicine name/type.
+            receiver_id: Receiver that heard the advertisement.
+            reading: Buffer-style reading (distance, rssi, ts, ...).
+            expected: Receivers currently expected to hear this tag.
+        """
+        key = (mac, seq)
+        ready = []
+        with self._lock:
+            if seq in self._closed.get(mac, ()):
+                self.late += 1
+                return
+
+            group = self._open.get(key)
+            if group is None:
+                if len(self._open) >= self.max_open:
+                    ready.append(self._close(next(iter(self._open)), timed_out=True))
+                group = self._open[key] = ObservationGroup(mac, seq, medicine, time.monotonic())
+
+            group.readings[receiver_id] = reading
+            group.expected = max(group.expected, expected)
+            if len(group.readings) >= group.expected:
+                ready.append(self._close(key, timed_out=False))
+
+        for closed in ready:
+            self._emit(closed)
+
+    def _close(self, key: Tuple[str, int], timed_out: bool) -> ObservationGroup:
+        """Remove a group from the open set; the caller holds the lock."""
+        group = self._open.pop(key)
+        closed = self._closed.get(group.mac)
+        if closed is None:
+            closed = self._closed[group.mac] = deque(maxlen=_CLOSED_MEMORY)
+        closed.append(group.seq)
+
+        if timed_out:
+            self.timed_out += 1
+        else:
+            self.complete += 1
+        self.readings_per_group += len(group.readings)
+        return group
+
+    def _emit(self, group: ObservationGroup) -> None:
+        try:
+            self.emit(group.mac, group.medicine, group.readings)
+        except Exception as e:
+            logger.error(f"Solving observation group {group.mac}#{group.seq} failed: {e}")
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """Close every group whose alignment window has expired.
+
+        Returns:
+            int: Number of groups closed.
+        """
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.window_seconds
+        ready = []
+        with self._lock:
+            while self._open:
+                key, group = next(iter(self._open.items()))
+                if group.opened > cutoff:
+                    break
+                ready.append(self._close(key, timed_out=True))
+
+        for group in ready:
+            self._emit(group)
+        return len(ready)
+
+    def forget(self, mac: str) -> None:
+        """Drop the closed-sequence memory of a tag that went quiet."""
+        with self._lock:
+            self._closed.pop(mac, None)
+
+    def start(self) -> None:
+        """Flush expired groups in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="observation-windows", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self._thread = None
+        self.flush(now=float("inf"))
+
+    def _run(self) -> None:
+        # Check a few times per window so a group closes at most a quarter late
+        interval = max(self.window_seconds / 4.0, 0.01)
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing observation windows: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            closed = self.complete + self.timed_out
+            return {
+                "open": len(self._open),
+                "complete": self.complete,
+                "timed_out": self.timed_out,
+                "late": self.late,
+                "mean_receivers": round(self.readings_per_group / closed, 2) if closed else None,
+            }
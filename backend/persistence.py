@@ -0,0 +1,257 @@
+"""Persistence sampling for the Medical Tracker IoT backend.
+
+The tracker needs every scan in memory, but storage rarely needs every scan
+on disk: at a few adverts per second from several receivers per tag, raw
+scans dominate write volume. SampledDatabase wraps Database or
+SQLiteDatabase and applies a persistence policy per measurement before a
+write reaches the backend. The tracker still sees 100% of the traffic.
+
+Policies (one per measurement):
+    all             persist every write
+    interval:N      at most one write per tag every N seconds
+    change          only when the tag's tracked fields changed
+    change:N        like change, plus at least one write per tag every N seconds
+
+Tracked fields for change: temperature, battery and moving for scans; the
+position rounded to 10 cm for positions; type, severity and message for
+alerts. Note that sampling scans per tag also drops the other receivers'
+distances, so keep status at "all" if reprocess.py needs full history.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+POLICY_KINDS = ("all", "interval", "change")
+
+
+class PersistencePolicy:
+    """Decides which writes of one measurement reach storage."""
+
+    def __init__(self, kind: str = "all", seconds: Optional[float] = None) -> None:
+        """Initialize the policy.
+
+        Args:
+            kind: "all", "interval" or "change".
+            seconds: Interval for "interval"; optional maximum gap for "change".
+
+        Raises:
+            ValueError: If the kind is unknown or an interval has no seconds.
+        """
+        if kind not in POLICY_KINDS:
+            raise ValueError(f"Unknown persistence policy '{kind}', expected one of {POLICY_KINDS}")
+        if kind == "interval" and not seconds:
+            raise ValueError("interval policy needs a number of seconds, e.g. interval:10")
+        self.kind = kind
+        self.seconds = seconds
+
+        # key -> (last persisted epoch seconds, last persisted signature)
+        self._last: Dict[Hashable, Tuple[float, Hashable]] = {}
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.written = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "PersistencePolicy":
+        """Build a policy from "all", "interval:N", "change" or "change:N"."""
+        kind, _, seconds = spec.strip().lower().partition(":")
+        try:
+            return cls(kind or "all", float(seconds) if seconds else None)
+        except ValueError as e:
+            raise ValueError(f"Invalid persistence policy '{spec}': {e}") from None
+
+    def __str__(self) -> str:
+        return self.kind if self.seconds is None else f"{self.kind}:{self.seconds:g}"
+
+    def admit(self, key: Hashable, signature: Hashable, now: float) -> bool:
+        """Decide whether a write should be persisted.
+
+        Args:
+            key: Sampling key, normally the tag MAC.
+            signature: Tracked field values compared by "change".
+            now: Epoch seconds of the write.
+
+        Returns:
+            bool: True if the write should go to storage.
+        """
+        with self._lock:
+            self.offered += 1
+            if self.kind != "all":
+                last = self._last.get(key)
+                if last is not None:
+                    last_time, last_signature = last
+                    due = self.seconds is not None and now - last_time >= self.seconds
+                    if self.kind == "interval" and not due:
+                        return False
+                    if self.kind == "change" and signature == last_signature and not due:
+                        return False
+                self._last[key] = (now, signature)
+            self.written += 1
+            return True
+
+    def forget(self, key: Hashable) -> None:
+        """Make the next write for key persist, e.g. after a failed write."""
+        with self._lock:
+            self._last.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            skipped = self.offered - self.written
+            return {
+                "policy": str(self),
+                "offered": self.offered,
+                "written": self.written,
+                "skipped": skipped,
+                "reduction_pct": round(100.0 * skipped / self.offered, 1) if self.offered else 0.0,
+            }
+
+
+def _epoch(timestamp: Optional[datetime]) -> float:
+    if timestamp is None:
+        return time.time()
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class SampledDatabase:
+    """Storage wrapper that applies persistence policies before writing.
+
+    Skipped writes report success, since the data was deliberately not
+    needed on disk. Everything not overridden here is delegated to the
+    wrapped backend.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        status_policy: str = "all",
+        position_policy: str = "all",
+        alert_policy: str = "all"
+    ) -> None:
+        """Initialize the wrapper.
+
+        Args:
+            backend: Database or SQLiteDatabase instance to wrap.
+            status_policy: Policy for medicine_status (raw scans).
+            position_policy: Policy for medicine_position.
+            alert_policy: Policy for alerts.
+
+        Raises:
+            ValueError: If a policy spec is invalid.
+        """
+        self.backend = backend
+        self.policies = {
+            "medicine_status": PersistencePolicy.parse(status_policy),
+            "medicine_position": PersistencePolicy.parse(position_policy),
+            "alerts": PersistencePolicy.parse(alert_policy),
+        }
+        logger.info(
+            "Persistence policies: "
+            + ", ".join(f"{name}={policy}" for name, policy in self.policies.items())
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+    def __enter__(self) -> "SampledDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.backend.close()
+
+    def _persist(self, measurement: str, key: Hashable, signature: Hashable, now: float, write) -> bool:
+        policy = self.policies[measurement]
+        if not policy.admit(key, signature, now):
+            return True
+        ok = write()
+        if not ok:
+            policy.forget(key)
+        return ok
+
+    def write_scan(
+        self,
+        mac: str,
+        receiver_id: str,
+        distance: float,
+        medicine: str,
+        temperature: Optional[float] = None,
+        battery: Optional[int] = None,
+        moving: bool = False,
+        sequence_number: Optional[int] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store a scan if the medicine_status policy admits it."""
+        return self._persist(
+            "medicine_status", mac, (temperature, battery, bool(moving)), _epoch(timestamp),
+            lambda: self.backend.write_scan(
+                mac, receiver_id, distance, medicine, temperature=temperature,
+                battery=battery, moving=moving, sequence_number=sequence_number,
+                timestamp=timestamp
+            )
+        )
+
+    def write_position(
+        self,
+        mac: str,
+        x: float,
+        y: float,
+        z: float,
+        accuracy: float,
+        medicine: str,
+        receiver_count: int,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store a position if the medicine_position policy admits it."""
+        return self._persist(
+            "medicine_position", mac, (round(x, 1), round(y, 1), round(z, 1)), _epoch(timestamp),
+            lambda: self.backend.write_position(
+                mac, x, y, z, accuracy, medicine, receiver_count, timestamp=timestamp
+            )
+        )
+
+    def write_positions(self, positions: List[Dict[str, Any]]) -> bool:
+        """Store the positions of a batch that the medicine_position policy admits."""
+        policy = self.policies["medicine_position"]
+        admitted = [
+            p for p in positions
+            if policy.admit(
+                p["mac"],
+                (round(p["x"], 1), round(p["y"], 1), round(p["z"], 1)),
+                _epoch(p.get("timestamp"))
+            )
+        ]
+        if not admitted:
+            return True
+        ok = self.backend.write_positions(admitted)
+        if not ok:
+            for p in admitted:
+                policy.forget(p["mac"])
+        return ok
+
+    def write_alert(
+        self,
+        mac: str,
+        alert_type: str,
+        message: str,
+        severity: str = "warning",
+        medicine: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store an alert if the alerts policy admits it."""
+        return self._persist(
+            "alerts", mac, (alert_type, severity, message), _epoch(timestamp),
+            lambda: self.backend.write_alert(
+                mac, alert_type, message, severity=severity, medicine=medicine,
+                metadata=metadata, timestamp=timestamp
+            )
+        )
+
+    def get_persistence_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Offered, written and skipped writes per measurement."""
+        return {name: policy.stats() for name, policy in self.policies.items()}
@@ -0,0 +1,203 @@
+"""Receiver registry for the Medical Tracker IoT backend.
+
+Receivers are loaded from the receivers table of the SQLite database (the
+same one database/database_setup.py creates), falling back to
+Settings.RECEIVER_COORDINATES when the table is missing or empty. Each load
+produces an immutable ReceiverGeometry snapshot with dense integer indices
+and precomputed coordinate and pairwise-distance matrices.
+
+The registry can be reloaded at runtime (periodically or through the API).
+A reload swaps in a new snapshot in one assignment and bumps the version
+whenever the receiver set changed, so solvers can compare versions to know
+when their cached state is stale.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# receiver_id -> (x, y, z, floor_level)
+ReceiverEntries = Dict[str, Tuple[float, float, float, int]]
+
+
+class ReceiverGeometry:
+    """Immutable snapshot of receiver positions.
+
+    Attributes:
+        version: Registry version this snapshot belongs to.
+        source: Where the receivers were loaded from.
+        ids: Receiver IDs in index order.
+        index: receiver_id -> dense integer index.
+        coords: (n, 3) receiver coordinates in meters.
+        floors: (n,) floor level per receiver.
+        pairwise: (n, n) distances between receivers in meters.
+        positions: receiver_id -> (x, y, z), the form trilaterate.py takes.
+        floor_of: receiver_id -> floor_level.
+        positions_by_floor: floor_level -> positions of that floor's receivers.
+    """
+
+    def __init__(self, version: int, entries: ReceiverEntries, source: str) -> None:
+        self.version = version
+        self.source = source
+        self.ids = tuple(sorted(entries))
+        self.index = {receiver_id: i for i, receiver_id in enumerate(self.ids)}
+
+        self.coords = np.array([entries[r][:3] for r in self.ids], dtype=np.float64).reshape(-1, 3)
+        self.floors = np.array([entries[r][3] for r in self.ids], dtype=np.int32)
+        self.pairwise = np.linalg.norm(self.coords[:, None, :] - self.coords[None, :, :], axis=2)
+        for array in (self.coords, self.floors, self.pairwise):
+            array.flags.writeable = False
+
+        self.positions: Dict[str, Tuple[float, float, float]] = {
+            receiver_id: tuple(self.coords[i].tolist()) for receiver_id, i in self.index.items()
+        }
+        self.floor_of: Dict[str, int] = {
+            receiver_id: int(self.floors[i]) for receiver_id, i in self.index.items()
+        }
+        self.positions_by_floor: Dict[int, Dict[str, Tuple[float, float, float]]] = {}
+        for receiver_id, floor in self.floor_of.items():
+            self.positions_by_floor.setdefault(floor, {})[receiver_id] = self.positions[receiver_id]
+        self._entries = dict(entries)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def same_receivers(self, entries: ReceiverEntries) -> bool:
+        return self._entries == entries
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "receivers": [
+                {
+                    "receiver_id": receiver_id,
+                    "index": i,
+                    "x": float(self.coords[i, 0]),
+                    "y": float(self.coords[i, 1]),
+                    "z": float(self.coords[i, 2]),
+                    "floor_level": int(self.floors[i]),
+                }
+                for i, receiver_id in enumerate(self.ids)
+            ],
+        }
+
+
+class ReceiverRegistry:
+    """Loads receivers and hands out the current ReceiverGeometry."""
+
+    def __init__(
+        self,
+        db_path: Optional[str],
+        defaults: Dict[str, Tuple[float, float, float]],
+        floor_height: float = 4.0,
+        mount_height: float = 2.0
+    ) -> None:
+        """Initialize the registry and load the first snapshot.
+
+        Args:
+            db_path: SQLite database with a receivers table, or None.
+            defaults: Fallback receiver_id -> (x, y, z) from the config.
+            floor_height: Meters between floors, for z from floor_level.
+            mount_height: Receiver height above its floor in meters.
+        """
+        self.db_path = db_path
+        self.defaults = defaults
+        self.floor_height = floor_height
+        self.mount_height = mount_height
+
+        self._reload_lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._watch_thread: Optional[threading.Thread] = None
+
+        entries, source = self._load()
+        self._geometry = ReceiverGeometry(1, entries, source)
+        logger.info(f"Loaded {len(self._geometry)} receivers from {source}")
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "ReceiverRegistry":
+        return cls(
+            db_path=settings.RECEIVERS_DB_PATH or None,
+            defaults=settings.RECEIVER_COORDINATES,
+            floor_height=settings.FLOOR_HEIGHT_METERS,
+            mount_height=settings.RECEIVER_MOUNT_HEIGHT
+        )
+
+    @property
+    def geometry(self) -> ReceiverGeometry:
+        """The current snapshot; hold on to it for the length of one solve."""
+        return self._geometry
+
+    @property
+    def version(self) -> int:
+        return self._geometry.version
+
+    def _load(self) -> Tuple[ReceiverEntries, str]:
+        if self.db_path and os.path.exists(self.db_path):
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    rows = conn.execute(
+                        "SELECT receiver_id, x_position, y_position, floor_level FROM receivers"
+                    ).fetchall()
+                if rows:
+                    return {
+                        receiver_id: (
+                            float(x),
+                            float(y),
+                            (int(floor or 1) - 1) * self.floor_height + self.mount_height,
+                            int(floor or 1),
+                        )
+                        for receiver_id, x, y, floor in rows
+                    }, self.db_path
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read receivers from {self.db_path}: {e}")
+
+        return {
+            receiver_id: (float(x), float(y), float(z), 1)
+            for receiver_id, (x, y, z) in self.defaults.items()
+        }, "config"
+
+    def reload(self) -> bool:
+        """Reload receivers and swap in a new snapshot if anything changed.
+
+        Returns:
+            bool: True if the receiver set changed and the version was bumped.
+        """
+        with self._reload_lock:
+            entries, source = self._load()
+            current = self._geometry
+            if current.same_receivers(entries):
+                return False
+            self._geometry = ReceiverGeometry(current.version + 1, entries, source)
+        logger.info(
+            f"Receiver registry reloaded from {source}: {len(entries)} receivers, "
+            f"version {self._geometry.version}"
+        )
+        return True
+
+    def start_watch(self, interval: float) -> None:
+        """Reload every interval seconds in a background thread."""
+        if interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(interval,), daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self) -> None:
+        self._watch_stop.set()
+        if self._watch_thread and self._watch_thread.is_alive():
+            self._watch_thread.join(timeout=5.0)
+        self._watch_thread = None
+
+    def _watch_loop(self, interval: float) -> None:
+        while not self._watch_stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Receiver registry reload failed: {e}")
@@ -0,0 +1,386 @@
+"""Bulk reprocessing of historical medicine positions.
+
+Streams medicine_status history out of InfluxDB in time chunks, replays it
+per tag through the same buffering and throttling rules MedicineTracker uses
+live, recomputes positions with the current trilaterate.py code and receiver
+coordinates in a process pool, and writes the results back in large batches
+to a separate measurement (and optionally a separate bucket).
+
+Progress is logged per chunk and a JSON checkpoint is written after each
+chunk, so an interrupted run resumes where it stopped. Rewriting a chunk is
+harmless: points carry the original timestamps and tags and simply overwrite.
+
+Usage:
+    python reprocess.py --start 2026-09-01 --stop 2026-10-01
+    python reprocess.py --start 2026-09-01 --stop 2026-10-01 \\
+        --measurement medicine_position_v2 --bucket recalibrated --workers 8
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from database import Database
+from receivers import ReceiverRegistry
+from trilaterate import calculate_position_error, rssi_to_distance, trilaterate_weighted
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("reprocess")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# (time_ns, receiver_id, distance)
+Row = Tuple[int, str, float]
+
+
+def _parse_time(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _to_ns(ts: datetime) -> int:
+    return (ts - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _escape_tag(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+# ----------------------------------------------------------------------
+# Worker side
+# ----------------------------------------------------------------------
+
+def _init_worker() -> None:
+    # trilaterate logs every solve (and every weak RSSI), far too much for bulk runs
+    logging.getLogger("trilaterate").setLevel(logging.ERROR)
+    logging.getLogger("hotpath").setLevel(logging.ERROR)
+
+
+def solve_tags(jobs: List[Tuple[str, str, List[Row], Dict[str, Any]]], params: Dict[str, Any]):
+    """Replay each tag's readings and recompute its positions.
+
+    Mirrors MedicineTracker: the latest distance per receiver is kept until
+    it is older than buffer_timeout, and a position is solved at most every
+    calculation_interval once two or more receivers are buffered.
+
+    Args:
+        jobs: (mac, medicine, rows, state) per tag; state carries the
+            receiver buffer and last calculation time across chunks.
+        params: Solver settings (receivers, timeouts, distance rescaling).
+
+    Returns:
+        List of (mac, medicine, positions, state), positions being
+        (time_ns, x, y, z, accuracy, receiver_count) tuples.
+    """
+    receivers = {rid: tuple(pos) for rid, pos in params["receivers"].items()}
+    timeout_ns = int(params["buffer_timeout_seconds"] * 1e9)
+    interval_ns = int(params["calculation_interval"] * 1e9)
+    rescale = params.get("source_rssi_reference") is not None
+
+    results = []
+    for mac, medicine, rows, state in jobs:
+        buffer: Dict[str, List] = state.get("receivers", {})
+        last_calc: Optional[int] = state.get("last_calc")
+        positions = []
+
+        rows.sort()
+        for t, receiver_id, distance in rows:
+            if rescale and distance > 0:
+                # Recover the RSSI the stored distance came from, then apply
+                # the current path loss model
+                rssi = params["source_rssi_reference"] - 10 * params["source_path_loss_exponent"] * math.log10(distance)
+                distance = rssi_to_distance(round(rssi), params["rssi_reference"], params["path_loss_exponent"])
+
+            buffer[receiver_id] = [t, distance]
+            for rid in [rid for rid, (ts, _) in buffer.items() if t - ts > timeout_ns]:
+                del buffer[rid]
+
+            if len(buffer) < 2 or (last_calc is not None and t - last_calc < interval_ns):
+                continue
+
+            distances = {rid: d for rid, (_, d) in buffer.items()}
+            position = trilaterate_weighted(receivers, distances, min_receivers=2)
+            if position:
+                accuracy = calculate_position_error(position, receivers, distances)
+                positions.append((t, *position, accuracy, len(buffer)))
+                last_calc = t
+
+        results.append((mac, medicine, positions, {"receivers": buffer, "last_calc": last_calc}))
+    return results
+
+
+# ----------------------------------------------------------------------
+# Driver side
+# ----------------------------------------------------------------------
+
+class Reprocessor:
+    """Chunked read -> parallel solve -> batched write pipeline."""
+
+    def __init__(
+        self,
+        database: Database,
+        start: datetime,
+        stop: datetime,
+        measurement: str,
+        bucket: str,
+        chunk: timedelta,
+        workers: int,
+        write_batch: int,
+        checkpoint_path: str,
+        params: Dict[str, Any]
+    ) -> None:
+        self.db = database
+        self.start = start
+        self.stop = stop
+        self.measurement = measurement
+        self.bucket = bucket
+        self.chunk = chunk
+        self.workers = workers
+        self.write_batch = write_batch
+        self.checkpoint_path = checkpoint_path
+        self.params = params
+
+        self.next_start = start
+        # mac -> {"medicine", "receivers", "last_calc"}
+        self.tag_state: Dict[str, Dict[str, Any]] = {}
+        self.rows_read = 0
+        self.positions_written = 0
+
+    # Checkpoints ---------------------------------------------------------
+
+    def _checkpoint_key(self) -> Dict[str, str]:
+        return {
+            "start": self.start.isoformat(),
+            "stop": self.stop.isoformat(),
+            "measurement": self.measurement,
+            "bucket": self.bucket,
+        }
+
+    def load_checkpoint(self) -> bool:
+        """Resume from checkpoint_path if it belongs to this run."""
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path) as f:
+            data = json.load(f)
+        if data.get("run") != self._checkpoint_key():
+            logger.warning(f"Ignoring checkpoint {self.checkpoint_path}: it is for a different run")
+            return False
+
+        self.next_start = _parse_time(data["next_start"])
+        self.tag_state = data["tag_state"]
+        self.rows_read = data["rows_read"]
+        self.positions_written = data["positions_written"]
+        logger.info(f"Resuming from {self.next_start.isoformat()} ({self.positions_written} positions already written)")
+        return True
+
+    def save_checkpoint(self) -> None:
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "run": self._checkpoint_key(),
+                "next_start": self.next_start.isoformat(),
+                "tag_state": self.tag_state,
+                "rows_read": self.rows_read,
+                "positions_written": self.positions_written,
+            }, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    # Pipeline stages -----------------------------------------------------
+
+    def read_chunk(self, chunk_start: datetime, chunk_stop: datetime) -> Dict[str, Tuple[str, List[Row]]]:
+        """Stream one chunk of distances, grouped by tag."""
+        # Only the distance field is needed, which avoids a server-side pivot
+        query = f'''
+        from(bucket: "{self.db.bucket}")
+            |> range(start: {chunk_start.isoformat()}, stop: {chunk_stop.isoformat()})
+            |> filter(fn: (r) => r._measurement == "medicine_status" and r._field == "distance")
+            |> keep(columns: ["_time", "_value", "mac", "receiver_id", "medicine"])
+        '''
+        groups: Dict[str, Tuple[str, List[Row]]] = {}
+        for record in self.db.query_api.query_stream(query, org=self.db.org):
+            values = record.values
+            mac = values["mac"]
+            entry = groups.get(mac)
+            if entry is None:
+                entry = groups[mac] = (values.get("medicine") or "unknown", [])
+            entry[1].append((_to_ns(values["_time"]), values["receiver_id"], float(values["_value"])))
+        return groups
+
+    def submit_chunk(self, executor: ProcessPoolExecutor, groups: Dict[str, Tuple[str, List[Row]]]) -> list:
+        jobs = [
+            (mac, medicine, rows, self.tag_state.get(mac, {}))
+            for mac, (medicine, rows) in groups.items()
+        ]
+        # A few jobs per worker keeps the pool busy without per-tag pickling overhead
+        per_job = max(1, math.ceil(len(jobs) / (self.workers * 4)))
+        return [
+            executor.submit(solve_tags, jobs[i:i + per_job], self.params)
+            for i in range(0, len(jobs), per_job)
+        ]
+
+    def finish_chunk(self, futures: list, chunk_stop: datetime) -> int:
+        """Collect solved positions, write them, and update tag state."""
+        measurement = _escape_tag(self.measurement)
+        lines: List[str] = []
+        written = 0
+        for future in futures:
+            for mac, medicine, positions, state in future.result():
+                state["medicine"] = medicine
+                self.tag_state[mac] = state
+                tags = f"{measurement},mac={_escape_tag(mac)},medicine={_escape_tag(medicine)}"
+                for t, x, y, z, accuracy, receiver_count in positions:
+                    lines.append(f"{tags} x={x},y={y},z={z},accuracy={accuracy},receiver_count={receiver_count}i {t}")
+                if len(lines) >= self.write_batch:
+                    written += self._write(lines)
+                    lines = []
+        written += self._write(lines)
+
+        # Tags whose buffered receivers have all expired carry no useful state
+        stop_ns = _to_ns(chunk_stop)
+        timeout_ns = int(self.params["buffer_timeout_seconds"] * 1e9)
+        for mac in [mac for mac, state in self.tag_state.items()
+                    if all(stop_ns - ts > timeout_ns for ts, _ in state["receivers"].values())]:
+            del self.tag_state[mac]
+
+        self.positions_written += written
+        return written
+
+    def _write(self, lines: List[str]) -> int:
+        if not lines:
+            return 0
+        self.db.write_api.write(bucket=self.bucket, org=self.db.org, record=lines)
+        return len(lines)
+
+    # Driver --------------------------------------------------------------
+
+    def run(self) -> None:
+        total = (self.stop - self.start).total_seconds()
+        started = time.monotonic()
+        done_at_start = (self.next_start - self.start).total_seconds()
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            pending: Optional[Tuple[list, datetime, int]] = None
+            chunk_start = self.next_start
+
+            while chunk_start < self.stop or pending:
+                groups = None
+                chunk_stop = min(chunk_start + self.chunk, self.stop)
+                if chunk_start < self.stop:
+                    # Read the next chunk while the pool solves the previous one
+                    groups = self.read_chunk(chunk_start, chunk_stop)
+
+                if pending:
+                    futures, pending_stop, pending_rows = pending
+                    written = self.finish_chunk(futures, pending_stop)
+                    self.rows_read += pending_rows
+                    self.next_start = pending_stop
+                    self.save_checkpoint()
+
+                    done = (pending_stop - self.start).total_seconds()
+                    elapsed = time.monotonic() - started
+                    rate = (done - done_at_start) / elapsed if elapsed else 0.0
+                    eta = (total - done) / rate if rate else float("inf")
+                    logger.info(
+                        f"{pending_stop.isoformat()} {100 * done / total:5.1f}% | "
+                        f"{pending_rows} rows -> {written} positions | "
+                        f"total {self.positions_written} | ETA {eta:.0f}s"
+                    )
+                    pending = None
+
+                if groups is not None:
+                    rows = sum(len(r) for _, r in groups.values())
+                    pending = (self.submit_chunk(executor, groups), chunk_stop, rows)
+                    chunk_start = chunk_stop
+
+        logger.info(
+            f"Reprocessing complete: {self.rows_read} rows, {self.positions_written} positions "
+            f"written to {self.bucket}/{self.measurement} in {time.monotonic() - started:.0f}s"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute historical medicine positions")
+    parser.add_argument("--start", required=True, help="ISO start time (UTC if no offset)")
+    parser.add_argument("--stop", required=True, help="ISO stop time (exclusive)")
+    parser.add_argument("--measurement", default="medicine_position_reprocessed",
+                        help="Measurement to write recomputed positions to")
+    parser.add_argument("--bucket", default=settings.INFLUXDB_BUCKET,
+                        help="Bucket to write to (default: the source bucket)")
+    parser.add_argument("--chunk-hours", type=float, default=6.0, help="Hours of history per read")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Solver processes")
+    parser.add_argument("--write-batch", type=int, default=10000, help="Points per write request")
+    parser.add_argument("--checkpoint", default="reprocess_checkpoint.json", help="Checkpoint file")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--source-rssi-reference", type=int,
+                        help="RSSI_REFERENCE the stored distances were computed with; "
+                             "when given, distances are rescaled to the current settings")
+    parser.add_argument("--source-path-loss-exponent", type=float, default=settings.PATH_LOSS_EXPONENT,
+                        help="PATH_LOSS_EXPONENT the stored distances were computed with")
+    args = parser.parse_args(argv)
+
+    if args.bucket == settings.INFLUXDB_BUCKET and args.measurement == "medicine_position":
+        parser.error("refusing to overwrite live medicine_position data; choose another measurement or bucket")
+
+    start, stop = _parse_time(args.start), _parse_time(args.stop)
+    if stop <= start:
+        parser.error("--stop must be after --start")
+
+    params = {
+        "receivers": {rid: list(pos) for rid, pos in ReceiverRegistry.from_settings(settings).geometry.positions.items()},
+        "buffer_timeout_seconds": settings.BUFFER_TIMEOUT_SECONDS,
+        "calculation_interval": settings.POSITION_CALCULATION_INTERVAL,
+        "rssi_reference": settings.RSSI_REFERENCE,
+        "path_loss_exponent": settings.PATH_LOSS_EXPONENT,
+        "source_rssi_reference": args.source_rssi_reference,
+        "source_path_loss_exponent": args.source_path_loss_exponent,
+    }
+
+    database = Database(
+        url=settings.INFLUXDB_URL,
+        token=settings.INFLUXDB_TOKEN,
+        org=settings.INFLUXDB_ORG,
+        bucket=settings.INFLUXDB_BUCKET
+    )
+    database.connect()
+
+    reprocessor = Reprocessor(
+        database,
+        start=start,
+        stop=stop,
+        measurement=args.measurement,
+        bucket=args.bucket,
+        chunk=timedelta(hours=args.chunk_hours),
+        workers=args.workers,
+        write_batch=args.write_batch,
+        checkpoint_path=args.checkpoint,
+        params=params
+    )
+    if not args.fresh:
+        reprocessor.load_checkpoint()
+
+    try:
+        reprocessor.run()
+    except KeyboardInterrupt:
+        logger.warning(f"Interrupted; rerun the same command to resume from {reprocessor.next_start.isoformat()}")
+        return 1
+    finally:
+        database.close()
+
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
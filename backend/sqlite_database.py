@@ -0,0 +1,925 @@
+"""SQLite storage backend for the Medical Tracker IoT backend.
+
+This module provides SQLiteDatabase, a drop-in alternative to the InfluxDB
+Database class with the same write_*/query_* surface, for small sites that
+do not run InfluxDB and for fully local tests and benchmarks. The schema
+follows database/database_setup.py, and the daily rssi_readings
+partitions (naming and DDL) come from database/partitions.py.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from hot_logging import category
+
+# database/ is a sibling script directory rather than a package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database"))
+from partitions import (  # noqa: E402
+    PARTITION_COLUMNS,
+    PARTITION_DDL,
+    PARTITION_RE,
+    migrate_legacy_table,
+    partition_name
+)
+
+logger = logging.getLogger(__name__)
+write_log = category("db_write")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS medicine_tags(
+        tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mac_address TEXT UNIQUE NOT NULL,
+        medicine_name TEXT NOT NULL,
+        medicine_type TEXT NOT NULL DEFAULT 'unknown',
+        registered_at TEXT DEFAULT (datetime('now'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS receivers(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        receiver_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        x_position REAL NOT NULL,
+        y_position REAL NOT NULL,
+        floor_level INTEGER DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS locations(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        x_coordinate REAL,
+        y_coordinate REAL,
+        z_coordinate REAL,
+        accuracy REAL,
+        receiver_count INTEGER,
+        zone_name TEXT,
+        calculation_method TEXT,
+        timestamp TEXT DEFAULT (datetime('now')),
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS temperature_logs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        temperature REAL NOT NULL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alerts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        alert_type TEXT NOT NULL,
+        message TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        metadata TEXT,
+        timestamp TEXT DEFAULT (datetime('now')),
+        acknowledged INTEGER DEFAULT 0,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS link_quality(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        receiver_id TEXT NOT NULL,
+        received INTEGER NOT NULL,
+        expected INTEGER NOT NULL,
+        lost INTEGER NOT NULL,
+        duplicates INTEGER NOT NULL,
+        reordered INTEGER NOT NULL,
+        resets INTEGER NOT NULL,
+        max_reorder_depth INTEGER,
+        window_ratio REAL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    # Indexes backing the query_* methods (time-range scans and per-tag history)
+    "CREATE INDEX IF NOT EXISTS idx_locations_time ON locations(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_locations_tag_time ON locations(tag_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_temperature_logs_tag_time ON temperature_logs(tag_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_temperature_logs_time ON temperature_logs(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_link_quality_receiver_time ON link_quality(receiver_id, timestamp)",
+]
+
+# Columns added since database/database_setup.py first created these tables;
+# CREATE TABLE IF NOT EXISTS leaves an existing table as it was
+_ADDED_COLUMNS = {
+    "locations": ("z_coordinate REAL", "accuracy REAL", "receiver_count INTEGER"),
+    "alerts": ("metadata TEXT",),
+}
+
+# rssi_readings is split into one table per UTC day (rssi_readings_YYYYMMDD)
+# with a covering (tag_id, timestamp, ...) index, so recent-history queries
+# only touch the newest partitions and retention drops whole tables
+# (naming and DDL live in database/partitions.py).
+_INSERT_READING = "INSERT INTO {name} (" + PARTITION_COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_TEMPERATURE = """
+    INSERT INTO temperature_logs (tag_id, temperature, timestamp) VALUES (?, ?, ?)
+"""
+_INSERT_LOCATION = """
+    INSERT INTO locations
+        (tag_id, x_coordinate, y_coordinate, z_coordinate, accuracy,
+         receiver_count, calculation_method, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_LINK_QUALITY = """
+    INSERT INTO link_quality
+        (tag_id, receiver_id, received, expected, lost, duplicates, reordered,
+         resets, max_reorder_depth, window_ratio, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_ALERT = """
+    INSERT INTO alerts (tag_id, alert_type, message, severity, metadata, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Status rows joined with their tag and (same-instant) temperature reading;
+# {readings} is a partition table or a UNION ALL over several
+_STATUS_SELECT = """
+    SELECT r.timestamp, m.mac_address, m.medicine_name, r.receiver_id, r.distance,
+           t.temperature, r.battery, r.moving, r.sequence_number
+    FROM {readings} r
+    JOIN medicine_tags m ON m.tag_id = r.tag_id
+    LEFT JOIN temperature_logs t ON t.tag_id = r.tag_id AND t.timestamp = r.timestamp
+"""
+
+
+def _ts(value: Optional[datetime] = None) -> str:
+    """Format a UTC timestamp so that string order matches time order."""
+    return (value or datetime.utcnow()).isoformat(sep=" ", timespec="microseconds")
+
+
+def _parse_ts(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+class SQLiteDatabase:
+    """SQLite storage with the same interface as the InfluxDB Database.
+
+    Writes are queued in memory and committed with executemany in a single
+    transaction once batch_size rows are pending or every flush_interval
+    seconds, whichever comes first. Queries flush pending rows first so
+    callers always read their own writes. Partitions older than
+    retention_days are dropped hourly by the flush thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        retention_days: int = 30
+    ) -> None:
+        """Initialize the SQLite wrapper without opening the file.
+
+        Args:
+            path: Path to the SQLite database file.
+            batch_size: Pending rows that trigger an immediate flush.
+            flush_interval: Maximum seconds a row waits before being committed.
+            retention_days: Days of rssi_readings partitions to keep (0 keeps all).
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._partitions: Set[str] = set()
+        self._last_retention = 0.0
+
+        self.conn: Optional[sqlite3.Connection] = None
+        self.last_error: Optional[str] = None
+
+        self._lock = threading.RLock()
+        self._tag_ids: Dict[str, int] = {}
+        # SQL statement -> pending parameter tuples
+        self._pending: Dict[str, List[tuple]] = {}
+        self._pending_count = 0
+
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_stop = threading.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether connect() has succeeded and the database can be used."""
+        return self.conn is not None
+
+    def connect(self) -> None:
+        """Open the database, apply the schema and start the flush thread.
+
+        Raises:
+            ConnectionError: If the database cannot be opened.
+        """
+        try:
+            conn = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                cached_statements=128
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                self._migrate_columns(conn)
+                self._migrate_legacy_readings(conn)
+                self._partitions = {
+                    name for (name,) in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type='table'"
+                    ) if PARTITION_RE.match(name)
+                }
+                self._ensure_partition(conn, partition_name(_ts()))
+                self._rebuild_view(conn)
+
+            self._tag_ids = {
+                mac: tag_id for tag_id, mac in
+                conn.execute("SELECT tag_id, mac_address FROM medicine_tags")
+            }
+            self.conn = conn
+            self.last_error = None
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            logger.error(f"Failed to open SQLite database: {e}")
+            raise ConnectionError(f"Failed to open SQLite database {self.path}: {e}") from e
+
+        self._flush_stop.clear()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+        logger.info(f"Opened SQLite database at {self.path}")
+
+    def _ensure_partition(self, conn: sqlite3.Connection, name: str) -> None:
+        """Create a daily partition (and refresh the view) on first use."""
+        if name in self._partitions:
+            return
+        for statement in PARTITION_DDL:
+            conn.execute(statement.format(name=name))
+        self._partitions.add(name)
+        self._rebuild_view(conn)
+
+    def _rebuild_view(self, conn: sqlite3.Connection) -> None:
+        """Recreate the rssi_readings view over all partitions."""
+        conn.execute("DROP VIEW IF EXISTS rssi_readings")
+        if self._partitions:
+            union = " UNION ALL ".join(f"SELECT * FROM {name}" for name in sorted(self._partitions))
+            conn.execute(f"CREATE VIEW rssi_readings AS {union}")
+
+    def _migrate_columns(self, conn: sqlite3.Connection) -> None:
+        """Add the columns in _ADDED_COLUMNS to tables created without them."""
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column.split()[0] not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                    logger.info(f"Added column {column.split()[0]} to {table}")
+
+    def _migrate_legacy_readings(self, conn: sqlite3.Connection) -> None:
+        """Move rows from a pre-partitioning rssi_readings table into partitions."""
+        days = migrate_legacy_table(conn.cursor())
+        if days:
+            logger.info(f"Migrated legacy rssi_readings table into {days} daily partitions")
+
+    def _readings_source(self, since: str, until: Optional[str] = None) -> Optional[str]:
+        """FROM clause covering only the partitions that can hold rows in [since, until)."""
+        first = partition_name(since)
+        last = partition_name(until) if until else None
+        # Writers add partitions under the lock (at the first write of a day)
+        with self._lock:
+            partitions = sorted(self._partitions)
+        names = [name for name in partitions if name >= first and (last is None or name <= last)]
+        if not names:
+            return None
+        if len(names) == 1:
+            return names[0]
+        return "(" + " UNION ALL ".join(f"SELECT * FROM {name}" for name in names) + ")"
+
+    def drop_expired_partitions(self) -> List[str]:
+        """Drop rssi_readings partitions older than retention_days.
+
+        temperature_logs rows from the same days are deleted with them; the
+        table holds one row per scan and would otherwise grow without bound.
+
+        Returns:
+            Names of the dropped partitions.
+        """
+        if self.retention_days <= 0:
+            return []
+        cutoff_ts = _ts(datetime.utcnow() - timedelta(days=self.retention_days))
+        cutoff = partition_name(cutoff_ts)
+        with self._lock:
+            expired = sorted(name for name in self._partitions if name < cutoff)
+            if expired:
+                self.flush()
+                with self.conn:
+                    for name in expired:
+                        self.conn.execute(f"DROP TABLE {name}")
+                        self._partitions.discard(name)
+                    self._rebuild_view(self.conn)
+        if expired:
+            logger.info(f"Retention dropped {len(expired)} rssi_readings partitions: {', '.join(expired)}")
+
+        # Whole days only, matching the partitions (cutoff_ts[:10] sorts before that day's rows)
+        deleted = self._expire_temperature_logs(cutoff_ts[:10])
+        if deleted:
+            logger.info(f"Retention deleted {deleted} temperature_logs rows before {cutoff_ts[:10]}")
+        return expired
+
+    def _expire_temperature_logs(self, before: str, batch: int = 5000) -> int:
+        """Delete temperature_logs rows older than before, batch rows per transaction.
+
+        The lock is released between batches so writers are not held up
+        for the whole of a large first expiry.
+        """
+        deleted = 0
+        while True:
+            with self._lock:
+                with self.conn:
+                    count = self.conn.execute(
+                        "DELETE FROM temperature_logs WHERE id IN "
+                        "(SELECT id FROM temperature_logs WHERE timestamp < ? LIMIT ?)",
+                        (before, batch)
+                    ).rowcount
+            deleted += count
+            if count < batch:
+                return deleted
+
+    def _flush_loop(self) -> None:
+        """Commit pending rows at least every flush_interval seconds."""
+        while not self._flush_stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() - self._last_retention >= 3600:
+                    self._last_retention = time.monotonic()
+                    self.drop_expired_partitions()
+            except Exception as e:
+                logger.error(f"SQLite flush failed: {e}")
+
+    def flush(self) -> None:
+        """Commit all pending rows in one transaction."""
+        with self._lock:
+            if not self._pending_count:
+                return
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+            with self.conn:
+                for statement, rows in pending.items():
+                    self.conn.executemany(statement, rows)
+
+    def _queue(self, statement: str, row: tuple) -> None:
+        with self._lock:
+            self._pending.setdefault(statement, []).append(row)
+            self._pending_count += 1
+            if self._pending_count >= self.batch_size:
+                self.flush()
+
+    def _tag_id(self, mac: str, medicine: Optional[str]) -> int:
+        """Return the tag_id for a MAC, registering the tag on first sight."""
+        tag_id = self._tag_ids.get(mac)
+        if tag_id is not None:
+            return tag_id
+
+        with self._lock:
+            with self.conn:
+                # medicine_type has no default in tables made by the original setup script
+                self.conn.execute(
+                    """
+                    INSERT INTO medicine_tags (mac_address, medicine_name, medicine_type)
+                    VALUES (?, ?, 'unknown')
+                    ON CONFLICT(mac_address) DO NOTHING
+                    """,
+                    (mac, medicine or "unknown")
+                )
+            tag_id = self.conn.execute(
+                "SELECT tag_id FROM medicine_tags WHERE mac_address = ?", (mac,)
+            ).fetchone()[0]
+            self._tag_ids[mac] = tag_id
+            return tag_id
+
+    def write_scan(
+        self,
+        mac: str,
+        receiver_id: str,
+        distance: float,
+        medicine: str,
+        temperature: Optional[float] = None,
+        battery: Optional[int] = None,
+        moving: bool = False,
+        sequence_number: Optional[int] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Queue raw medicine scan data from a receiver.
+
+        See Database.write_scan for argument details.
+
+        Returns:
+            bool: True if the scan was queued, False otherwise.
+        """
+        try:
+            tag_id = self._tag_id(mac, medicine)
+            ts = _ts(timestamp)
+            partition = partition_name(ts)
+            if partition not in self._partitions:
+                with self._lock:
+                    self.flush()
+                    with self.conn:
+                        self._ensure_partition(self.conn, partition)
+            self._queue(_INSERT_READING.format(name=partition), (
+                tag_id, receiver_id, None, distance, battery, int(bool(moving)), ts, sequence_number
+            ))
+            if temperature is not None:
+                self._queue(_INSERT_TEMPERATURE, (tag_id, temperature, ts))
+            write_log.debug("Queued scan for %s from %s", mac, receiver_id)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write scan: {e}")
+            return False
+
+    def write_position(
+        self,
+        mac: str,
+        x: float,
+        y: float,
+        z: float,
+        accuracy: float,
+        medicine: str,
+        receiver_count: int,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Queue a calculated position for a medicine.
+
+        See Database.write_position for argument details.
+
+        Returns:
+            bool: True if the position was queued, False otherwise.
+        """
+        try:
+            tag_id = self._tag_id(mac, medicine)
+            self._queue(_INSERT_LOCATION, (
+                tag_id, x, y, z, accuracy, receiver_count, "trilateration", _ts(timestamp)
+            ))
+            write_log.info("Wrote position for %s: (%.2f, %.2f, %.2f)", mac, x, y, z)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write position: {e}")
+            return False
+
+    def write_positions(self, positions: List[Dict[str, Any]]) -> bool:
+        """Queue several calculated positions at once.
+
+        See Database.write_positions for argument details.
+
+        Returns:
+            bool: True if the positions were queued, False otherwise.
+        """
+        try:
+            rows = [
+                (
+                    self._tag_id(p["mac"], p["medicine"]), p["x"], p["y"], p["z"],
+                    p["accuracy"], p["receiver_count"], "trilateration", _ts(p.get("timestamp"))
+                )
+                for p in positions
+            ]
+            with self._lock:
+                self._pending.setdefault(_INSERT_LOCATION, []).extend(rows)
+                self._pending_count += len(rows)
+                if self._pending_count >= self.batch_size:
+                    self.flush()
+            write_log.info("Wrote %d positions", len(rows))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(positions)} positions: {e}")
+            return False
+
+    def write_alert(
+        self,
+        mac: str,
+        alert_type: str,
+        message: str,
+        severity: str = "warning",
+        medicine: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None
+    ) -> bool:
+        """Store an alert for a medicine.
+
+        Alerts are committed immediately rather than batched.
+        See Database.write_alert for argument details.
+
+        Returns:
+            bool: True if write was successful, False otherwise.
+        """
+        try:
+            tag_id = self._tag_id(mac, medicine)
+            with self._lock:
+                self.flush()
+                with self.conn:
+                    self.conn.execute(_INSERT_ALERT, (
+                        tag_id, alert_type, message, severity,
+                        json.dumps(metadata, default=str) if metadata else None,
+                        _ts(timestamp)
+                    ))
+            logger.warning(f"Wrote alert for {mac}: {alert_type} - {message}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write alert: {e}")
+            return False
+
+    def write_link_stats(self, links: List[Dict[str, Any]]) -> bool:
+        """Queue one summary interval of per-link reception counters.
+
+        See Database.write_link_stats for argument details.
+
+        Returns:
+            bool: True if the summaries were queued, False otherwise.
+        """
+        try:
+            ts = _ts()
+            rows = [
+                (
+                    self._tag_id(link["mac"], None), link["receiver_id"], link["received"],
+                    link["expected"], link["lost"], link["duplicates"], link["reordered"],
+                    link["resets"], link["max_reorder_depth"], link["window_ratio"], ts
+                )
+                for link in links
+            ]
+            with self._lock:
+                self._pending.setdefault(_INSERT_LINK_QUALITY, []).extend(rows)
+                self._pending_count += len(rows)
+                if self._pending_count >= self.batch_size:
+                    self.flush()
+            write_log.info("Wrote %d link quality summaries", len(rows))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(links)} link quality summaries: {e}")
+            return False
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._lock:
+            self.flush()
+            return self.conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _status_record(row: tuple) -> Dict[str, Any]:
+        ts, mac, medicine, receiver_id, distance, temperature, battery, moving, seq = row
+        return {
+            "time": _parse_ts(ts),
+            "mac": mac,
+            "medicine": medicine,
+            "receiver_id": receiver_id,
+            "distance": distance,
+            "temperature": temperature,
+            "battery": battery,
+            "moving": bool(moving),
+            "sequence_number": seq
+        }
+
+    def query_all_data(
+        self,
+        minutes: int = 60
+    ) -> List[Dict[str, Any]]:
+        """Get all raw scan data from the last `minutes` minutes."""
+        try:
+            since = _ts(datetime.utcnow() - timedelta(minutes=minutes))
+            source = self._readings_source(since)
+            if source is None:
+                return []
+            rows = self._query(
+                _STATUS_SELECT.format(readings=source) + " WHERE r.timestamp >= ? ORDER BY r.timestamp",
+                (since,)
+            )
+            results = [self._status_record(row) for row in rows]
+            logger.info(f"Retrieved {len(results)} records from last {minutes} minutes")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to query all data: {e}")
+            return []
+
+    def query_latest_status(
+        self,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Get the latest raw scan data for each medicine seen in the last hour."""
+        try:
+            since = _ts(datetime.utcnow() - timedelta(hours=1))
+            source = self._readings_source(since)
+            if source is None:
+                return []
+            # SQLite returns the other columns from the row holding MAX(timestamp)
+            rows = self._query(
+                f"""
+                SELECT MAX(r.timestamp), m.mac_address, m.medicine_name, r.receiver_id,
+                       r.distance, t.temperature, r.battery, r.moving, r.sequence_number
+                FROM {source} r
+                JOIN medicine_tags m ON m.tag_id = r.tag_id
+                LEFT JOIN temperature_logs t ON t.tag_id = r.tag_id AND t.timestamp = r.timestamp
+                WHERE r.timestamp >= ?
+                GROUP BY r.tag_id
+                LIMIT ?
+                """,
+                (since, limit)
+            )
+            results = [self._status_record(row) for row in rows]
+            logger.info(f"Retrieved {len(results)} latest medicine statuses")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to query latest status: {e}")
+            return []
+
+    def query_latest_positions(
+        self,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Get the latest calculated position for each medicine in the last hour."""
+        try:
+            rows = self._query(
+                """
+                SELECT m.mac_address, m.medicine_name, l.x_coordinate, l.y_coordinate,
+                       l.z_coordinate, l.accuracy, l.receiver_count, MAX(l.timestamp)
+                FROM locations l
+                JOIN medicine_tags m ON m.tag_id = l.tag_id
+                WHERE l.timestamp >= ?
+                GROUP BY l.tag_id
+                LIMIT ?
+                """,
+                (_ts(datetime.utcnow() - timedelta(hours=1)), limit)
+            )
+            results = [
+                {
+                    "mac": mac,
+                    "medicine": medicine,
+                    "x": x,
+                    "y": y,
+                    "z": z,
+                    "accuracy": accuracy,
+                    "receiver_count": receiver_count,
+                    "time": _parse_ts(ts)
+                }
+                for mac, medicine, x, y, z, accuracy, receiver_count, ts in rows
+            ]
+            logger.debug(f"Retrieved {len(results)} latest positions")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to query latest positions: {e}")
+            return []
+
+    def query_medicine_history(
+        self,
+        mac: str,
+        hours: int = 24
+    ) -> List[Dict[str, Any]]:
+        """Get position and status history for a specific medicine."""
+        try:
+            since = _ts(datetime.utcnow() - timedelta(hours=hours))
+            tag_id = self._tag_ids.get(mac)
+            if tag_id is None:
+                return []
+
+            results = []
+            source = self._readings_source(since)
+            rows = self._query(
+                _STATUS_SELECT.format(readings=source) + " WHERE r.tag_id = ? AND r.timestamp >= ?",
+                (tag_id, since)
+            ) if source else []
+            for row in rows:
+                record = self._status_record(row)
+                record["measurement"] = "medicine_status"
+                results.append(record)
+
+            for ts, x, y, z, accuracy, receiver_count in self._query(
+                """
+                SELECT timestamp, x_coordinate, y_coordinate, z_coordinate, accuracy, receiver_count
+                FROM locations WHERE tag_id = ? AND timestamp >= ?
+                """,
+                (tag_id, since)
+            ):
+                results.append({
+                    "measurement": "medicine_position",
+                    "time": _parse_ts(ts),
+                    "mac": mac,
+                    "x": x,
+                    "y": y,
+                    "z": z,
+                    "accuracy": accuracy,
+                    "receiver_count": receiver_count
+                })
+
+            results.sort(key=lambda x: x["time"])
+            logger.debug(f"Retrieved {len(results)} history records for {mac}")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to query medicine history: {e}")
+            return []
+
+    def query_histories(
+        self,
+        macs: Optional[List[str]] = None,
+        medicine: Optional[str] = None,
+        hours: int = 24
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get position and status history for several medicines in one query each.
+
+        See Database.query_histories for argument details.
+        """
+        histories: Dict[str, List[Dict[str, Any]]] = {mac: [] for mac in macs or ()}
+        try:
+            since = _ts(datetime.utcnow() - timedelta(hours=hours))
+            where, params = ["r.timestamp >= ?"], [since]
+            if macs:
+                tag_ids = [self._tag_ids[mac] for mac in macs if mac in self._tag_ids]
+                if not tag_ids:
+                    return histories
+                where.append(f"r.tag_id IN ({', '.join('?' * len(tag_ids))})")
+                params.extend(tag_ids)
+            if medicine:
+                where.append("m.medicine_name = ?")
+                params.append(medicine)
+            condition = " AND ".join(where)
+
+            source = self._readings_source(since)
+            rows = self._query(
+                _STATUS_SELECT.format(readings=source) + f" WHERE {condition}", tuple(params)
+            ) if source else []
+            for row in rows:
+                record = self._status_record(row)
+                record["measurement"] = "medicine_status"
+                histories.setdefault(record["mac"], []).append(record)
+
+            for ts, mac, x, y, z, accuracy, receiver_count in self._query(
+                f"""
+                SELECT r.timestamp, m.mac_address, r.x_coordinate, r.y_coordinate, r.z_coordinate,
+                       r.accuracy, r.receiver_count
+                FROM locations r JOIN medicine_tags m ON m.tag_id = r.tag_id
+                WHERE {condition}
+                """,
+                tuple(params)
+            ):
+                histories.setdefault(mac, []).append({
+                    "measurement": "medicine_position",
+                    "time": _parse_ts(ts),
+                    "mac": mac,
+                    "x": x,
+                    "y": y,
+                    "z": z,
+                    "accuracy": accuracy,
+                    "receiver_count": receiver_count
+                })
+
+            for records in histories.values():
+                records.sort(key=lambda x: x["time"])
+            logger.debug(
+                f"Retrieved {sum(map(len, histories.values()))} history records for {len(histories)} tags"
+            )
+            return histories
+        except Exception as e:
+            logger.error(f"Failed to query medicine histories: {e}")
+            return {}
+
+    def query_medicine_macs(self, medicine: str, hours: int = 24) -> List[str]:
+        """Get the MACs of the tags registered for a medicine.
+
+        Tags are registered once, so `hours` is ignored; tags without
+        records in the window come back from query_histories() empty.
+        """
+        try:
+            return [
+                mac for (mac,) in self._query(
+                    "SELECT mac_address FROM medicine_tags WHERE medicine_name = ?", (medicine,)
+                )
+            ]
+        except Exception as e:
+            logger.error(f"Failed to query tags of {medicine}: {e}")
+            return []
+
+    def query_alerts(
+        self,
+        hours: int = 24,
+        severity: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Query alerts from the last `hours` hours, newest first."""
+        sql = """
+            SELECT m.mac_address, a.alert_type, a.severity, a.message, m.medicine_name, a.timestamp
+            FROM alerts a
+            JOIN medicine_tags m ON m.tag_id = a.tag_id
+            WHERE a.timestamp >= ?
+        """
+        params: tuple = (_ts(datetime.utcnow() - timedelta(hours=hours)),)
+        if severity:
+            sql += " AND a.severity = ?"
+            params += (severity,)
+        sql += " ORDER BY a.timestamp DESC LIMIT ?"
+        params += (limit,)
+
+        try:
+            results = [
+                {
+                    "mac": mac,
+                    "alert_type": alert_type,
+                    "severity": sev,
+                    "message": message,
+                    "medicine": medicine,
+                    "time": _parse_ts(ts)
+                }
+                for mac, alert_type, sev, message, medicine, ts in self._query(sql, params)
+            ]
+            logger.debug(f"Retrieved {len(results)} alerts")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to query alerts: {e}")
+            return []
+
+    def iter_export(
+        self,
+        measurement: str,
+        start: datetime,
+        stop: datetime
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream every record of one measurement in [start, stop), oldest first.
+
+        Rows are fetched from the cursor as they are consumed, so memory stays
+        flat for any range. See Database.iter_export; errors propagate.
+        """
+        since = _ts(start.astimezone(timezone.utc).replace(tzinfo=None))
+        until = _ts(stop.astimezone(timezone.utc).replace(tzinfo=None))
+        if measurement == "medicine_status":
+            source = self._readings_source(since, until)
+            if source is None:
+                return
+            sql = _STATUS_SELECT.format(readings=source) + (
+                " WHERE r.timestamp >= ? AND r.timestamp < ? ORDER BY r.timestamp"
+            )
+            convert = self._status_record
+        elif measurement == "medicine_position":
+            sql = """
+                SELECT l.timestamp, m.mac_address, m.medicine_name, l.x_coordinate, l.y_coordinate,
+                       l.z_coordinate, l.accuracy, l.receiver_count
+                FROM locations l JOIN medicine_tags m ON m.tag_id = l.tag_id
+                WHERE l.timestamp >= ? AND l.timestamp < ? ORDER BY l.timestamp
+            """
+
+            def convert(row: tuple) -> Dict[str, Any]:
+                ts, mac, medicine, x, y, z, accuracy, receiver_count = row
+                return {
+                    "time": _parse_ts(ts), "mac": mac, "medicine": medicine, "x": x, "y": y, "z": z,
+                    "accuracy": accuracy, "receiver_count": receiver_count
+                }
+        elif measurement == "alerts":
+            sql = """
+                SELECT a.timestamp, m.mac_address, m.medicine_name, a.alert_type, a.severity, a.message
+                FROM alerts a JOIN medicine_tags m ON m.tag_id = a.tag_id
+                WHERE a.timestamp >= ? AND a.timestamp < ? ORDER BY a.timestamp
+            """
+
+            def convert(row: tuple) -> Dict[str, Any]:
+                ts, mac, medicine, alert_type, severity, message = row
+                return {
+                    "time": _parse_ts(ts), "mac": mac, "medicine": medicine,
+                    "alert_type": alert_type, "severity": severity, "message": message
+                }
+        else:
+            raise ValueError(f"Unknown measurement: {measurement}")
+
+        with self._lock:
+            self.flush()
+        # A separate read connection, so the writer lock is not held while the
+        # caller consumes rows (WAL lets it read alongside the flush thread)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            for row in conn.execute(sql, (since, until)):
+                yield convert(row)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        """Flush pending rows and close the database."""
+        if self.conn is None:
+            return
+        try:
+            self._flush_stop.set()
+            if self._flush_thread:
+                self._flush_thread.join(timeout=5.0)
+            self.flush()
+            self.conn.close()
+            self.conn = None
+            logger.info("SQLite database closed")
+        except Exception as e:
+            logger.error(f"Error closing SQLite database: {e}")
+
+    def __enter__(self) -> "SQLiteDatabase":
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Context manager exit."""
+        self.close()
@@ -0,0 +1,59 @@
+"""Storage backend selection shared by the API and the command line tools.
+
+Kept out of main.py so that tools such as export.py can build the same
+backend without importing the app, which configures logging on import.
+"""
+
+from config import settings
+from database import Database
+
+
+def create_database() -> Database:
+    """Create the storage backend selected by STORAGE_BACKEND.
+
+    Returns:
+        Database (InfluxDB) or SQLiteDatabase instance, not yet connected,
+        wrapped in a SampledDatabase when any persistence policy samples and
+        in a HotTierDatabase when HOT_WINDOW_MINUTES is set. The hot tier
+        sits on top, so it keeps every write even when storage samples.
+
+    Raises:
+        ValueError: If STORAGE_BACKEND is not a known backend or a
+            persistence policy is invalid.
+    """
+    backend = _create_backend()
+    policies = (
+        settings.PERSIST_STATUS_POLICY,
+        settings.PERSIST_POSITION_POLICY,
+        settings.PERSIST_ALERT_POLICY,
+    )
+    if any(policy.strip().lower() != "all" for policy in policies):
+        from persistence import SampledDatabase
+        backend = SampledDatabase(backend, *policies)
+    if settings.HOT_WINDOW_MINUTES > 0:
+        from hot_store import HotTierDatabase
+        return HotTierDatabase(
+            backend,
+            window_minutes=settings.HOT_WINDOW_MINUTES,
+            memory_budget_mb=settings.HOT_WINDOW_MEMORY_MB
+        )
+    return backend
+
+
+def _create_backend() -> Database:
+    if settings.STORAGE_BACKEND == "influxdb":
+        return Database(
+            url=settings.INFLUXDB_URL,
+            token=settings.INFLUXDB_TOKEN,
+            org=settings.INFLUXDB_ORG,
+            bucket=settings.INFLUXDB_BUCKET
+        )
+    if settings.STORAGE_BACKEND == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(
+            path=settings.SQLITE_PATH,
+            batch_size=settings.SQLITE_BATCH_SIZE,
+            flush_interval=settings.SQLITE_FLUSH_INTERVAL,
+            retention_days=settings.SQLITE_RETENTION_DAYS
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
@@ -0,0 +1,105 @@
+"""Fingerprint survey tool.
+
+Stand at a known position with a tag, run this script, and it records the
+tag's RSSI at every receiver for a while, then stores the averaged vector
+as one survey point in the fingerprint database used by LOCALIZATION_MODE=
+fingerprint. Repeat on a grid (every 1-2 m works well) covering the wards.
+
+Usage:
+    python survey.py --mac AA:BB:CC:DD:EE:FF --x 3.5 --y 7.0 --z 1.0 --label "Ward 2 cabinet"
+"""
+
+import argparse
+import json
+import logging
+import ssl
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import paho.mqtt.client as mqtt
+
+from config import settings
+from fingerprint import save_survey_point
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("survey")
+
+
+def record(mac: str, seconds: float) -> Dict[str, List[float]]:
+    """Collect RSSI samples for one tag from every receiver."""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    mac = mac.upper()
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(settings.MQTT_TOPIC)
+        else:
+            logger.error(f"MQTT connection failed with code {rc}")
+
+    def on_message(client, userdata, message):
+        try:
+            payload = json.loads(message.payload.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return
+        # Batched receivers (Pico) send {"scans": [...]}; others send one scan
+        for scan in payload.get("scans") or [payload]:
+            if str(scan.get("mac", "")).upper() != mac or scan.get("rssi") is None:
+                continue
+            receiver_id = scan.get("receiver_id") or payload.get("receiver_id") or message.topic.split("/")[-1]
+            samples[receiver_id].append(float(scan["rssi"]))
+
+    client = mqtt.Client(client_id=f"fingerprint_survey_{int(time.time())}")
+    if settings.MQTT_USERNAME:
+        client.username_pw_set(settings.MQTT_USERNAME, settings.MQTT_PASSWORD)
+    if settings.MQTT_CA_CERT:
+        client.tls_set(ca_certs=settings.MQTT_CA_CERT, tls_version=ssl.PROTOCOL_TLS_CLIENT)
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    client.connect(settings.MQTT_HOST, settings.MQTT_PORT)
+    client.loop_start()
+    try:
+        time.sleep(seconds)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Record an RSSI fingerprint at a known position")
+    parser.add_argument("--mac", required=True, help="MAC of the tag carried by the surveyor")
+    parser.add_argument("--x", type=float, required=True)
+    parser.add_argument("--y", type=float, required=True)
+    parser.add_argument("--z", type=float, default=1.0)
+    parser.add_argument("--label", help="Optional location label")
+    parser.add_argument("--seconds", type=float, default=30.0, help="How long to record")
+    parser.add_argument("--min-samples", type=int, default=5,
+                        help="Drop receivers with fewer samples than this")
+    parser.add_argument("--db", default=settings.FINGERPRINT_DB_PATH, help="Fingerprint database")
+    args = parser.parse_args(argv)
+
+    logger.info(f"Recording {args.mac} at ({args.x}, {args.y}, {args.z}) for {args.seconds:.0f}s...")
+    samples = {
+        receiver_id: values
+        for receiver_id, values in record(args.mac, args.seconds).items()
+        if len(values) >= args.min_samples
+    }
+    if len(samples) < 2:
+        logger.error(f"Only {len(samples)} receivers heard the tag often enough; nothing saved")
+        return 1
+
+    for receiver_id, values in sorted(samples.items()):
+        logger.info(f"  {receiver_id}: {sum(values) / len(values):.1f} dBm over {len(values)} samples")
+    point_id = save_survey_point(args.db, (args.x, args.y, args.z), samples, args.label)
+    logger.info(f"Saved survey point {point_id} to {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Tests for SQLiteDatabase on databases made by the original setup script.
+
+Run from backend/ (modules here import each other by name):
+    python -m pytest test_sqlite_database.py
+"""
+
+import sqlite3
+
+import pytest
+
+from sqlite_database import SQLiteDatabase
+
+# Tables as the original database/database_setup.py created them
+BASELINE_DDL = (
+    """
+    CREATE TABLE medicine_tags(
+        tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mac_address TEXT UNIQUE NOT NULL,
+        medicine_name TEXT NOT NULL,
+        medicine_type TEXT NOT NULL,
+        registered_at TEXT DEFAULT (datetime('now'))
+    )
+    """,
+    """
+    CREATE TABLE rssi_readings(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        receiver_id TEXT NOT NULL,
+        rssi INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        sequence_number INTEGER NOT NULL,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id),
+        UNIQUE(tag_id, receiver_id, sequence_number)
+    )
+    """,
+    """
+    CREATE TABLE locations(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        x_coordinate REAL,
+        y_coordinate REAL,
+        zone_name TEXT,
+        calculation_method TEXT,
+        timestamp TEXT DEFAULT (datetime('now')),
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    """
+    CREATE TABLE temperature_logs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        temperature REAL NOT NULL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    """
+    CREATE TABLE alerts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        alert_type TEXT NOT NULL,
+        message TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        timestamp TEXT DEFAULT (datetime('now')),
+        acknowledged INTEGER DEFAULT 0,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "hospital_iot.db"
+    with sqlite3.connect(path) as conn:
+        for statement in BASELINE_DDL:
+            conn.execute(statement)
+        conn.execute(
+            "INSERT INTO rssi_readings (tag_id, receiver_id, rssi, timestamp, sequence_number) "
+            "VALUES (1, 'rpi_a', -60, '2026-10-01 12:00:00', 1)"
+        )
+    conn.close()
+
+    database = SQLiteDatabase(str(path), retention_days=0)
+    database.connect()
+    yield database
+    database.close()
+
+
+def test_baseline_database_accepts_writes(db):
+    mac = "AA:BB:CC:DD:EE:FF"
+    assert db.write_scan(mac, "rpi_a", 1.5, "Insulin", temperature=4.0, battery=90, sequence_number=2)
+    assert db.write_position(mac, 1.0, 2.0, 1.2, 0.5, "Insulin", 3)
+    assert db.write_alert(mac, "temperature", "Too warm", medicine="Insulin", metadata={"limit": 8})
+
+    history = db.query_medicine_history(mac)
+    assert {r["measurement"] for r in history} == {"medicine_status", "medicine_position"}
+    position = next(r for r in history if r["measurement"] == "medicine_position")
+    assert (position["z"], position["accuracy"], position["receiver_count"]) == (1.2, 0.5, 3)
+    [alert] = db.query_alerts()
+    assert alert["alert_type"] == "temperature"
+    assert db.conn.execute(
+        "SELECT medicine_name, medicine_type FROM medicine_tags WHERE mac_address = ?", (mac,)
+    ).fetchone() == ("Insulin", "unknown")
+
+
+def test_baseline_readings_are_migrated(db):
+    assert db.conn.execute("SELECT COUNT(*) FROM rssi_readings_20261001").fetchone() == (1,)
@@ -0,0 +1,155 @@
+"""Topic router for the Medical Tracker IoT backend.
+
+Receivers publish on several topic families (full scans, RSSI-only
+readings, coordinator-fused readings, heartbeats), each with the receiver
+ID or MAC at a different level. TopicRouter compiles MQTT-style patterns
+into a level trie once, then maps each incoming topic to its handler and
+the wildcard levels it captured. Results are cached per topic, since a
+deployment only ever sees a bounded set of receiver topics.
+
+Pattern levels:
+    literal     matches that exact level
+    +           matches any one level, captured
+    +suffix     matches a level ending in suffix; the rest is captured
+                (e.g. "+_status" captures "pico" from "pico_status")
+    #           matches all remaining levels (last level only, not captured)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# handler(params, raw_payload, received_at)
+Handler = Callable[[Tuple[str, ...], bytes, Any], None]
+
+
+class Route:
+    """A compiled pattern and the handler it dispatches to."""
+
+    __slots__ = ("name", "pattern", "handler", "needs_storage")
+
+    def __init__(self, name: str, pattern: str, handler: Handler, needs_storage: bool) -> None:
+        self.name = name
+        self.pattern = pattern
+        self.handler = handler
+        self.needs_storage = needs_storage
+
+
+class _Node:
+    __slots__ = ("literals", "suffixes", "route", "rest")
+
+    def __init__(self) -> None:
+        self.literals: Dict[str, "_Node"] = {}
+        # (suffix, child) for "+" ("" suffix) and "+suffix" levels, longest suffix first
+        self.suffixes: List[Tuple[str, "_Node"]] = []
+        self.route: Optional[Route] = None
+        self.rest: Optional[Route] = None
+
+
+class TopicRouter:
+    """Maps topics to routes through a compiled level trie."""
+
+    def __init__(self, cache_size: int = 4096) -> None:
+        """Initialize an empty router.
+
+        Args:
+            cache_size: Topics whose match is cached before the cache is reset.
+        """
+        self.cache_size = cache_size
+        self._root = _Node()
+        self._cache: Dict[str, Optional[Tuple[Route, Tuple[str, ...]]]] = {}
+        self.routes: List[Route] = []
+
+    def add(self, pattern: str, name: str, handler: Handler, needs_storage: bool = True) -> Route:
+        """Compile a pattern into the trie.
+
+        Args:
+            pattern: MQTT-style topic pattern (see module docstring).
+            name: Route name, used in stats and logs.
+            handler: Called as handler(params, raw_payload, received_at).
+            needs_storage: False for routes that may run before storage is ready.
+
+        Returns:
+            Route: The compiled route.
+
+        Raises:
+            ValueError: If the pattern is malformed or already registered.
+        """
+        levels = pattern.split("/")
+        route = Route(name, pattern, handler, needs_storage)
+        node = self._root
+        for i, level in enumerate(levels):
+            if level == "#":
+                if i != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level: {pattern}")
+                if node.rest is not None:
+                    raise ValueError(f"Duplicate route pattern: {pattern}")
+                node.rest = route
+                break
+            if level.startswith("+"):
+                suffix = level[1:]
+                if "+" in suffix or "#" in suffix:
+                    raise ValueError(f"Invalid wildcard level '{level}' in {pattern}")
+                child = next((c for s, c in node.suffixes if s == suffix), None)
+                if child is None:
+                    child = _Node()
+                    node.suffixes.append((suffix, child))
+                    node.suffixes.sort(key=lambda entry: len(entry[0]), reverse=True)
+                node = child
+            else:
+                if "+" in level or "#" in level:
+                    raise ValueError(f"Invalid level '{level}' in {pattern}")
+                node = node.literals.setdefault(level, _Node())
+        else:
+            if node.route is not None:
+                raise ValueError(f"Duplicate route pattern: {pattern}")
+            node.route = route
+
+        self.routes.append(route)
+        self._cache.clear()
+        return route
+
+    def match(self, topic: str) -> Optional[Tuple[Route, Tuple[str, ...]]]:
+        """Find the route for a topic.
+
+        Literal levels win over wildcards, and longer suffixes over shorter.
+
+        Returns:
+            (route, params) with the captured wildcard levels in order, or
+            None if no route matches.
+        """
+        try:
+            return self._cache[topic]
+        except KeyError:
+            pass
+
+        result = self._walk(self._root, topic.split("/"), 0, ())
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[topic] = result
+        return result
+
+    def _walk(
+        self,
+        node: _Node,
+        levels: List[str],
+        i: int,
+        params: Tuple[str, ...]
+    ) -> Optional[Tuple[Route, Tuple[str, ...]]]:
+        if i == len(levels):
+            if node.route is not None:
+                return node.route, params
+            return (node.rest, params) if node.rest is not None else None
+
+        level = levels[i]
+        child = node.literals.get(level)
+        if child is not None:
+            found = self._walk(child, levels, i + 1, params)
+            if found is not None:
+                return found
+        for suffix, child in node.suffixes:
+            if suffix and not (len(level) > len(suffix) and level.endswith(suffix)):
+                continue
+            captured = level[:len(level) - len(suffix)] if suffix else level
+            found = self._walk(child, levels, i + 1, params + (captured,))
+            if found is not None:
+                return found
+        return (node.rest, params) if node.rest is not None else None
@@ -8,7 +8,10 @@ import logging
 import math
 from typing import Dict, List, Optional, Tuple
 
+from hot_logging import category
+
 logger = logging.getLogger(__name__)
+solve_log = category("trilateration")
 
 
 def rssi_to_distance(
@@ -58,10 +61,10 @@ def rssi_to_distance(
     # Sanity check: cap maximum distance
     max_distance = 100.0
     if distance > max_distance:
-        logger.debug(f"Capped distance from {distance:.2f}m to {max_distance}m")
+        logger.debug("Capped distance from %.2fm to %sm", distance, max_distance)
         return max_distance
 
-    logger.debug(f"RSSI {rssi} dBm -> Distance {distance:.2f}m")
+    logger.debug("RSSI %s dBm -> Distance %.2fm", rssi, distance)
     return distance
 
 
@@ -141,9 +144,9 @@ def trilaterate_weighted(
 
     calculated_position = (x_sum, y_sum, z_sum)
 
-    logger.info(
-        f"Trilateration calculated position: ({x_sum:.2f}, {y_sum:.2f}, {z_sum:.2f}) "
-        f"using {len(valid_receivers)} receivers"
+    solve_log.info(
+        "Trilateration calculated position: (%.2f, %.2f, %.2f) using %d receivers",
+        x_sum, y_sum, z_sum, len(valid_receivers)
     )
 
     return calculated_position
@@ -190,15 +193,16 @@ def calculate_position_error(
 
 
 def get_receiver_positions() -> Dict[str, Tuple[float, float, float]]:
-    """Get default receiver positions for the medical tracker system.
+    """Get the current receiver positions for the medical tracker system.
+
+    Receivers live in the receiver registry (see receivers.py); this reads
+    a fresh snapshot from it rather than keeping a copy here.
 
     Returns:
         Dict[str, Tuple[float, float, float]]: Dictionary mapping receiver IDs
             to their (x, y, z) coordinates in meters.
     """
-    return {
-        "receiver_1": (0.0, 0.0, 2.0),
-        "receiver_2": (10.0, 0.0, 2.0),
-        "receiver_3": (5.0, 8.66, 2.0),
-        "receiver_4": (5.0, 2.89, 2.0),
-    }
+    from config import settings
+    from receivers import ReceiverRegistry
+
+    return ReceiverRegistry.from_settings(settings).geometry.positions
@@ -1,4 +1,7 @@
 import sqlite3
+from datetime import datetime
+
+from partitions import ensure_partition, migrate_legacy_table, rebuild_view
 
 with sqlite3.connect("hospital_iot.db") as conn:
     cursor = conn.cursor()
@@ -11,7 +14,7 @@ with sqlite3.connect("hospital_iot.db") as conn:
                 tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 mac_address TEXT UNIQUE NOT NULL,
                 medicine_name TEXT NOT NULL,
-                medicine_type TEXT NOT NULL,
+                medicine_type TEXT NOT NULL DEFAULT 'unknown',
                 registered_at TEXT DEFAULT (datetime('now'))
             )
         """)
@@ -30,20 +33,14 @@ with sqlite3.connect("hospital_iot.db") as conn:
         """)
         print("Table #2 Created Successfully.")
         
-        print("\nCreating Table #3 (RSSI Readings)")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS rssi_readings(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tag_id INTEGER NOT NULL,
-                receiver_id TEXT NOT NULL,
-                rssi INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                sequence_number INTEGER NOT NULL,
-                FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id),
-                FOREIGN KEY (receiver_id) REFERENCES receivers(receiver_id),
-                UNIQUE(tag_id, receiver_id, sequence_number)
-            )
-        """)
+        print("\nCreating Table #3 (RSSI Readings, partitioned by day)")
+        # rssi_readings is a view over daily rssi_readings_YYYYMMDD tables;
+        # see partitions.py. Older databases with a single table are migrated.
+        migrated_days = migrate_legacy_table(cursor)
+        if migrated_days:
+            print(f"Migrated legacy rssi_readings into {migrated_days} daily partitions.")
+        ensure_partition(cursor, datetime.utcnow())
+        rebuild_view(cursor)
         print("Table #3 Created Successfully.")
         
         print("\nCreating Table #4 (Locations)")
@@ -53,6 +50,9 @@ with sqlite3.connect("hospital_iot.db") as conn:
                 tag_id INTEGER NOT NULL,
                 x_coordinate REAL,
                 y_coordinate REAL,
+                z_coordinate REAL,
+                accuracy REAL,
+                receiver_count INTEGER,
                 zone_name TEXT,
                 calculation_method TEXT,
                 timestamp TEXT DEFAULT (datetime('now')),
@@ -81,6 +81,7 @@ with sqlite3.connect("hospital_iot.db") as conn:
                 alert_type TEXT NOT NULL,
                 message TEXT NOT NULL,
                 severity TEXT NOT NULL,
+                metadata TEXT,
                 timestamp TEXT DEFAULT (datetime('now')),
                 acknowledged INTEGER DEFAULT 0,
                 FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
@@ -88,9 +89,38 @@ with sqlite3.connect("hospital_iot.db") as conn:
         """)
         print("Table #6 Created Successfully.")
         
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        print("\nCreating Table #7 (Link Quality)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS link_quality(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tag_id INTEGER NOT NULL,
+                receiver_id TEXT NOT NULL,
+                received INTEGER NOT NULL,
+                expected INTEGER NOT NULL,
+                lost INTEGER NOT NULL,
+                duplicates INTEGER NOT NULL,
+                reordered INTEGER NOT NULL,
+                resets INTEGER NOT NULL,
+                max_reorder_depth INTEGER,
+                window_ratio REAL,
+                timestamp TEXT NOT NULL,
+                FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+            )
+        """)
+        print("Table #7 Created Successfully.")
+        
+        print("\nCreating Indexes")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_locations_time ON locations(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_locations_tag_time ON locations(tag_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_temperature_logs_tag_time ON temperature_logs(tag_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_temperature_logs_time ON temperature_logs(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_link_quality_receiver_time ON link_quality(receiver_id, timestamp)")
+        print("Indexes Created Successfully.")
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'rssi_readings_%';")
         tables = cursor.fetchall()
-        print(f"\nTotal tables created: {len(tables)}")
+        print(f"\nTotal tables created: {len(tables)} (plus daily rssi_readings partitions)")
         
         print("\nAll tables created and database setup completed successfully.")
         
@@ -0,0 +1,126 @@
+"""Daily partitions for rssi_readings.
+
+Readings are stored in one table per UTC day (rssi_readings_YYYYMMDD), each
+with a covering index on (tag_id, timestamp), so recent-history queries only
+touch the newest partitions and retention drops whole tables instead of
+running row-wise DELETEs. A view named rssi_readings unions every partition
+for ad-hoc queries.
+
+This module owns the partition naming and DDL; backend/sqlite_database.py
+imports them from here.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+PARTITION_PREFIX = "rssi_readings_"
+PARTITION_RE = re.compile(r"^rssi_readings_(\d{8})$")
+
+PARTITION_COLUMNS = (
+    "tag_id, receiver_id, rssi, distance, battery, moving, timestamp, sequence_number"
+)
+
+
+def partition_name(day):
+    """Partition table for a date, datetime, or 'YYYY-MM-DD...' timestamp string."""
+    if isinstance(day, str):
+        return PARTITION_PREFIX + day[:10].replace("-", "")
+    return PARTITION_PREFIX + day.strftime("%Y%m%d")
+
+
+# Statements creating one partition; {name} is the partition table
+PARTITION_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS {name}(
+        id INTEGER PRIMARY KEY,
+        tag_id INTEGER NOT NULL,
+        receiver_id TEXT NOT NULL,
+        rssi INTEGER,
+        distance REAL,
+        battery INTEGER,
+        moving INTEGER DEFAULT 0,
+        timestamp TEXT NOT NULL,
+        sequence_number INTEGER,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id)
+    )
+    """,
+    # Covering index: per-tag history and latest-status lookups never touch the table
+    """
+    CREATE INDEX IF NOT EXISTS idx_{name}_tag_time
+    ON {name}(tag_id, timestamp, receiver_id, distance, battery, moving, sequence_number)
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name}(timestamp)",
+)
+
+
+def ensure_partition(cursor, day):
+    name = partition_name(day)
+    for statement in PARTITION_DDL:
+        cursor.execute(statement.format(name=name))
+    return name
+
+
+def list_partitions(cursor):
+    """All partition table names, oldest first."""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'rssi\\_readings\\_%' ESCAPE '\\'"
+    )
+    return sorted(row[0] for row in cursor.fetchall() if PARTITION_RE.match(row[0]))
+
+
+def rebuild_view(cursor):
+    """Recreate the rssi_readings view over the current partitions."""
+    cursor.execute("SELECT type FROM sqlite_master WHERE name='rssi_readings'")
+    existing = cursor.fetchone()
+    if existing and existing[0] == "table":
+        # Not migrated yet; migrate_legacy_table() must run first
+        return
+    cursor.execute("DROP VIEW IF EXISTS rssi_readings")
+    partitions = list_partitions(cursor)
+    if not partitions:
+        return
+    union = " UNION ALL ".join(f"SELECT * FROM {name}" for name in partitions)
+    cursor.execute(f"CREATE VIEW rssi_readings AS {union}")
+
+
+def migrate_legacy_table(cursor):
+    """Move rows from a monolithic rssi_readings table into daily partitions."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='rssi_readings'")
+    if cursor.fetchone() is None:
+        return 0
+
+    # The original table has no distance, battery or moving columns
+    cursor.execute("PRAGMA table_info(rssi_readings)")
+    legacy = {row[1] for row in cursor.fetchall()}
+    select = ", ".join(
+        column if column in legacy else f"NULL AS {column}"
+        for column in (c.strip() for c in PARTITION_COLUMNS.split(","))
+    )
+
+    cursor.execute("SELECT DISTINCT substr(timestamp, 1, 10) FROM rssi_readings")
+    days = [row[0] for row in cursor.fetchall()]
+    for day in days:
+        name = ensure_partition(cursor, day)
+        cursor.execute(
+            f"INSERT INTO {name} ({PARTITION_COLUMNS}) "
+            f"SELECT {select} FROM rssi_readings WHERE substr(timestamp, 1, 10) = ?",
+            (day,)
+        )
+    cursor.execute("DROP TABLE rssi_readings")
+    return len(days)
+
+
+def drop_partitions_before(cursor, keep_days, now=None):
+    """Drop partitions older than keep_days and return their names.
+
+    temperature_logs rows (one per scan) from the same days are deleted too.
+    """
+    cutoff_day = (now or datetime.utcnow()) - timedelta(days=keep_days)
+    cutoff = partition_name(cutoff_day)
+    dropped = [name for name in list_partitions(cursor) if name < cutoff]
+    for name in dropped:
+        cursor.execute(f"DROP TABLE {name}")
+    if dropped:
+        rebuild_view(cursor)
+    cursor.execute("DELETE FROM temperature_logs WHERE timestamp < ?", (cutoff_day.strftime("%Y-%m-%d"),))
+    return dropped
@@ -0,0 +1,19 @@
+import sqlite3
+import sys
+
+from partitions import drop_partitions_before
+
+# Keep this many days of rssi_readings and temperature_logs; override with: python3 retention.py <days>
+KEEP_DAYS = 30
+
+keep_days = int(sys.argv[1]) if len(sys.argv) > 1 else KEEP_DAYS
+
+with sqlite3.connect("hospital_iot.db") as conn:
+    cursor = conn.cursor()
+
+    print(f"Dropping rssi_readings partitions and temperature_logs rows older than {keep_days} days...")
+    dropped = drop_partitions_before(cursor, keep_days)
+
+    for name in dropped:
+        print(f"Dropped {name}")
+    print(f"\nRetention complete: {len(dropped)} partitions dropped.")
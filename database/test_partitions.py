@@ -0,0 +1,102 @@
+"""Tests for partitions.py against databases made by the original setup script.
+
+Run with:
+    python -m pytest database
+"""
+
+import sqlite3
+
+import pytest
+
+from partitions import list_partitions, migrate_legacy_table, partition_name, rebuild_view
+
+# Tables as the original database_setup.py created them, before partitioning
+BASELINE_DDL = (
+    """
+    CREATE TABLE medicine_tags(
+        tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mac_address TEXT UNIQUE NOT NULL,
+        medicine_name TEXT NOT NULL,
+        medicine_type TEXT NOT NULL,
+        registered_at TEXT DEFAULT (datetime('now'))
+    )
+    """,
+    """
+    CREATE TABLE receivers(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        receiver_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        x_position REAL NOT NULL,
+        y_position REAL NOT NULL,
+        floor_level INTEGER DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE rssi_readings(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag_id INTEGER NOT NULL,
+        receiver_id TEXT NOT NULL,
+        rssi INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        sequence_number INTEGER NOT NULL,
+        FOREIGN KEY (tag_id) REFERENCES medicine_tags(tag_id),
+        FOREIGN KEY (receiver_id) REFERENCES receivers(receiver_id),
+        UNIQUE(tag_id, receiver_id, sequence_number)
+    )
+    """,
+)
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    conn = sqlite3.connect(tmp_path / "hospital_iot.db")
+    conn.execute("PRAGMA foreign_keys=ON")
+    for statement in BASELINE_DDL:
+        conn.execute(statement)
+    conn.execute(
+        "INSERT INTO medicine_tags (mac_address, medicine_name, medicine_type) VALUES (?, ?, ?)",
+        ("AA:BB:CC:DD:EE:FF", "Insulin", "hormone")
+    )
+    conn.execute(
+        "INSERT INTO receivers (receiver_id, name, x_position, y_position) VALUES ('rpi_a', 'A', 0, 0)"
+    )
+    conn.executemany(
+        "INSERT INTO rssi_readings (tag_id, receiver_id, rssi, timestamp, sequence_number) "
+        "VALUES (1, 'rpi_a', ?, ?, ?)",
+        [
+            (-60, "2026-09-30 23:59:59", 1),
+            (-62, "2026-10-01 00:00:01", 2),
+            (-64, "2026-10-01 12:00:00", 3),
+        ]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_migrates_baseline_table(baseline):
+    cursor = baseline.cursor()
+    assert migrate_legacy_table(cursor) == 2
+    rebuild_view(cursor)
+
+    assert list_partitions(cursor) == [partition_name("2026-09-30"), partition_name("2026-10-01")]
+    rows = cursor.execute(
+        "SELECT tag_id, receiver_id, rssi, distance, battery, moving, timestamp, sequence_number "
+        "FROM rssi_readings ORDER BY timestamp"
+    ).fetchall()
+    assert rows == [
+        (1, "rpi_a", -60, None, None, None, "2026-09-30 23:59:59", 1),
+        (1, "rpi_a", -62, None, None, None, "2026-10-01 00:00:01", 2),
+        (1, "rpi_a", -64, None, None, None, "2026-10-01 12:00:00", 3),
+    ]
+    assert cursor.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'rssi_readings'"
+    ).fetchone() == ("view",)
+
+
+def test_migration_is_idempotent(baseline):
+    cursor = baseline.cursor()
+    migrate_legacy_table(cursor)
+    rebuild_view(cursor)
+    assert migrate_legacy_table(cursor) == 0
+    assert cursor.execute("SELECT COUNT(*) FROM rssi_readings").fetchone() == (3,)
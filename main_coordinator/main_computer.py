@@ -19,22 +19,33 @@ MQTT_BROKER = "192.168.137.1"
 MQTT_PORT = 1883
 MQTT_QOS = 1
 
+# How long to collect other receivers' copies of the same advertisement
+# (same MAC + sequence number) before publishing one fused message
+FUSION_WINDOW_SECONDS = 0.5
+
 
 class MessageDeduplicator:
 
-    def __init__(self, broker, port):
+    def __init__(self, broker, port, fusion_window=FUSION_WINDOW_SECONDS):
         self.broker = broker
         self.port = port
+        self.fusion_window = fusion_window
         self.client = mqtt.Client(client_id="coordinator")
         self.client.username_pw_set("coordinator","1234")
         # Track last seen sequence number per MAC address
         self.last_seq = {}
         self.seq_lock = threading.Lock()
 
+        # Open fusion windows: (mac, seq) -> {'opened', 'data', 'readings'}
+        # readings maps receiver_id -> {'rssi', 'timestamp'}
+        self.windows = {}
+        self.flush_running = False
+
         # Statistics
         self.received_count = 0
         self.published_count = 0
         self.duplicate_count = 0
+        self.fused_count = 0
 
         # Setup callbacks
         self.client.on_connect = self._on_connect
@@ -52,48 +63,133 @@ class MessageDeduplicator:
     def _on_message(self, client, userdata, msg):
         try:
             data = json.loads(msg.payload.decode())
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            return
+
+        # Runs in the paho callback: anything raised here would end the loop
+        if not isinstance(data, dict):
+            print(f"Ignoring non-object message from {msg.topic}")
+            return
+
+        # Batched receivers (Pico) send {"scans": [...]} with receiver_id at the top
+        if 'scans' in data:
+            if not isinstance(data.get('scans'), list):
+                print(f"Ignoring scan batch from {msg.topic}: 'scans' is not a list")
+                return
+            for scan in data['scans']:
+                if not isinstance(scan, dict):
+                    print(f"Ignoring non-object scan in batch from {msg.topic}")
+                    continue
+                scan.setdefault('receiver_id', data.get('receiver_id'))
+                self._handle_scan(scan, msg.topic)
+        else:
+            self._handle_scan(data, msg.topic)
+
+    def _handle_scan(self, data, topic):
+        try:
             mac = data.get('mac')
             seq = data.get('sequence_number')
 
             if mac is None or seq is None:
-                print(f"Invalid message from {msg.topic} (missing mac or sequence_number)")
+                print(f"Invalid message from {topic} (missing mac or sequence_number)")
                 return
 
             self.received_count += 1
+            receiver = data.get('receiver_id', '?')
+            key = (mac, seq)
+            # A scan without RSSI still advances the sequence, but has no
+            # reading to fuse
+            rssi = data.get('rssi')
+            reading = {'rssi': rssi, 'timestamp': data.get('timestamp')}
 
             with self.seq_lock:
+                window = self.windows.get(key)
+
+                if window is not None:
+                    # Another receiver heard the same advertisement — keep its RSSI
+                    if receiver in window['readings']:
+                        self.duplicate_count += 1
+                    else:
+                        self.fused_count += 1
+                    if rssi is not None:
+                        window['readings'][receiver] = reading
+                    return
+
                 last = self.last_seq.get(mac)
 
-                # Duplicate check: skip if we already saw this sequence for this MAC
+                # Late copy of an advertisement whose window already closed
                 if last is not None and seq <= last:
                     self.duplicate_count += 1
                     return
 
-                # New sequence number — update tracker
+                # New sequence number — open a fusion window for it
                 self.last_seq[mac] = seq
-
-            # Log and publish
-            temp = data.get('temperature', 'N/A')
-            battery = data.get('battery', 'N/A')
-            receiver = data.get('receiver_id', '?')
-            print(f"New  | MAC: {mac} | Seq: {seq} | From: {receiver} | RSSI: {data.get('rssi', '?')} dBm | Temp: {temp}°C | Bat: {battery}%")
-
-            self.publish_medicine_data(data)
+                self.windows[key] = {
+                    'opened': time.time(),
+                    'data': data,
+                    'readings': {receiver: reading} if rssi is not None else {},
+                }
 
         except Exception as e:
             print(f"Error processing message: {e}")
 
-    def publish_medicine_data(self, data):
+    def _flush_loop(self):
+        """Close fusion windows older than fusion_window and publish them."""
+        while self.flush_running:
+            time.sleep(self.fusion_window / 4)
+            try:
+                self.flush_windows()
+            except Exception as e:
+                print(f"Error flushing fusion windows: {e}")
+
+    def flush_windows(self, force=False):
+        now = time.time()
+        with self.seq_lock:
+            expired = [
+                key for key, window in self.windows.items()
+                if force or now - window['opened'] >= self.fusion_window
+            ]
+            closed = [self.windows.pop(key) for key in expired]
+
+        # Windows are already popped, so one bad window must not lose the rest
+        for window in closed:
+            data = window['data']
+            readings = window['readings']
+            if not readings:
+                print(f"Dropping MAC {data['mac']} seq {data['sequence_number']}: no receiver reported RSSI")
+                continue
+            try:
+                # Log and publish
+                temp = data.get('temperature', 'N/A')
+                battery = data.get('battery', 'N/A')
+                rssi_list = ', '.join(f"{r}={v['rssi']}" for r, v in readings.items())
+                print(f"New  | MAC: {data['mac']} | Seq: {data['sequence_number']} | Receivers: {len(readings)} | "
+                      f"RSSI: {rssi_list} dBm | Temp: {temp}°C | Bat: {battery}%")
+
+                self.publish_medicine_data(data, readings)
+            except Exception as e:
+                print(f"Error publishing MAC {data['mac']} seq {data['sequence_number']}: {e}")
+
+    def publish_medicine_data(self, data, readings):
         mac = data['mac']
-        receiver_id = data['receiver_id']
 
-        topic = f"hospital/medicine/rssi/{receiver_id}/{mac}"
+        # One message per advertisement with every receiver's RSSI; the
+        # top-level receiver_id/rssi keep the strongest reading for
+        # consumers that only read a single value
+        strongest = max(readings, key=lambda r: readings[r]['rssi'])
+        topic = f"hospital/medicine/rssi/fused/{mac}"
 
         payload = {
             'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'receiver_id': receiver_id,
+            'receiver_id': strongest,
             'mac': mac,
-            'rssi': data['rssi'],
+            'rssi': readings[strongest]['rssi'],
+            'readings': [
+                {'receiver_id': receiver_id, **reading}
+                for receiver_id, reading in readings.items()
+            ],
+            'receiver_count': len(readings),
             'temperature': data['temperature'],
             'battery': data['battery'],
             'medicine': data['medicine'],
@@ -123,6 +219,7 @@ class MessageDeduplicator:
             'received_count': self.received_count,
             'published_count': self.published_count,
             'duplicate_count': self.duplicate_count,
+            'fused_count': self.fused_count,
             'tracked_macs': list(self.last_seq.keys()),
             'status': 'online'
         }
@@ -138,6 +235,7 @@ class MessageDeduplicator:
         print("=" * 70)
         print(f"MQTT Broker:  {self.broker}:{self.port}")
         print(f"Dedup by:     MAC address + sequence number")
+        print(f"Fusion:       {self.fusion_window * 1000:.0f} ms window per advertisement")
         print("=" * 70)
         print()
 
@@ -148,6 +246,9 @@ class MessageDeduplicator:
             return
 
         self.client.loop_start()
+        self.flush_running = True
+        flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        flush_thread.start()
         time.sleep(2)
 
         try:
@@ -163,11 +264,15 @@ class MessageDeduplicator:
         except KeyboardInterrupt:
             print("\nStopping...")
         finally:
+            self.flush_running = False
+            flush_thread.join(timeout=1)
+            self.flush_windows(force=True)
             self.client.loop_stop()
             self.client.disconnect()
             print(f"\nTotal received:   {self.received_count}")
             print(f"Total published:  {self.published_count}")
             print(f"Duplicates skip:  {self.duplicate_count}")
+            print(f"Readings fused:   {self.fused_count}")
             print("Stopped")
 
 